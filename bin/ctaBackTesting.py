@@ -132,7 +132,7 @@ class BackTestingEngine(object):
         # 将数据从查询指针中读取出，并生成列表
         for d in initCursor:
             data = dataClass()
-            data.__dict__ = d
+            data.fromDict(d)
             self.initData.append(data)
 
             # 载入回测数据
@@ -173,7 +173,7 @@ class BackTestingEngine(object):
 
         for d in self.dbCursor:
             data = dataClass()
-            data.__dict__ = d
+            data.fromDict(d)
             func(data)
 
         self.output(u'数据回放结束')
@@ -317,7 +317,7 @@ class BackTestingEngine(object):
                 # 推送成交数据
                 self.tradeCount += 1  # 成交编号自增1
                 tradeID = str(self.tradeCount)
-                trade = VtTradeData()
+                trade = BacktestingTradeData()
                 trade.vtSymbol = order.vtSymbol
                 trade.tradeID = tradeID
                 trade.vtTradeID = tradeID
@@ -376,7 +376,7 @@ class BackTestingEngine(object):
                 # 推送成交数据
                 self.tradeCount += 1  # 成交编号自增1
                 tradeID = str(self.tradeCount)
-                trade = VtTradeData()
+                trade = BacktestingTradeData()
                 trade.vtSymbol = so.vtSymbol
                 trade.tradeID = tradeID
                 trade.vtTradeID = tradeID
@@ -760,6 +760,18 @@ class TradingResult(object):
                     - self.commission - self.slippage)  # 净盈亏
 
 
+########################################################################
+class BacktestingTradeData(VtTradeData):
+    """回测中使用的成交数据，不定义__slots__，以便额外保存成交时间的datetime对象dt"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        super(BacktestingTradeData, self).__init__()
+
+        self.dt = None  # 成交时间datetime
+
+
 ########################################################################
 class OptimizationSetting(object):
     """优化设置"""
@@ -154,7 +154,7 @@ class HistoryDataEngine(object):
                     print d
 
                 flt = {'datetime': bar.datetime}
-                self.dbClient[DAILY_DB_NAME][symbol].update_one(flt, {'$set': bar.__dict__}, upsert=True)
+                self.dbClient[DAILY_DB_NAME][symbol].update_one(flt, {'$set': bar.toDict()}, upsert=True)
 
                 print u'%s下载完成' % symbol
         else:
@@ -220,7 +220,7 @@ class HistoryDataEngine(object):
                     print d
 
                 flt = {'datetime': bar.datetime}
-                self.dbClient[MINUTE_DB_NAME][symbol].update_one(flt, {'$set': bar.__dict__}, upsert=True)
+                self.dbClient[MINUTE_DB_NAME][symbol].update_one(flt, {'$set': bar.toDict()}, upsert=True)
 
             print u'%s下载完成' % symbol
         else:
@@ -299,7 +299,7 @@ class HistoryDataEngine(object):
                     print d
 
                 flt = {'datetime': bar.datetime}
-                self.dbClient[DAILY_DB_NAME][symbol].update_one(flt, {'$set': bar.__dict__}, upsert=True)
+                self.dbClient[DAILY_DB_NAME][symbol].update_one(flt, {'$set': bar.toDict()}, upsert=True)
 
             print u'%s下载完成' % symbol
         else:
@@ -338,7 +338,7 @@ def loadMcCsv(fileName, dbName, symbol):
         bar.volume = d['TotalVolume']
 
         flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set': bar.__dict__}, upsert=True)
+        collection.update_one(flt, {'$set': bar.toDict()}, upsert=True)
         print bar.date, bar.time
 
     print u'插入完毕，耗时：%s' % (time() - start)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是CTP数据转换的性能测试，无需CTP的API和网络连接即可运行。
+
+测试使用合成的CTP行情、委托、成交回报字典，分别统计以下两种转换方式每秒转换的数量：
+1. legacy：原来CtpMdApi、CtpTdApi回调函数中的逐个字段赋值和if/elif判断，
+   行情还包括原来在下游引擎中用strptime解析时间
+2. convert：ctpConvert中的转换函数（查表转换，行情时间只解析一次）
+测试前会检查两种方式转换结果中相同字段的值是否一致。
+
+测试结果以json格式输出，例如：
+python ctpConvertBenchmark.py --count 200000 --output result.json
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import platform
+import time
+from datetime import datetime
+
+from vnpy.gate.ctp.ctpConvert import *
+
+# 计时函数，Windows上time.clock的精度更高
+if platform.system() == 'Windows':
+    timer = time.clock
+else:
+    timer = time.time
+
+GATEWAY_NAME = 'CTP'
+
+
+# ----------------------------------------------------------------------
+def legacyTick(data, gateway_name):
+    """原来的行情转换"""
+    tick = VtTickData()
+    tick.gatewayName = gateway_name
+
+    tick.symbol = data['InstrumentID']
+    tick.exchange = exchangeMapReverse.get(data['ExchangeID'], u'未知')
+    tick.vtSymbol = tick.symbol
+
+    tick.lastPrice = data['LastPrice']
+    tick.volume = data['Volume']
+    tick.openInterest = data['OpenInterest']
+    tick.time = '.'.join([data['UpdateTime'], str(data['UpdateMillisec'] // 100)])
+    tick.date = data['TradingDay']
+
+    tick.openPrice = data['OpenPrice']
+    tick.highPrice = data['HighestPrice']
+    tick.lowPrice = data['LowestPrice']
+    tick.preClosePrice = data['PreClosePrice']
+
+    tick.upperLimit = data['UpperLimitPrice']
+    tick.lowerLimit = data['LowerLimitPrice']
+
+    tick.bidPrice1 = data['BidPrice1']
+    tick.bidVolume1 = data['BidVolume1']
+    tick.askPrice1 = data['AskPrice1']
+    tick.askVolume1 = data['AskVolume1']
+
+    # 原来在CtaEngine和DrEngine中分别解析，这里只计算一次
+    tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
+    return tick
+
+
+# ----------------------------------------------------------------------
+def legacyOrder(data, gateway_name):
+    """原来的委托转换"""
+    order = VtOrderData()
+    order.gatewayName = gateway_name
+
+    order.symbol = data['InstrumentID']
+    order.exchange = exchangeMapReverse[data['ExchangeID']]
+    order.vtSymbol = order.symbol
+
+    order.orderID = data['OrderRef']
+
+    if data['Direction'] == '0':
+        order.direction = DIRECTION_LONG
+    elif data['Direction'] == '1':
+        order.direction = DIRECTION_SHORT
+    else:
+        order.direction = DIRECTION_UNKNOWN
+
+    if data['CombOffsetFlag'] == '0':
+        order.offset = OFFSET_OPEN
+    elif data['CombOffsetFlag'] == '1':
+        order.offset = OFFSET_CLOSE
+    else:
+        order.offset = OFFSET_UNKNOWN
+
+    if data['OrderStatus'] == '0':
+        order.status = STATUS_ALLTRADED
+    elif data['OrderStatus'] == '1':
+        order.status = STATUS_PARTTRADED
+    elif data['OrderStatus'] == '3':
+        order.status = STATUS_NOTTRADED
+    elif data['OrderStatus'] == '5':
+        order.status = STATUS_CANCELLED
+    else:
+        order.status = STATUS_UNKNOWN
+
+    order.price = data['LimitPrice']
+    order.totalVolume = data['VolumeTotalOriginal']
+    order.tradedVolume = data['VolumeTraded']
+    order.orderTime = data['InsertTime']
+    order.cancelTime = data['CancelTime']
+    order.frontID = data['FrontID']
+    order.sessionID = data['SessionID']
+
+    order.vtOrderID = '.'.join([gateway_name, order.orderID])
+    return order
+
+
+# ----------------------------------------------------------------------
+def legacyTrade(data, gateway_name):
+    """原来的成交转换"""
+    trade = VtTradeData()
+    trade.gatewayName = gateway_name
+
+    trade.symbol = data['InstrumentID']
+    trade.exchange = exchangeMapReverse[data['ExchangeID']]
+    trade.vtSymbol = trade.symbol
+
+    trade.tradeID = data['TradeID']
+    trade.vtTradeID = '.'.join([gateway_name, trade.tradeID])
+
+    trade.orderID = data['OrderRef']
+    trade.vtOrderID = '.'.join([gateway_name, trade.orderID])
+
+    trade.direction = directionMapReverse.get(data['Direction'], '')
+    trade.offset = offsetMapReverse.get(data['OffsetFlag'], '')
+
+    trade.price = data['Price']
+    trade.volume = data['Volume']
+    trade.tradeTime = data['TradeTime']
+    return trade
+
+
+# ----------------------------------------------------------------------
+def newTickData(n):
+    """生成第n个行情回报字典"""
+    return {
+        'InstrumentID': 'rb%d' % (1701 + n % 10),
+        'ExchangeID': 'SHFE',
+        'LastPrice': 3000.0 + n % 50,
+        'Volume': n,
+        'OpenInterest': 100000 + n,
+        'UpdateTime': '09:%02d:%02d' % (n // 60 % 60, n % 60),
+        'UpdateMillisec': 500 * (n % 2),
+        'TradingDay': '20161018',
+        'OpenPrice': 3000.0,
+        'HighestPrice': 3050.0,
+        'LowestPrice': 2990.0,
+        'PreClosePrice': 3001.0,
+        'UpperLimitPrice': 3200.0,
+        'LowerLimitPrice': 2800.0,
+        'BidPrice1': 2999.0 + n % 50,
+        'BidVolume1': 10,
+        'AskPrice1': 3001.0 + n % 50,
+        'AskVolume1': 12
+    }
+
+
+# ----------------------------------------------------------------------
+def newOrderData(n):
+    """生成第n个委托回报字典，状态只使用原来的转换也支持的取值"""
+    return {
+        'InstrumentID': 'rb1701',
+        'ExchangeID': 'SHFE',
+        'OrderRef': str(n),
+        'Direction': '01'[n % 2],
+        'CombOffsetFlag': '01'[n // 2 % 2],
+        'OrderStatus': '0135'[n % 4],
+        'LimitPrice': 3000.0,
+        'VolumeTotalOriginal': 10,
+        'VolumeTraded': n % 10,
+        'InsertTime': '09:30:00',
+        'CancelTime': '',
+        'FrontID': 1,
+        'SessionID': 123456
+    }
+
+
+# ----------------------------------------------------------------------
+def newTradeData(n):
+    """生成第n个成交回报字典"""
+    return {
+        'InstrumentID': 'rb1701',
+        'ExchangeID': 'SHFE',
+        'TradeID': '%12d' % n,
+        'OrderRef': str(n),
+        'Direction': '01'[n % 2],
+        'OffsetFlag': '01'[n // 2 % 2],
+        'Price': 3000.0,
+        'Volume': 1,
+        'TradeTime': '09:30:00'
+    }
+
+
+# 测试场景：名称、生成回报字典的函数、原来的转换函数、新的转换函数
+SCENARIO_LIST = [
+    ('tick', newTickData, legacyTick, convertTick),
+    ('order', newOrderData, legacyOrder, convertOrder),
+    ('trade', newTradeData, legacyTrade, convertTrade)
+]
+
+
+# ----------------------------------------------------------------------
+def checkResult(data_list, legacy_func, convert_func):
+    """检查两种转换方式的结果是否一致"""
+    for data in data_list[:1000]:
+        legacy = legacy_func(data, GATEWAY_NAME).toDict()
+        converted = convert_func(data, GATEWAY_NAME).toDict()
+        if legacy != converted:
+            diff = [key for key in legacy if legacy[key] != converted.get(key)]
+            raise ValueError(u'转换结果不一致：%s' % diff)
+
+
+# ----------------------------------------------------------------------
+def measure(data_list, func):
+    """返回每秒转换的数量"""
+    start = timer()
+    for data in data_list:
+        func(data, GATEWAY_NAME)
+    return len(data_list) / (timer() - start)
+
+
+# ----------------------------------------------------------------------
+def runAll(count, repeat):
+    """运行所有测试场景，返回结果字典"""
+    result = {}
+    loadMaps()
+
+    for name, new_data, legacy_func, convert_func in SCENARIO_LIST:
+        data_list = [new_data(n) for n in range(count)]
+        checkResult(data_list, legacy_func, convert_func)
+
+        # 重复多次取最大值，减少其他进程的干扰
+        legacy_rate = max(measure(data_list, legacy_func) for i in range(repeat))
+        convert_rate = max(measure(data_list, convert_func) for i in range(repeat))
+
+        result[name] = {
+            'legacy': int(legacy_rate),
+            'convert': int(convert_rate),
+            'speedup': round(convert_rate / legacy_rate, 2)
+        }
+
+    return result
+
+
+# ----------------------------------------------------------------------
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description=u'CTP数据转换性能测试（单位：每秒转换数量）')
+    parser.add_argument('--count', type=int, default=100000, help=u'每个场景转换的数量')
+    parser.add_argument('--repeat', type=int, default=3, help=u'每种转换方式重复的次数')
+    parser.add_argument('--output', default='', help=u'结果保存的文件名，默认输出到屏幕')
+    args = parser.parse_args()
+
+    result = runAll(args.count, args.repeat)
+    text = json.dumps(result, indent=4, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print text
+
+
+if __name__ == '__main__':
+    main()
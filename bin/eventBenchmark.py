@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是事件引擎的性能测试，无需界面和网络连接即可运行。
+
+测试通过一个模拟的Gateway向事件引擎推送合成的tick、委托、成交数据流，引擎上注册了
+和实盘相同的CtaEngine、DrEngine、RmEngine、DataEngine，统计的指标包括：
+1. 每秒处理的事件数量
+2. 事件从存入队列到被处理的延时（p50、p99、p999，按事件类型分别统计）
+3. 测试期间的CPU占用
+4. 队列中等待处理的事件数量的最大值
+
+测试结果以json格式输出，便于保存后比较不同版本之间的性能变化，例如：
+python eventBenchmark.py --ticks 200000 --symbols 100 --output result.json
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta
+from threading import Event as ThreadingEvent, Lock
+
+from vnpy.engine.cta.ctaEngine import CtaEngine
+from vnpy.engine.dr.drBase import DrTickData, DrBarData
+from vnpy.engine.dr.drEngine import DrEngine
+from vnpy.engine.rm.rmEngine import RmEngine
+from vnpy.engine.vt.vtEngine import DataEngine
+from vnpy.utils.vtGateway import *
+
+# 计时函数，Windows上time.clock的精度更高
+if platform.system() == 'Windows':
+    timer = time.clock
+else:
+    timer = time.time
+
+BENCHMARK_GATEWAY_NAME = 'BENCH'
+
+# 测试EventEngine时使用的Qt应用对象
+qtApp = None
+
+
+########################################################################
+class BenchmarkMainEngine(object):
+    """
+    测试用的主引擎，提供各个功能引擎需要调用的主引擎接口，
+    不连接任何接口和数据库，只在内存中完成对应的操作
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, event_engine):
+        """Constructor"""
+        self.eventEngine = event_engine
+        self.dataEngine = DataEngine(event_engine)
+
+        self.contractDict = {}  # 测试用的合约
+        self.orderCount = 0  # 发单计数
+        self.insertCount = 0  # 数据库插入计数
+
+        self.ctaEngine = None
+        self.drEngine = None
+        self.rmEngine = None
+
+    # ----------------------------------------------------------------------
+    def initEngines(self):
+        """创建各个功能引擎，和MainEngine保持一致"""
+        self.ctaEngine = CtaEngine(self, self.eventEngine)
+        self.drEngine = DrEngine(self, self.eventEngine)
+        self.rmEngine = RmEngine(self, self.eventEngine)
+
+    # ----------------------------------------------------------------------
+    def addContract(self, vt_symbol):
+        """添加测试用的合约"""
+        contract = VtContractData()
+        contract.gatewayName = BENCHMARK_GATEWAY_NAME
+        contract.symbol = vt_symbol
+        contract.vtSymbol = vt_symbol
+        contract.exchange = EXCHANGE_UNKNOWN
+        contract.size = 1
+        contract.priceTick = 1
+        self.contractDict[vt_symbol] = contract
+
+    # ----------------------------------------------------------------------
+    def getContract(self, vt_symbol):
+        """查询合约"""
+        return self.contractDict.get(vt_symbol)
+
+    # ----------------------------------------------------------------------
+    def subscribe(self, subscribe_req, gateway_name):
+        """订阅行情"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, subscribe_req, gateway_name):
+        """退订行情"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def sendOrder(self, order_req, gateway_name):
+        """发单"""
+        if not self.rmEngine.checkRisk(order_req):
+            return ''
+
+        self.orderCount += 1
+        return '.'.join([gateway_name, str(self.orderCount)])
+
+    # ----------------------------------------------------------------------
+    def cancelOrder(self, cancel_order_req, gateway_name):
+        """撤单"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def dbInsert(self, db_name, collection_name, d):
+        """插入数据库"""
+        self.insertCount += 1
+
+    # ----------------------------------------------------------------------
+    def dbInsertMany(self, db_name, collection_name, d_list):
+        """批量插入数据库"""
+        self.insertCount += len(d_list)
+
+    # ----------------------------------------------------------------------
+    def dbQuery(self, db_name, collection_name, d):
+        """查询数据库"""
+        return None
+
+    # ----------------------------------------------------------------------
+    def writeLog(self, content):
+        """日志"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def getOrder(self, vt_order_id):
+        """查询委托"""
+        return self.dataEngine.getOrder(vt_order_id)
+
+    # ----------------------------------------------------------------------
+    def getAllWorkingOrders(self):
+        """查询所有的活跃的委托"""
+        return self.dataEngine.getAllWorkingOrders()
+
+
+########################################################################
+class LatencyProbe(object):
+    """
+    延时探针，在各个功能引擎之前注册到事件引擎上，
+    记录每个数据对象从推送到开始被处理之间的时间
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, total):
+        """Constructor"""
+        self.total = total  # 需要等待处理的事件总数
+        self.count = 0  # 已经处理的事件数
+        self.putTimeDict = {}  # key为数据对象，value为推送时间
+        self.latencyDict = {}  # key为事件类型，value为延时列表（秒）
+        self.finished = ThreadingEvent()
+        self.lock = Lock()  # 分片模式下探针会在多个线程中被调用
+
+    # ----------------------------------------------------------------------
+    def stamp(self, data):
+        """记录数据推送的时间"""
+        self.putTimeDict[data] = timer()
+
+    # ----------------------------------------------------------------------
+    def onEvent(self, event):
+        """事件处理函数"""
+        now = timer()
+        put_time = self.putTimeDict.pop(event.dict_['data'], None)
+
+        with self.lock:
+            if put_time is not None:
+                self.latencyDict.setdefault(event.type_, []).append(now - put_time)
+
+            self.count += 1
+            if self.count >= self.total:
+                self.finished.set()
+
+
+########################################################################
+class BenchmarkGateway(VtGateway):
+    """测试用的Gateway，生成合成的tick、委托、成交数据流"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, event_engine, symbols, probe):
+        """Constructor"""
+        super(BenchmarkGateway, self).__init__(event_engine, BENCHMARK_GATEWAY_NAME)
+
+        self.symbols = symbols
+        self.probe = probe
+        self.startTime = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.orderCount = 0
+
+    # ----------------------------------------------------------------------
+    def newTick(self, n):
+        """生成第n个tick"""
+        tick = VtTickData()
+        tick.gatewayName = self.gatewayName
+        tick.symbol = self.symbols[n % len(self.symbols)]
+        tick.vtSymbol = tick.symbol
+        tick.exchange = EXCHANGE_UNKNOWN
+
+        dt = self.startTime + timedelta(milliseconds=500 * (n // len(self.symbols)))
+        tick.date = dt.strftime('%Y%m%d')
+        tick.time = dt.strftime('%H:%M:%S.') + str(dt.microsecond // 100000)
+        tick.datetime = dt
+
+        price = 3000 + n % 50
+        tick.lastPrice = price
+        tick.volume = n
+        tick.openInterest = 100000
+        tick.upperLimit = 3300
+        tick.lowerLimit = 2700
+        tick.bidPrice1 = price - 1
+        tick.askPrice1 = price + 1
+        tick.bidVolume1 = 10
+        tick.askVolume1 = 10
+        return tick
+
+    # ----------------------------------------------------------------------
+    def newOrderAndTrade(self, n):
+        """生成第n笔委托以及对应的成交"""
+        self.orderCount += 1
+        order_id = str(self.orderCount)
+
+        order = VtOrderData()
+        order.gatewayName = self.gatewayName
+        order.symbol = self.symbols[n % len(self.symbols)]
+        order.vtSymbol = order.symbol
+        order.orderID = order_id
+        order.vtOrderID = '.'.join([self.gatewayName, order_id])
+        order.direction = DIRECTION_LONG
+        order.offset = OFFSET_OPEN
+        order.price = 3000
+        order.totalVolume = 1
+        order.tradedVolume = 1
+        order.status = STATUS_ALLTRADED
+
+        trade = VtTradeData()
+        trade.gatewayName = self.gatewayName
+        trade.symbol = order.symbol
+        trade.vtSymbol = order.vtSymbol
+        trade.tradeID = order_id
+        trade.vtTradeID = order.vtOrderID
+        trade.orderID = order_id
+        trade.vtOrderID = order.vtOrderID
+        trade.direction = order.direction
+        trade.offset = order.offset
+        trade.price = order.price
+        trade.volume = 1
+        return order, trade
+
+    # ----------------------------------------------------------------------
+    def run(self, tick_count, order_interval, rate):
+        """推送数据流，每order_interval个tick推送一组委托和成交，rate为每秒推送的事件数（0为不限速）"""
+        start = timer()
+        sent = 0
+
+        for n in xrange(tick_count):
+            tick = self.newTick(n)
+            self.probe.stamp(tick)
+            self.onTick(tick)
+            sent += 1
+
+            if order_interval and n % order_interval == 0:
+                order, trade = self.newOrderAndTrade(n)
+                self.probe.stamp(order)
+                self.onOrder(order)
+                self.probe.stamp(trade)
+                self.onTrade(trade)
+                sent += 2
+
+            # 限速模式下，每推送100个事件检查一次是否需要等待
+            if rate and n % 100 == 0:
+                wait = sent / rate - (timer() - start)
+                if wait > 0:
+                    time.sleep(wait)
+
+
+# ----------------------------------------------------------------------
+def percentile(sorted_list, p):
+    """计算已排序列表的百分位数"""
+    if not sorted_list:
+        return 0
+    index = min(int(len(sorted_list) * p), len(sorted_list) - 1)
+    return sorted_list[index]
+
+
+# ----------------------------------------------------------------------
+def summarizeLatency(latency_list):
+    """汇总延时数据，单位为微秒"""
+    l = sorted(latency_list)
+    return {
+        'count': len(l),
+        'p50': percentile(l, 0.5) * 1e6,
+        'p99': percentile(l, 0.99) * 1e6,
+        'p999': percentile(l, 0.999) * 1e6,
+        'max': (l[-1] if l else 0) * 1e6
+    }
+
+
+# ----------------------------------------------------------------------
+def createEventEngine(engine_name, shard_count):
+    """创建要测试的事件引擎"""
+    global qtApp
+
+    if engine_name == 'EventEngine':
+        # Qt计时器需要Qt应用对象，这里只创建不带界面的QCoreApplication
+        from PyQt4.QtCore import QCoreApplication
+        if not QCoreApplication.instance():
+            qtApp = QCoreApplication(sys.argv)
+        return EventEngine()
+
+    if engine_name == 'AsyncEventEngine':
+        from vnpy.event.asyncEventEngine import AsyncEventEngine
+        return AsyncEventEngine()
+
+    return EventEngine2(shard_count=shard_count)
+
+
+# ----------------------------------------------------------------------
+def runScenario(name, engine_name='EventEngine2', shard_count=0, tick_count=100000,
+                symbol_count=50, order_interval=0, rate=0, use_ring=False):
+    """运行一个测试场景，返回结果字典"""
+    event_engine = createEventEngine(engine_name, shard_count)
+    main_engine = BenchmarkMainEngine(event_engine)
+
+    symbols = ['BM%04d' % i for i in range(symbol_count)]
+    for vt_symbol in symbols:
+        main_engine.addContract(vt_symbol)
+
+    # 计算总事件数，每组委托和成交包含两个事件
+    total = tick_count
+    if order_interval:
+        total += 2 * len(range(0, tick_count, order_interval))
+
+    # 探针需要先于各个功能引擎注册，从而统计的是排队等待的时间
+    probe = LatencyProbe(total)
+    event_engine.register(EVENT_TICK, probe.onEvent)
+    event_engine.register(EVENT_ORDER, probe.onEvent)
+    event_engine.register(EVENT_TRADE, probe.onEvent)
+
+    main_engine.initEngines()
+
+    # 策略和行情记录使用测试合约
+    for vt_symbol in symbols:
+        main_engine.ctaEngine.loadStrategy({'name': vt_symbol,
+                                            'className': 'DoubleEmaDemo',
+                                            'vtSymbol': vt_symbol})
+        main_engine.ctaEngine.initStrategy(vt_symbol)
+        main_engine.drEngine.tickDict[vt_symbol] = DrTickData()
+        main_engine.drEngine.barDict[vt_symbol] = DrBarData()
+
+    if not main_engine.drEngine.active:
+        main_engine.drEngine.start()
+        main_engine.drEngine.registerEvent()
+
+    # 风控引擎的限制不应影响测试
+    main_engine.rmEngine.active = False
+
+    gateway = BenchmarkGateway(event_engine, symbols, probe)
+
+    # tick通过环形缓冲区推送（只有EventEngine2支持）
+    if use_ring and hasattr(event_engine, 'createRing'):
+        gateway.tickRing = event_engine.createRing()
+
+    cpu_start = os.times()
+    start = timer()
+
+    event_engine.start()
+    gateway.run(tick_count, order_interval, rate)
+    probe.finished.wait()
+
+    wall = timer() - start
+    cpu_end = os.times()
+
+    event_engine.stop()
+    main_engine.drEngine.stop()
+
+    cpu_user = cpu_end[0] - cpu_start[0]
+    cpu_system = cpu_end[1] - cpu_start[1]
+
+    result = {
+        'scenario': name,
+        'engine': engine_name,
+        'shardCount': shard_count,
+        'ring': use_ring,
+        'symbolCount': symbol_count,
+        'events': total,
+        'rate': rate,
+        'wall': wall,
+        'eventsPerSec': total / wall if wall else 0,
+        'cpu': {
+            'user': cpu_user,
+            'system': cpu_system,
+            'percent': (cpu_user + cpu_system) / wall * 100 if wall else 0
+        },
+        'latencyUs': dict((type_, summarizeLatency(l)) for type_, l in probe.latencyDict.items())
+    }
+    return result
+
+
+# ----------------------------------------------------------------------
+def runAll(args):
+    """运行所有测试场景"""
+    scenarioList = [
+        ('tick', dict(order_interval=0)),
+        ('mixed', dict(order_interval=args.orderInterval)),
+    ]
+
+    results = []
+    for name, kwargs in scenarioList:
+        if args.scenario and name != args.scenario:
+            continue
+
+        result = runScenario(name, engine_name=args.engine, shard_count=args.shards,
+                             tick_count=args.ticks, symbol_count=args.symbols,
+                             rate=args.rate, use_ring=args.ring, **kwargs)
+        results.append(result)
+
+        print >> sys.stderr, u'%s: %.0f events/s' % (name, result['eventsPerSec'])
+
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results
+    }
+
+
+# ----------------------------------------------------------------------
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description=u'事件引擎性能测试')
+    parser.add_argument('--engine', default='EventEngine2', choices=['EventEngine', 'EventEngine2', 'AsyncEventEngine'])
+    parser.add_argument('--shards', type=int, default=0, help=u'EventEngine2的分片线程数')
+    parser.add_argument('--ticks', type=int, default=100000, help=u'每个场景推送的tick数量')
+    parser.add_argument('--symbols', type=int, default=50, help=u'合约数量')
+    parser.add_argument('--orderInterval', type=int, default=100, help=u'mixed场景中每多少个tick推送一组委托和成交')
+    parser.add_argument('--rate', type=float, default=0, help=u'每秒推送的事件数，0为不限速')
+    parser.add_argument('--ring', action='store_true', help=u'tick通过EventEngine2的环形缓冲区推送')
+    parser.add_argument('--scenario', default='', help=u'只运行指定的场景')
+    parser.add_argument('--output', default='', help=u'结果保存的文件名，默认输出到屏幕')
+    args = parser.parse_args()
+
+    report = runAll(args)
+    text = json.dumps(report, indent=4, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print text
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是启动时导入耗时的测试，用于比较CTP常量表延迟加载、接口延迟导入前后的启动时间。
+
+每个测试项都在新的Python进程中运行（模块只在第一次导入时有耗时），重复多次后取最小值，
+测试项包括：
+1. ctpDataType：直接导入ctpDataType.py，即原来ctpGateway导入时执行的上千条字典赋值
+2. ctpTable：通过ctpTable读取marshal缓存加载相同的常量表
+3. gatewayDiscovery：MainEngine.initGateway只查找接口，不导入接口模块
+4. gatewayImport：导入所有接口模块，即原来initGateway在启动时做的事情
+   （缺少接口的API时导入失败，结果中记录错误信息）
+
+测试结果以json格式输出，例如：
+python importReport.py --repeat 10 --output result.json
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import subprocess
+import sys
+
+# 子进程中运行的代码，setup部分不计时
+CHILD_TEMPLATE = '''
+import time
+%s
+start = time.time()
+%s
+print repr(time.time() - start)
+'''
+
+GATEWAY_SETUP = '''
+import importlib
+from vnpy.engine.vt.vtEngine import MainEngine
+engine = MainEngine.__new__(MainEngine)
+'''
+
+# 测试项：名称、setup代码、计时的代码
+ITEM_LIST = [
+    ('ctpDataType', '', 'import vnpy.gate.ctp.ctpDataType'),
+    ('ctpTable', 'from vnpy.gate.ctp.ctpTable import loadTables', 'loadTables()'),
+    ('gatewayDiscovery', GATEWAY_SETUP, 'engine.initGateway()'),
+    ('gatewayImport', GATEWAY_SETUP + 'engine.initGateway()',
+     'for module_name, class_name in engine.gatewayModuleDict.values(): importlib.import_module(module_name)')
+]
+
+
+# ----------------------------------------------------------------------
+def runItem(setup, code):
+    """在新的进程中运行一次测试项，返回耗时（秒）"""
+    process = subprocess.Popen([sys.executable, '-c', CHILD_TEMPLATE % (setup, code)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode:
+        raise RuntimeError(err.strip().splitlines()[-1])
+    return float(out.strip().splitlines()[-1])
+
+
+# ----------------------------------------------------------------------
+def runReport(repeat):
+    """运行所有测试项，返回结果字典"""
+    result = {}
+
+    for name, setup, code in ITEM_LIST:
+        try:
+            # 第一次运行生成pyc和常量表缓存，不计入结果
+            runItem(setup, code)
+            cost_list = [runItem(setup, code) for i in range(repeat)]
+            result[name] = {'min': min(cost_list) * 1000,
+                            'mean': sum(cost_list) / len(cost_list) * 1000}
+        except RuntimeError, e:
+            result[name] = {'error': str(e)}
+
+    # 节省的时间
+    for saved, old, new in [('tableSaved', 'ctpDataType', 'ctpTable'),
+                            ('gatewaySaved', 'gatewayImport', 'gatewayDiscovery')]:
+        if 'min' in result[old] and 'min' in result[new]:
+            result[saved] = result[old]['min'] - result[new]['min']
+
+    return result
+
+
+# ----------------------------------------------------------------------
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description=u'启动导入耗时测试（单位：毫秒）')
+    parser.add_argument('--repeat', type=int, default=5, help=u'每个测试项重复的次数')
+    parser.add_argument('--output', default='', help=u'结果保存的文件名，默认输出到屏幕')
+    args = parser.parse_args()
+
+    result = runReport(args.repeat)
+    text = json.dumps(result, indent=4, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print text
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是无界面的服务器模式入口，不导入PyQt4，适用于在Linux服务器上运行交易程序。
+
+启动后创建MainEngine（包括CtaEngine、DrEngine、RmEngine），连接指定的接口，读取
+CTA_setting.json中的策略，日志输出到屏幕，并在本机的TCP端口上提供命令接口，例如：
+python server.py --connect CTP --init --start    启动服务器，连接CTP，初始化并启动所有策略
+python server.py --send "status"                 向运行中的服务器发送命令
+
+命令接口每行一条命令，返回一行json，支持的命令：
+connect 接口名称                连接接口
+init/start/stop 策略名称|all    初始化、启动、停止策略
+remove 策略名称|all             停止并移除策略，没有其他策略交易的合约会被退订
+status                         查询所有策略的参数和变量
+stats on|off                   开启或关闭事件引擎的性能统计，不带参数时查询统计数据
+exit                           停止服务器
+"""
+
+import argparse
+import inspect
+import json
+import socket
+import sys
+import traceback
+from SocketServer import StreamRequestHandler, ThreadingTCPServer
+from datetime import datetime
+from threading import Thread, Event as ThreadingEvent
+
+from vnpy.engine.vt.vtEngine import MainEngine
+from vnpy.event.eventType import EVENT_LOG, EVENT_ERROR, EVENT_CTA_LOG, EVENT_DATARECORDER_LOG
+
+DEFAULT_HOST = '127.0.0.1'  # 命令接口只监听本机
+DEFAULT_PORT = 20170
+
+
+########################################################################
+class ServerEngine(object):
+    """无界面的服务器引擎，封装MainEngine并执行命令"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.mainEngine = MainEngine()
+        self.eventEngine = self.mainEngine.eventEngine
+        self.ctaEngine = self.mainEngine.ctaEngine
+
+        # 收到exit命令或者中断后设置
+        self.finished = ThreadingEvent()
+
+        # 命令和执行函数的映射字典
+        self.commandDict = {
+            'connect': self.connect,
+            'init': self.initStrategy,
+            'start': self.startStrategy,
+            'stop': self.stopStrategy,
+            'remove': self.removeStrategy,
+            'status': self.getStatus,
+            'stats': self.getStats,
+            'exit': self.exit
+        }
+
+        self.registerEvent()
+
+    # ----------------------------------------------------------------------
+    def registerEvent(self):
+        """注册日志事件监听，输出到屏幕"""
+        self.eventEngine.register(EVENT_LOG, self.processLogEvent)
+        self.eventEngine.register(EVENT_CTA_LOG, self.processLogEvent)
+        self.eventEngine.register(EVENT_DATARECORDER_LOG, self.processLogEvent)
+        self.eventEngine.register(EVENT_ERROR, self.processErrorEvent)
+
+    # ----------------------------------------------------------------------
+    def processLogEvent(self, event):
+        """输出日志"""
+        self.output(event.dict_['data'].logContent)
+
+    # ----------------------------------------------------------------------
+    def processErrorEvent(self, event):
+        """输出错误"""
+        error = event.dict_['data']
+        self.output(u'错误代码：%s，错误信息：%s' % (error.errorID, error.errorMsg))
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def output(content):
+        """带时间戳输出到屏幕"""
+        line = u'%s\t%s\n' % (datetime.now().strftime('%H:%M:%S'), content)
+        sys.stdout.write(line.encode('utf-8'))
+        sys.stdout.flush()
+
+    # ----------------------------------------------------------------------
+    def loadStrategy(self):
+        """读取CTA_setting.json中的策略"""
+        try:
+            self.ctaEngine.loadSetting()
+        except (IOError, ValueError), e:
+            self.output(u'读取策略配置出错：%s' % e)
+
+    # ----------------------------------------------------------------------
+    def execute(self, line):
+        """执行一条命令，返回结果字典"""
+        args = line.split()
+        if not args:
+            return {'error': u'命令为空'}
+
+        func = self.commandDict.get(args[0])
+        if not func:
+            return {'error': u'未知命令：%s' % args[0]}
+
+        # 执行前检查参数数量，避免把命令内部抛出的TypeError当作参数错误
+        if not self.checkArgs(func, len(args) - 1):
+            return {'error': u'命令参数错误：%s' % line}
+
+        try:
+            return {'result': func(*args[1:])}
+        except Exception:
+            return {'error': traceback.format_exc().decode('utf-8', 'replace')}
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def checkArgs(func, count):
+        """检查命令函数能否接收count个参数"""
+        arg_list, varargs, keywords, defaults = inspect.getargspec(func)
+        max_count = len(arg_list) - 1  # 去掉self
+        min_count = max_count - len(defaults or ())
+        return min_count <= count and (varargs is not None or count <= max_count)
+
+    # ----------------------------------------------------------------------
+    def connect(self, gateway_name):
+        """连接接口"""
+        self.mainEngine.connect(gateway_name)
+        return gateway_name
+
+    # ----------------------------------------------------------------------
+    def getStrategyNames(self, name):
+        """获取命令针对的策略名称列表，all为所有策略"""
+        if name == 'all':
+            return self.ctaEngine.strategyDict.keys()
+        return [name]
+
+    # ----------------------------------------------------------------------
+    def initStrategy(self, name):
+        """初始化策略"""
+        names = self.getStrategyNames(name)
+        for strategy_name in names:
+            self.ctaEngine.initStrategy(strategy_name)
+        return names
+
+    # ----------------------------------------------------------------------
+    def startStrategy(self, name):
+        """启动策略"""
+        names = self.getStrategyNames(name)
+        for strategy_name in names:
+            self.ctaEngine.startStrategy(strategy_name)
+        return names
+
+    # ----------------------------------------------------------------------
+    def stopStrategy(self, name):
+        """停止策略"""
+        names = self.getStrategyNames(name)
+        for strategy_name in names:
+            self.ctaEngine.stopStrategy(strategy_name)
+        return names
+
+    # ----------------------------------------------------------------------
+    def removeStrategy(self, name):
+        """停止并移除策略"""
+        names = self.getStrategyNames(name)
+        for strategy_name in names:
+            self.ctaEngine.removeStrategy(strategy_name)
+        return names
+
+    # ----------------------------------------------------------------------
+    def getStatus(self):
+        """查询所有策略的参数和变量"""
+        d = {}
+        for name in self.ctaEngine.strategyDict.keys():
+            d[name] = {'param': self.ctaEngine.getStrategyParam(name),
+                       'var': self.ctaEngine.getStrategyVar(name)}
+        return d
+
+    # ----------------------------------------------------------------------
+    def getStats(self, switch=''):
+        """开启、关闭或者查询事件引擎的性能统计"""
+        if switch == 'on':
+            self.mainEngine.setEventStatsEnabled(True)
+        elif switch == 'off':
+            self.mainEngine.setEventStatsEnabled(False)
+        return self.mainEngine.getEventStats()
+
+    # ----------------------------------------------------------------------
+    def exit(self):
+        """通知主线程停止服务器"""
+        self.finished.set()
+        return True
+
+
+########################################################################
+class CommandHandler(StreamRequestHandler):
+    """命令接口的连接处理，每行一条命令，返回一行json"""
+
+    # ----------------------------------------------------------------------
+    def handle(self):
+        """处理连接"""
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+
+            d = self.server.serverEngine.execute(line.decode('utf-8'))
+            self.wfile.write(json.dumps(d, default=unicode) + '\n')
+            self.wfile.flush()
+
+
+########################################################################
+class CommandServer(ThreadingTCPServer):
+    """命令接口服务器，在单独的线程中运行"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    # ----------------------------------------------------------------------
+    def __init__(self, server_engine, host, port):
+        """Constructor"""
+        ThreadingTCPServer.__init__(self, (host, port), CommandHandler)
+        self.serverEngine = server_engine
+        self.thread = Thread(target=self.serve_forever)
+        self.thread.daemon = True
+
+    # ----------------------------------------------------------------------
+    def start(self):
+        """启动"""
+        self.thread.start()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """停止"""
+        self.shutdown()
+        self.server_close()
+
+
+# ----------------------------------------------------------------------
+def sendCommand(command, host, port):
+    """向运行中的服务器发送一条命令，返回结果字符串"""
+    sock = socket.create_connection((host, port))
+    try:
+        f = sock.makefile('rw')
+        f.write(command + '\n')
+        f.flush()
+        return f.readline().strip()
+    finally:
+        sock.close()
+
+
+# ----------------------------------------------------------------------
+def runServer(args):
+    """启动服务器，直到收到exit命令或者中断"""
+    server_engine = ServerEngine()
+    server_engine.loadStrategy()
+
+    for gateway_name in args.connect:
+        server_engine.connect(gateway_name)
+
+    if args.init:
+        server_engine.initStrategy('all')
+    if args.start:
+        server_engine.startStrategy('all')
+
+    command_server = CommandServer(server_engine, args.host, args.port)
+    command_server.start()
+    server_engine.output(u'服务器已启动，命令接口：%s:%s' % (args.host, args.port))
+
+    # Python 2中不设超时的等待无法被Ctrl+C中断
+    try:
+        while not server_engine.finished.is_set():
+            server_engine.finished.wait(1)
+    except KeyboardInterrupt:
+        pass
+
+    command_server.stop()
+    server_engine.mainEngine.exit()
+    server_engine.output(u'服务器已停止')
+
+
+# ----------------------------------------------------------------------
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description=u'无界面的服务器模式')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=u'命令接口的地址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=u'命令接口的端口')
+    parser.add_argument('--connect', action='append', default=[], help=u'启动后连接的接口，可以指定多个')
+    parser.add_argument('--init', action='store_true', help=u'启动后初始化所有策略')
+    parser.add_argument('--start', action='store_true', help=u'启动后启动所有策略（需要同时指定--init）')
+    parser.add_argument('--send', default='', help=u'向运行中的服务器发送命令后退出')
+    args = parser.parse_args()
+
+    if args.send:
+        print sendCommand(args.send, args.host, args.port)
+    else:
+        runServer(args)
+
+
+if __name__ == '__main__':
+    main()
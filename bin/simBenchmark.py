@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是基于模拟交易所接口（SimGateway）的全链路性能测试，无需CTP连接即可运行。
+
+测试创建完整的MainEngine，连接SIM接口后加载若干个往返测试策略，每个策略交易一个合约：
+收到tick后以对价买入开仓，成交后再以对价卖出平仓，如此往复。统计的指标包括：
+1. CtaEngine发单 -> RmEngine风控检查 -> SimGateway撮合 -> 成交推送回到策略的往返延时
+2. 测试期间每秒处理的tick数量
+为了让风控检查照常执行但不拦截测试委托，测试时会放宽RmEngine的各项限制。
+
+测试结果以json格式输出，例如：
+python simBenchmark.py --symbols 1000 --strategies 10 --tickRate 20000 --latency 1
+"""
+
+from __future__ import division
+
+import argparse
+import json
+import time
+from threading import Event as ThreadingEvent
+
+from eventBenchmark import summarizeLatency, timer
+from vnpy.engine.cta.ctaSetting import STRATEGY_CLASS
+from vnpy.engine.cta.ctaTemplate import CtaTemplate
+from vnpy.engine.vt.vtEngine import MainEngine
+from vnpy.utils.vtGateway import *
+
+GATEWAY_NAME = 'SIM'
+LIMIT = 10 ** 9  # 放宽后的风控限制
+
+
+########################################################################
+class RoundTripStrategy(CtaTemplate):
+    """往返测试策略，没有持仓时买入开仓，有持仓时卖出平仓，记录发单到成交的延时"""
+
+    className = 'RoundTripStrategy'
+    author = u'模拟测试'
+
+    # ----------------------------------------------------------------------
+    def __init__(self, cta_engine, setting):
+        """Constructor"""
+        super(RoundTripStrategy, self).__init__(cta_engine, setting)
+
+        self.workingOrderID = ''  # 等待成交的委托
+        self.sendTime = 0  # 发单时间
+        self.latencyList = []  # 往返延时
+
+    # ----------------------------------------------------------------------
+    def onInit(self):
+        """初始化策略"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def onStart(self):
+        """启动策略"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def onStop(self):
+        """停止策略"""
+        pass
+
+    # ----------------------------------------------------------------------
+    def onTick(self, tick):
+        """收到行情后，没有等待成交的委托时发单"""
+        if not self.trading or self.workingOrderID:
+            return
+
+        self.sendTime = timer()
+        if not self.pos:
+            self.workingOrderID = self.buy(tick.askPrice1, 1)
+        else:
+            self.workingOrderID = self.sell(tick.bidPrice1, 1)
+
+    # ----------------------------------------------------------------------
+    def onOrder(self, order):
+        """委托被拒绝或者撤销时，下一个tick重新发单"""
+        if order.status == STATUS_CANCELLED:
+            self.workingOrderID = ''
+
+    # ----------------------------------------------------------------------
+    def onTrade(self, trade):
+        """记录往返延时"""
+        self.latencyList.append(timer() - self.sendTime)
+        self.workingOrderID = ''
+
+    # ----------------------------------------------------------------------
+    def onBar(self, bar):
+        """不使用K线"""
+        pass
+
+
+# ----------------------------------------------------------------------
+def runBenchmark(args):
+    """运行测试，返回结果字典"""
+    main_engine = MainEngine()
+    event_engine = main_engine.eventEngine
+
+    # 放宽风控限制
+    rm_engine = main_engine.rmEngine
+    rm_engine.orderFlowLimit = rm_engine.tradeLimit = rm_engine.workingOrderLimit = rm_engine.orderSizeLimit = LIMIT
+
+    # 统计处理的tick数量
+    tick_count = [0]
+
+    def onTick(event):
+        tick_count[0] += 1
+    event_engine.register(EVENT_TICK, onTick)
+
+    gateway = main_engine.getGateway(GATEWAY_NAME)
+    gateway.connect({
+        'symbolCount': args.symbols,
+        'tickRate': args.tickRate,
+        'pushAll': True,
+        'latency': args.latency,
+        'latencyJitter': args.jitter,
+        'partialRatio': args.partialRatio,
+        'seed': 0
+    })
+
+    # 等待合约推送完成
+    last_symbol = 'SIM%04d' % (args.symbols - 1)
+    while not main_engine.getContract(last_symbol):
+        time.sleep(0.01)
+
+    # 加载往返测试策略，每个策略交易不同的合约
+    STRATEGY_CLASS[RoundTripStrategy.className] = RoundTripStrategy
+    cta_engine = main_engine.ctaEngine
+    name_list = []
+    for i in range(args.strategies):
+        name = 'roundTrip%d' % i
+        cta_engine.loadStrategy({'name': name,
+                                 'className': RoundTripStrategy.className,
+                                 'vtSymbol': 'SIM%04d' % (i * args.symbols // args.strategies)})
+        cta_engine.initStrategy(name)
+        cta_engine.startStrategy(name)
+        name_list.append(name)
+
+    start_count = tick_count[0]
+    start = timer()
+    ThreadingEvent().wait(args.duration)
+    elapsed = timer() - start
+    end_count = tick_count[0]
+
+    for name in name_list:
+        cta_engine.stopStrategy(name)
+
+    latency_list = []
+    for name in name_list:
+        latency_list.extend(cta_engine.strategyDict[name].latencyList)
+
+    main_engine.exit()
+
+    return {
+        'symbols': args.symbols,
+        'strategies': args.strategies,
+        'tickRate': args.tickRate,
+        'gatewayLatencyMs': args.latency,
+        'ticksPerSec': (end_count - start_count) / elapsed,
+        'roundTripLatencyUs': summarizeLatency(latency_list)
+    }
+
+
+# ----------------------------------------------------------------------
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description=u'基于模拟交易所接口的全链路性能测试')
+    parser.add_argument('--symbols', type=int, default=1000, help=u'合约数量')
+    parser.add_argument('--strategies', type=int, default=10, help=u'往返测试策略的数量')
+    parser.add_argument('--tickRate', type=int, default=10000, help=u'每秒推送的tick总数，0为尽可能快')
+    parser.add_argument('--latency', type=float, default=0, help=u'委托到达模拟交易所的延时（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help=u'委托延时的随机部分（毫秒）')
+    parser.add_argument('--partialRatio', type=float, default=0, help=u'部分成交的比例')
+    parser.add_argument('--duration', type=float, default=10, help=u'测试时间（秒）')
+    parser.add_argument('--output', default='', help=u'结果保存的文件名，默认输出到屏幕')
+    args = parser.parse_args()
+
+    result = runBenchmark(args)
+    text = json.dumps(result, indent=4, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print text
+
+
+if __name__ == '__main__':
+    main()
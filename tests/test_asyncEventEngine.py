@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from threading import Event as ThreadEvent
+
+try:
+    from vnpy.event.asyncEventEngine import AsyncEventEngine
+except ImportError:
+    # Python 2下没有安装trollius
+    AsyncEventEngine = None
+
+from vnpy.event.eventEngine import Event
+
+
+########################################################################
+@unittest.skipIf(AsyncEventEngine is None, u'需要asyncio或trollius')
+class AsyncEventEngineTest(unittest.TestCase):
+    """asyncio事件引擎"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.engine = AsyncEventEngine()
+        self.engine.start()
+
+    # ----------------------------------------------------------------------
+    def tearDown(self):
+        self.engine.stop()
+
+    # ----------------------------------------------------------------------
+    def testPutAfterStop(self):
+        self.engine.stop()
+        self.engine.put(Event(type_='eTest'))
+
+    # ----------------------------------------------------------------------
+    def testRegisterDuringDispatch(self):
+        """处理函数中注册的处理函数从下一个事件开始生效"""
+        called = []
+        done = ThreadEvent()
+
+        def handler2(event):
+            called.append((2, event.dict_['data']))
+
+        def handler1(event):
+            called.append((1, event.dict_['data']))
+            self.engine.register('eTest', handler2)
+
+        def onDone(event):
+            done.set()
+
+        self.engine.register('eTest', handler1)
+        self.engine.register('eDone', onDone)
+
+        for i in range(2):
+            event = Event(type_='eTest')
+            event.dict_['data'] = i
+            self.engine.put(event)
+        self.engine.put(Event(type_='eDone'))
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(called, [(1, 0), (1, 1), (2, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
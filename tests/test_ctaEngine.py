@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from vnpy.engine.cta import ctaSetting
+from vnpy.engine.cta.ctaEngine import CtaEngine
+from vnpy.engine.cta.ctaConstant import CTAORDER_BUY
+from vnpy.engine.cta.ctaTemplate import CtaTemplate
+from vnpy.event.eventEngine import Event, EventEngine2
+from vnpy.event.eventType import EVENT_TICK
+from vnpy.utils.vtConstant import DIRECTION_LONG
+from vnpy.utils.vtGateway import VtContractData, VtTickData
+
+
+########################################################################
+class EmptyStrategy(CtaTemplate):
+    """不做任何操作的策略"""
+    className = 'EmptyStrategy'
+
+    # ----------------------------------------------------------------------
+    def onInit(self):
+        pass
+
+    # ----------------------------------------------------------------------
+    def onStart(self):
+        pass
+
+    # ----------------------------------------------------------------------
+    def onStop(self):
+        pass
+
+
+########################################################################
+class FakeMainEngine(object):
+    """记录订阅和退订的主引擎"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        self.requestList = []
+
+    # ----------------------------------------------------------------------
+    def getContract(self, vt_symbol):
+        contract = VtContractData()
+        contract.symbol = contract.vtSymbol = vt_symbol
+        contract.gatewayName = 'SIM'
+        return contract
+
+    # ----------------------------------------------------------------------
+    def subscribe(self, req, gateway_name):
+        self.requestList.append(('sub', req.symbol))
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, req, gateway_name):
+        self.requestList.append(('unsub', req.symbol))
+
+    # ----------------------------------------------------------------------
+    def sendOrder(self, req, gateway_name):
+        self.requestList.append(('order', req.symbol, req.direction, req.price))
+        return '%s.%d' % (gateway_name, len(self.requestList))
+
+
+########################################################################
+class RemoveStrategyTest(unittest.TestCase):
+    """移除策略"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        ctaSetting.STRATEGY_CLASS['EmptyStrategy'] = EmptyStrategy
+        self.mainEngine = FakeMainEngine()
+        self.ctaEngine = CtaEngine(self.mainEngine, EventEngine2())
+
+        for name in ['a', 'b']:
+            self.ctaEngine.loadStrategy({'name': name, 'className': 'EmptyStrategy', 'vtSymbol': 'rb1801'})
+
+    # ----------------------------------------------------------------------
+    def tearDown(self):
+        del ctaSetting.STRATEGY_CLASS['EmptyStrategy']
+
+    # ----------------------------------------------------------------------
+    def testRemove(self):
+        engine = self.ctaEngine
+        engine.initStrategy('a')
+        engine.startStrategy('a')
+
+        engine.removeStrategy('a')
+        self.assertNotIn('a', engine.strategyDict)
+        self.assertEqual([s.name for s in engine.tickStrategyDict['rb1801']], ['b'])
+        self.assertEqual(self.mainEngine.requestList[-1], ('unsub', 'rb1801'))
+
+        engine.removeStrategy('b')
+        engine.removeStrategy('b')
+        self.assertEqual(engine.tickStrategyDict, {})
+        self.assertEqual(engine.subscribeDict, {})
+        self.assertEqual(self.mainEngine.requestList.count(('unsub', 'rb1801')), 2)
+
+
+########################################################################
+class StopOrderTest(unittest.TestCase):
+    """本地停止单"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        ctaSetting.STRATEGY_CLASS['EmptyStrategy'] = EmptyStrategy
+        self.mainEngine = FakeMainEngine()
+        self.ctaEngine = CtaEngine(self.mainEngine, EventEngine2())
+
+        self.ctaEngine.loadStrategy({'name': 'a', 'className': 'EmptyStrategy', 'vtSymbol': 'rb1801'})
+        self.strategy = self.ctaEngine.strategyDict['a']
+
+    # ----------------------------------------------------------------------
+    def tearDown(self):
+        del ctaSetting.STRATEGY_CLASS['EmptyStrategy']
+
+    # ----------------------------------------------------------------------
+    def putTick(self, vt_symbol, price):
+        tick = VtTickData()
+        tick.vtSymbol = vt_symbol
+        tick.lastPrice = price
+        tick.upperLimit = 3300.0
+        tick.lowerLimit = 2700.0
+        tick.date = '20161018'
+        tick.time = '09:30:00.0'
+
+        event = Event(type_=EVENT_TICK)
+        event.dict_['data'] = tick
+        self.ctaEngine.procecssTickEvent(event)
+
+    # ----------------------------------------------------------------------
+    def testOtherSymbol(self):
+        """停止单的合约没有策略订阅行情时，也要在收到该合约的行情时触发"""
+        engine = self.ctaEngine
+        stop_order_id = engine.sendStopOrder('rb1805', CTAORDER_BUY, 3000.0, 1, self.strategy)
+
+        self.putTick('rb1805', 2999.0)
+        self.assertIn(stop_order_id, engine.workingStopOrderDict)
+
+        self.putTick('rb1805', 3000.0)
+        self.assertNotIn(stop_order_id, engine.workingStopOrderDict)
+        self.assertEqual(self.mainEngine.requestList[-1], ('order', 'rb1805', DIRECTION_LONG, 3300.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from Queue import Queue
+from threading import Thread
+from time import sleep
+
+from vnpy.engine.cta import ctaProcess
+from vnpy.engine.cta.ctaBase import CtaTickData
+from vnpy.engine.cta.ctaProcess import *
+
+
+########################################################################
+class RecordEngine(CtaProcessEngine):
+    """记录处理顺序的子进程引擎"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, ring, command_queue, reply_queue=None):
+        super(RecordEngine, self).__init__('g1', ring, command_queue, Queue(), reply_queue or Queue(),
+                                           WakeupSignal())
+        self.recordList = []
+
+    # ----------------------------------------------------------------------
+    def processTick(self, tick):
+        self.recordList.append(tick.lastPrice)
+
+    # ----------------------------------------------------------------------
+    def processCommand(self, command, name, data):
+        self.recordList.append(command)
+        super(RecordEngine, self).processCommand(command, name, data)
+
+
+########################################################################
+class CtaProcessEngineTest(unittest.TestCase):
+    """子进程中的CTA策略引擎"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.timeout = ctaProcess.REQUEST_TIMEOUT
+        ctaProcess.REQUEST_TIMEOUT = 0.01
+
+    # ----------------------------------------------------------------------
+    def tearDown(self):
+        ctaProcess.REQUEST_TIMEOUT = self.timeout
+
+    # ----------------------------------------------------------------------
+    def testRunOrder(self):
+        """tick和命令按照主进程中的编号顺序处理"""
+        ring = TickRing(16)
+        command_queue = Queue()
+
+        for seq, price in [(1, 1.0), (2, 2.0), (4, 4.0)]:
+            tick = CtaTickData()
+            tick.lastPrice = price
+            ring.put(packTick(tick), seq)
+
+        command_queue.put((3, COMMAND_ORDER, 's1', None))
+        command_queue.put((5, COMMAND_EXIT, None, None))
+
+        engine = RecordEngine(ring, command_queue)
+        engine.signal.publish(5)
+        engine.run()
+
+        self.assertEqual(engine.recordList, [1.0, 2.0, COMMAND_ORDER, 4.0, COMMAND_EXIT])
+
+    # ----------------------------------------------------------------------
+    def testCallTimeout(self):
+        """超时抛出异常，之前超时的请求的结果被丢弃"""
+        reply_queue = Queue()
+        engine = RecordEngine(TickRing(16), Queue(), reply_queue)
+
+        self.assertRaises(RequestTimeout, engine.call, 'loadBar', 'db', 'IF', 1)
+
+        reply_queue.put((1, ['stale']))
+        reply_queue.put((2, ['bar']))
+        self.assertEqual(engine.call('loadBar', 'db', 'IF', 1), ['bar'])
+
+    # ----------------------------------------------------------------------
+    def testSendOrderNoTimeout(self):
+        """发单不设超时，超过REQUEST_TIMEOUT才返回的委托号依然交给策略"""
+
+        class Strategy(object):
+            name = 's1'
+
+        reply_queue = Queue()
+        engine = RecordEngine(TickRing(16), Queue(), reply_queue)
+
+        def reply():
+            sleep(ctaProcess.REQUEST_TIMEOUT * 5)
+            reply_queue.put((1, 'CTP.1'))
+
+        thread = Thread(target=reply)
+        thread.start()
+        self.assertEqual(engine.sendOrder('rb1801', CTAORDER_BUY, 3000, 1, Strategy()), 'CTP.1')
+        thread.join()
+
+    # ----------------------------------------------------------------------
+    def testWaitForData(self):
+        """没有数据时阻塞等待，收到通知后处理新的tick，以及通知后才到达的命令"""
+        ring = TickRing(16)
+        command_queue = Queue()
+        engine = RecordEngine(ring, command_queue)
+
+        thread = Thread(target=engine.run)
+        thread.start()
+
+        tick = CtaTickData()
+        tick.lastPrice = 1.0
+        ring.put(packTick(tick), 1)
+        engine.signal.publish(1)
+
+        # 命令的编号先于命令本身到达
+        engine.signal.publish(2)
+        sleep(0.01)
+        command_queue.put((2, COMMAND_EXIT, None, None))
+
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(engine.recordList, [1.0, COMMAND_EXIT])
+
+    # ----------------------------------------------------------------------
+    def testInitTimeout(self):
+        """初始化时读取数据超时，策略保持未初始化状态"""
+
+        class Strategy(object):
+            name = 's1'
+            varList = ['inited']
+            inited = False
+
+            def onInit(self):
+                engine.loadBar('db', 'IF', 1)
+
+        engine = RecordEngine(TickRing(16), Queue())
+        engine.strategyDict['s1'] = Strategy()
+        engine.safeCall(engine.processCommand, COMMAND_INIT, 's1', None)
+
+        self.assertFalse(engine.strategyDict['s1'].inited)
+
+    # ----------------------------------------------------------------------
+    def testRemove(self):
+        """移除命令删除子进程中的策略实例"""
+
+        class Strategy(object):
+            name = 's1'
+            vtSymbol = 'rb1801'
+
+        engine = RecordEngine(TickRing(16), Queue())
+        strategy = Strategy()
+        engine.strategyDict['s1'] = strategy
+        engine.tickStrategyDict['rb1801'] = [strategy]
+
+        engine.processCommand(COMMAND_REMOVE, 's1', None)
+        engine.processCommand(COMMAND_REMOVE, 's1', None)
+
+        self.assertEqual(engine.strategyDict, {})
+        self.assertEqual(engine.tickStrategyDict, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+import unittest
+from datetime import datetime
+
+from vnpy.gate.ctp.ctpConvert import *
+
+
+# ----------------------------------------------------------------------
+def newTickData(update_time='09:30:01', millisec=500):
+    """生成CTP的行情回报字典"""
+    return {
+        'InstrumentID': 'rb1701',
+        'ExchangeID': 'SHFE',
+        'LastPrice': 3000.0,
+        'Volume': 100,
+        'OpenInterest': 100000,
+        'UpdateTime': update_time,
+        'UpdateMillisec': millisec,
+        'TradingDay': '20161018',
+        'OpenPrice': 3000.0,
+        'HighestPrice': 3050.0,
+        'LowestPrice': 2990.0,
+        'PreClosePrice': 3001.0,
+        'UpperLimitPrice': 3200.0,
+        'LowerLimitPrice': 2800.0,
+        'BidPrice1': 2999.0,
+        'BidVolume1': 10,
+        'AskPrice1': 3001.0,
+        'AskVolume1': 12
+    }
+
+
+########################################################################
+class ConvertTest(unittest.TestCase):
+    """CTP回报转换"""
+
+    # ----------------------------------------------------------------------
+    def testLazyMaps(self):
+        """导入时不加载CTP常量表"""
+        code = ('from vnpy.gate.ctp import ctpConvert, ctpTable; '
+                'import sys; sys.exit(1 if ctpTable.tableCache else 0)')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        self.assertEqual(subprocess.call([sys.executable, '-c', code], env=env), 0)
+
+    # ----------------------------------------------------------------------
+    def testTick(self):
+        tick = convertTick(newTickData(), 'CTP')
+        self.assertEqual(tick.gatewayName, 'CTP')
+        self.assertEqual(tick.vtSymbol, 'rb1701')
+        self.assertEqual(tick.exchange, EXCHANGE_SHFE)
+        self.assertEqual(tick.time, '09:30:01.5')
+        self.assertEqual(tick.datetime, datetime(2016, 10, 18, 9, 30, 1, 500000))
+        self.assertEqual(tick.bidVolume1, 10)
+
+    # ----------------------------------------------------------------------
+    def testTickMillisecOutOfRange(self):
+        """毫秒数超出范围时不抛出异常"""
+        tick = convertTick(newTickData(millisec=1500), 'CTP')
+        self.assertEqual(tick.time, '09:30:01.15')
+        self.assertEqual(tick.datetime, datetime(2016, 10, 18, 9, 30, 1, 150000))
+
+        tick = convertTick(newTickData(millisec=-1), 'CTP')
+        self.assertEqual(tick.time, '09:30:01.-1')
+        self.assertIsNone(tick.datetime)
+
+    # ----------------------------------------------------------------------
+    def orderData(self, status):
+        """构造委托回报数据"""
+        return {
+            'InstrumentID': 'rb1701',
+            'ExchangeID': 'XXX',
+            'OrderRef': '12',
+            'Direction': directionMap[DIRECTION_SHORT],
+            'CombOffsetFlag': offsetMap[OFFSET_CLOSETODAY],
+            'OrderStatus': defineDict[status],
+            'LimitPrice': 3000.0,
+            'VolumeTotalOriginal': 10,
+            'VolumeTraded': 3,
+            'InsertTime': '09:30:00',
+            'CancelTime': '',
+            'FrontID': 1,
+            'SessionID': 123456
+        }
+
+    # ----------------------------------------------------------------------
+    def testOrder(self):
+        loadMaps()
+        order = convertOrder(self.orderData('THOST_FTDC_OST_PartTradedQueueing'), 'CTP')
+        self.assertEqual(order.vtOrderID, 'CTP.12')
+        self.assertEqual(order.exchange, EXCHANGE_UNKNOWN)
+        self.assertEqual(order.direction, DIRECTION_SHORT)
+        self.assertEqual(order.offset, OFFSET_CLOSETODAY)
+        self.assertEqual(order.status, STATUS_PARTTRADED)
+        self.assertEqual(order.tradedVolume, 3)
+
+    # ----------------------------------------------------------------------
+    def testPartTradedNotQueueing(self):
+        loadMaps()
+        order = convertOrder(self.orderData('THOST_FTDC_OST_PartTradedNotQueueing'), 'CTP')
+        self.assertEqual(order.status, STATUS_CANCELLED)
+        self.assertEqual(order.tradedVolume, 3)
+
+    # ----------------------------------------------------------------------
+    def testNoTradeNotQueueing(self):
+        loadMaps()
+        order = convertOrder(self.orderData('THOST_FTDC_OST_NoTradeNotQueueing'), 'CTP')
+        self.assertEqual(order.status, STATUS_CANCELLED)
+
+    # ----------------------------------------------------------------------
+    def testTrade(self):
+        loadMaps()
+        data = {
+            'InstrumentID': 'rb1701',
+            'ExchangeID': 'SHFE',
+            'TradeID': '      7',
+            'OrderRef': '12',
+            'Direction': directionMap[DIRECTION_LONG],
+            'OffsetFlag': 'x',
+            'Price': 3000.0,
+            'Volume': 1,
+            'TradeTime': '09:30:00'
+        }
+        trade = convertTrade(data, 'CTP')
+        self.assertEqual(trade.vtTradeID, 'CTP.      7')
+        self.assertEqual(trade.vtOrderID, 'CTP.12')
+        self.assertEqual(trade.direction, DIRECTION_LONG)
+        self.assertEqual(trade.offset, EMPTY_STRING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import types
+import unittest
+
+# CTP的API是Windows上编译的扩展模块，无法导入时使用空的API类代替，只测试接口中的Python逻辑
+for module_name, class_name in [('vnctpmd', 'MdApi'), ('vnctptd', 'TdApi')]:
+    try:
+        __import__('vnpy.ext.' + module_name)
+    except ImportError:
+        module = types.ModuleType('vnpy.ext.' + module_name)
+        setattr(module, class_name, type(class_name, (object,), {}))
+        sys.modules['vnpy.ext.' + module_name] = module
+
+from vnpy.event.eventEngine import EventEngine2
+from vnpy.gate.ctp.ctpGateway import CtpGateway, QUERY_ACCOUNT
+
+
+########################################################################
+class AccountQueryTest(unittest.TestCase):
+    """资金查询回报的变化判断"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.gateway = CtpGateway(EventEngine2())
+        self.resultList = []
+        self.gateway.onQueryResult = lambda name, changed: self.resultList.append((name, changed))
+
+    # ----------------------------------------------------------------------
+    def query(self, **kwargs):
+        data = dict.fromkeys(['PreBalance', 'Available', 'Commission', 'CurrMargin', 'CloseProfit',
+                              'PositionProfit', 'PreCredit', 'PreMortgage', 'Mortgage', 'Withdraw',
+                              'Deposit', 'CashIn'], 0.0)
+        data['AccountID'] = '001'
+        data.update(kwargs)
+        self.gateway.tdApi.onRspQryTradingAccount(data, {}, 1, True)
+        return self.resultList[-1]
+
+    # ----------------------------------------------------------------------
+    def testMarkToMarket(self):
+        """持仓盈亏随行情变化不算作资金变化"""
+        self.assertEqual(self.query(CurrMargin=1000.0), (QUERY_ACCOUNT, True))
+        self.assertEqual(self.query(CurrMargin=1000.0, PositionProfit=50.0, Available=1050.0),
+                         (QUERY_ACCOUNT, False))
+        self.assertEqual(self.query(CurrMargin=2000.0, PositionProfit=50.0), (QUERY_ACCOUNT, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
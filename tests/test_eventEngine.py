@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from vnpy.event.eventEngine import *
+from vnpy.utils.vtGateway import VtTickData
+
+
+########################################################################
+class PressureConflateTest(unittest.TestCase):
+    """有界队列已满时按POLICY_CONFLATE合并行情"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.engine = EventEngine2(max_queue_size=2)
+        self.engine.register(EVENT_TICK, lambda event: None)
+        self.worker = self.engine._EventEngine2__globalWorker
+
+    # ----------------------------------------------------------------------
+    def put(self, price):
+        tick = VtTickData()
+        tick.vtSymbol = 'rb1801'
+        tick.lastPrice = price
+
+        event = Event(type_=EVENT_TICK)
+        event.dict_['data'] = tick
+        self.engine.put(event)
+
+    # ----------------------------------------------------------------------
+    def pop(self, n):
+        with self.worker.condition:
+            event_list = self.worker.popBatch(n)
+        return [event.dict_['data'].lastPrice for event in event_list]
+
+    # ----------------------------------------------------------------------
+    def testConflate(self):
+        for price in range(4):
+            self.put(price)
+        self.assertEqual(self.pop(10), [0, 1, 3])
+
+    # ----------------------------------------------------------------------
+    def testOrderAfterRefill(self):
+        price_list = []
+
+        # 填满队列，第3个行情进入合并位置
+        for price in range(3):
+            self.put(price)
+
+        # 取出部分事件后队列未满，新的行情按普通方式入队，排在合并位置之后
+        price_list.extend(self.pop(2))
+        self.put(3)
+
+        # 队列再次填满，之后的行情不能合并到已经排在前面的位置中
+        self.put(4)
+        self.put(5)
+        price_list.extend(self.pop(10))
+
+        self.assertEqual(price_list, sorted(price_list))
+        self.assertEqual(price_list[-1], 5)
+
+
+########################################################################
+class SpillTest(unittest.TestCase):
+    """有界队列已满时按POLICY_SPILL暂存到磁盘"""
+
+    # ----------------------------------------------------------------------
+    def testQueueSizeOne(self):
+        engine = EventEngine2(max_queue_size=1, policy_dict={EVENT_LOG: POLICY_SPILL})
+        engine.register(EVENT_LOG, lambda event: None)
+        worker = engine._EventEngine2__globalWorker
+
+        for i in range(10):
+            event = Event(type_=EVENT_LOG)
+            event.dict_['data'] = i
+            engine.put(event)
+
+        # 每次取出事件后，暂存的事件需要读回队列
+        data_list = []
+        with worker.condition:
+            for i in range(20):
+                event_list = worker.popBatch(10)
+                if not event_list:
+                    break
+                data_list.extend([event.dict_['data'] for event in event_list])
+
+        self.assertEqual(data_list, range(10))
+
+
+########################################################################
+class HookDict(dict):
+    """第一次get时调用hook的前缀树节点，用于在match遍历途中插入注册操作"""
+
+    # ----------------------------------------------------------------------
+    def get(self, key, default=None):
+        hook, self.hook = getattr(self, 'hook', None), None
+        if hook:
+            hook()
+        return dict.get(self, key, default)
+
+
+########################################################################
+class TopicTrieTest(unittest.TestCase):
+    """通配符前缀树的匹配和缓存"""
+
+    # ----------------------------------------------------------------------
+    def handler1(self, event):
+        pass
+
+    # ----------------------------------------------------------------------
+    def handler2(self, event):
+        pass
+
+    # ----------------------------------------------------------------------
+    def testMatch(self):
+        trie = TopicTrie()
+        trie.add('e', self.handler1)
+        trie.add('eTick.', self.handler2)
+
+        self.assertEqual(trie.match('eTick.rb1801'), (self.handler1, self.handler2))
+        self.assertEqual(trie.match('eLog'), (self.handler1,))
+
+        trie.remove('e', self.handler1)
+        self.assertEqual(trie.match('eLog'), ())
+
+    # ----------------------------------------------------------------------
+    def testAddDuringMatch(self):
+        trie = TopicTrie()
+        trie.add('eT', self.handler1)
+
+        # match已经走过'e'节点后，在'eT'节点上注册'e'前缀的处理函数
+        node = trie.root['e']
+        node['T'] = HookDict(node['T'])
+        node['T'].hook = lambda: trie.add('e', self.handler2)
+
+        self.assertEqual(trie.match('eTick'), (self.handler1,))
+        self.assertEqual(trie.match('eTick'), (self.handler2, self.handler1))
+
+
+if __name__ == '__main__':
+    unittest.main()
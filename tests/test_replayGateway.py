@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import unittest
+from datetime import datetime, timedelta
+from Queue import Queue
+from threading import Thread, Lock
+
+from vnpy.gate.replay.replayGateway import TickStream
+
+
+# ----------------------------------------------------------------------
+def makeTicks(symbol, start, count, step):
+    """生成按时间排序的tick字典"""
+    return [{'vtSymbol': symbol, 'datetime': start + timedelta(seconds=i * step)}
+            for i in range(count)]
+
+
+########################################################################
+class HookLock(object):
+    """第一次加锁前调用hook的锁，用于模拟行情线程在读取线程清除标志前取走批次"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, hook):
+        self.lock = Lock()
+        self.hook = hook
+
+    # ----------------------------------------------------------------------
+    def __enter__(self):
+        hook, self.hook = self.hook, None
+        if hook:
+            hook()
+        self.lock.acquire()
+
+    # ----------------------------------------------------------------------
+    def __exit__(self, *args):
+        self.lock.release()
+
+
+########################################################################
+class TickStreamTest(unittest.TestCase):
+    """单个合约的tick数据流"""
+
+    # ----------------------------------------------------------------------
+    def testRequestDuringLoad(self):
+        """读取线程清除标志前行情线程取走批次，读取线程需要继续补充"""
+        loader_queue = Queue()
+        stream = TickStream('rb1801', iter(makeTicks('rb1801', datetime(2016, 10, 18, 9), 10, 1)),
+                            2, 1, loader_queue)
+        stream.request()
+        self.assertIs(loader_queue.get_nowait(), stream)
+
+        taken = []
+
+        def consume():
+            taken.append(stream.batchQueue.get_nowait())
+            stream.request()
+
+        stream.lock = HookLock(consume)
+        stream.load()
+
+        # 行情线程的请求被忽略，但读取线程已经补充了批次，不会相互等待
+        self.assertEqual(len(taken), 1)
+        self.assertEqual(stream.batchQueue.qsize(), 1)
+        self.assertTrue(loader_queue.empty())
+        self.assertFalse(stream.requested)
+
+    # ----------------------------------------------------------------------
+    def testMerge(self):
+        """多个合约的数据流在读取线程中读取，按照时间归并"""
+        loader_queue = Queue()
+        start = datetime(2016, 10, 18, 9)
+        tick_dict = {
+            'rb1801': makeTicks('rb1801', start, 53, 2),
+            'cu1801': makeTicks('cu1801', start + timedelta(seconds=1), 31, 3)
+        }
+
+        def runLoader():
+            while True:
+                stream = loader_queue.get()
+                if stream is None:
+                    break
+                stream.load()
+
+        thread = Thread(target=runLoader)
+        thread.start()
+
+        try:
+            iterator_list = []
+            for index, symbol in enumerate(sorted(tick_dict)):
+                stream = TickStream(symbol, iter(tick_dict[symbol]), 4, 1, loader_queue)
+                stream.request()
+                iterator_list.append(stream.iterItems(index))
+
+            dt_list = [dt for dt, index, d in heapq.merge(*iterator_list)]
+        finally:
+            loader_queue.put(None)
+            thread.join()
+
+        self.assertEqual(len(dt_list), 53 + 31)
+        self.assertEqual(dt_list, sorted(dt_list))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from vnpy.event.timerWheel import *
+
+
+########################################################################
+class TimerWheelTest(unittest.TestCase):
+    """分层时间轮"""
+
+    # ----------------------------------------------------------------------
+    def advanceTo(self, wheel, target):
+        """按照事件引擎的方式前进到target，返回{任务: 到期的刻度}"""
+        fired = {}
+        while wheel.currentTick < target:
+            wheel.skip(target)
+            for task in wheel.advance():
+                fired[task] = wheel.currentTick
+        return fired
+
+    # ----------------------------------------------------------------------
+    def testExpire(self):
+        """跳过空闲刻度后任务依然在到期的刻度执行，包括需要重新分配的高层任务"""
+        rng = random.Random(0)
+        wheel = TimerWheel()
+        task_list = []
+        for expire in [1, 255, 256, 257, 65535, 65536, 65537, 70000] + [rng.randint(1, 200000) for _ in range(200)]:
+            task = TimerTask(None, 0, False)
+            wheel.add(task, expire)
+            task_list.append(task)
+        self.assertEqual(wheel.count, len(task_list))
+
+        fired = {}
+        for target in [100, 256, 60000, 65536, 200000]:
+            fired.update(self.advanceTo(wheel, target))
+
+        self.assertEqual(wheel.count, 0)
+        for task in task_list:
+            self.assertEqual(fired[task], task.expire)
+
+    # ----------------------------------------------------------------------
+    def testSkipEmpty(self):
+        """没有任务时一次前进到目标刻度"""
+        wheel = TimerWheel()
+        wheel.skip(1000000)
+        self.assertEqual(wheel.currentTick, 999999)
+
+        task = TimerTask(None, 0, False)
+        wheel.add(task, 1000010)
+        wheel.skip(2000000)
+        self.assertTrue(wheel.currentTick < 1000010)
+        self.assertEqual(self.advanceTo(wheel, 2000000), {task: 1000010})
+
+    # ----------------------------------------------------------------------
+    def testRemove(self):
+        wheel = TimerWheel()
+        task = TimerTask(None, 0, False)
+        wheel.add(task, 300)
+        wheel.remove(task)
+        wheel.remove(task)
+        self.assertEqual(wheel.count, 0)
+        self.assertEqual(self.advanceTo(wheel, 1000), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from datetime import datetime
+
+from vnpy.utils.vtFunction import TickTimeParser
+
+
+########################################################################
+class TickTimeParserTest(unittest.TestCase):
+    """tick时间解析，结果和strptime相同"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.parser = TickTimeParser()
+
+    # ----------------------------------------------------------------------
+    def check(self, date, time):
+        expected = datetime.strptime(' '.join([date, time]), '%Y%m%d %H:%M:%S.%f')
+        self.assertEqual(self.parser.parse(date, time), expected)
+
+    # ----------------------------------------------------------------------
+    def testCache(self):
+        """同一秒、跨秒以及跨日的时间"""
+        for date, time in [('20161018', '09:30:01.0'), ('20161018', '09:30:01.5'),
+                           ('20161018', '09:30:02.5'), ('20161019', '09:30:02.5'),
+                           ('20161019', '21:00:00.123456'), ('20161019', '21:00:00.12')]:
+            self.check(date, time)
+
+    # ----------------------------------------------------------------------
+    def testNonStandard(self):
+        """非标准格式交给strptime处理"""
+        self.check('20161018', '9:30:01.5')
+
+    # ----------------------------------------------------------------------
+    def testInvalid(self):
+        for time in ['09:30:01.1234567', '09:30:01.-1', '09:3x:01.5']:
+            self.assertRaises(ValueError, self.parser.parse, '20161018', time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import types
+import unittest
+
+from vnpy.utils import vtGateway
+from vnpy.utils.vtGateway import *
+
+
+########################################################################
+class VtSubscriptionManagerTest(unittest.TestCase):
+    """行情订阅管理"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.requestList = []
+        self.manager = VtSubscriptionManager(
+            lambda symbol_list: self.requestList.append(('sub', symbol_list)),
+            lambda symbol_list: self.requestList.append(('unsub', symbol_list)))
+
+    # ----------------------------------------------------------------------
+    def testBatchBeforeLogin(self):
+        """登录前的订阅在上线后一次性发送"""
+        for symbol in ['rb1801', 'cu1801', 'rb1801']:
+            self.manager.subscribe(symbol)
+        self.manager.flush()
+        self.assertEqual(self.requestList, [])
+
+        self.manager.setOnline(True)
+        self.assertEqual(self.requestList, [('sub', ['cu1801', 'rb1801'])])
+
+    # ----------------------------------------------------------------------
+    def testReferenceCount(self):
+        """最后一个引用退订时才发送退订"""
+        self.manager.setOnline(True)
+        self.manager.subscribe('rb1801')
+        self.manager.subscribe('rb1801')
+        self.manager.flush()
+
+        self.manager.unsubscribe('rb1801')
+        self.manager.flush()
+        self.assertEqual(self.requestList, [('sub', ['rb1801'])])
+
+        self.manager.unsubscribe('rb1801')
+        self.manager.unsubscribe('rb1801')
+        self.manager.flush()
+        self.assertEqual(self.requestList, [('sub', ['rb1801']), ('unsub', ['rb1801'])])
+        self.assertEqual(self.manager.countDict, {})
+
+    # ----------------------------------------------------------------------
+    def testCancelPending(self):
+        """尚未发送的订阅和退订相互抵消"""
+        self.manager.setOnline(True)
+        self.manager.subscribe('rb1801')
+        self.manager.unsubscribe('rb1801')
+        self.manager.flush()
+        self.assertEqual(self.requestList, [])
+
+        self.manager.subscribe('cu1801')
+        self.manager.flush()
+        self.manager.unsubscribe('cu1801')
+        self.manager.subscribe('cu1801')
+        self.manager.flush()
+        self.assertEqual(self.requestList, [('sub', ['cu1801'])])
+
+    # ----------------------------------------------------------------------
+    def testResubscribe(self):
+        """断线重连后恢复仍被引用的订阅"""
+        self.manager.setOnline(True)
+        self.manager.subscribe('rb1801')
+        self.manager.subscribe('cu1801')
+        self.manager.flush()
+        self.manager.unsubscribe('cu1801')
+
+        self.manager.setOnline(False)
+        del self.requestList[:]
+        self.manager.setOnline(True)
+        self.assertEqual(self.requestList, [('sub', ['rb1801'])])
+
+
+########################################################################
+class VtQuerySchedulerTest(unittest.TestCase):
+    """查询调度，使用手动前进的时钟"""
+
+    # ----------------------------------------------------------------------
+    def setUp(self):
+        self.now = 1000.0
+        self.time = vtGateway.time
+        vtGateway.time = types.ModuleType('time')
+        vtGateway.time.time = lambda: self.now
+
+        self.log = []
+        self.scheduler = VtQueryScheduler(rate=1.0, timeout=5.0)
+
+    # ----------------------------------------------------------------------
+    def tearDown(self):
+        vtGateway.time = self.time
+
+    # ----------------------------------------------------------------------
+    def addQuery(self, name, interval=0, max_interval=0, result_list=None):
+        """添加查询，result_list为依次返回的结果，用完后返回0"""
+        def func():
+            self.log.append((name, round(self.now - 1000, 1)))
+            return result_list.pop(0) if result_list else 0
+
+        self.scheduler.addQuery(name, func, interval, max_interval)
+
+    # ----------------------------------------------------------------------
+    def step(self, seconds, changed=False):
+        """每0.1秒运行一次调度，查询发出后立即回报"""
+        end = self.now + seconds
+        while self.now < end - 1e-6:
+            n = len(self.log)
+            self.scheduler.run()
+            if len(self.log) > n:
+                self.scheduler.onResult(self.log[-1][0], changed)
+            self.now += 0.1
+
+    # ----------------------------------------------------------------------
+    def testBackoff(self):
+        """回报没有变化时例行查询的间隔加倍，最长为max_interval"""
+        self.addQuery('account', 3, 24)
+        self.step(100)
+        self.assertEqual([int(round(t)) for name, t in self.log], [0, 6, 18, 42, 66, 90])
+
+    # ----------------------------------------------------------------------
+    def testChangedResetsInterval(self):
+        self.addQuery('account', 3, 24)
+        self.step(30, changed=True)
+        self.assertEqual(len(self.log), 10)
+
+    # ----------------------------------------------------------------------
+    def testPriorityAndRate(self):
+        """按需查询排在例行查询之前，且不超过每秒1次"""
+        self.addQuery('account', 3, 24)
+        self.addQuery('position', 3, 24)
+        self.scheduler.request('position')
+        self.step(2.05)
+        self.assertEqual(self.log, [('position', 0), ('account', 1)])
+
+    # ----------------------------------------------------------------------
+    def testRejected(self):
+        """查询被拒绝时稍后重新执行"""
+        self.addQuery('position', result_list=[-3])
+        self.scheduler.request('position')
+        self.scheduler.request('position')
+        self.step(3)
+        self.assertEqual(self.log, [('position', 0), ('position', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
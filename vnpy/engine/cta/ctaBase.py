@@ -7,6 +7,7 @@
 from __future__ import division
 
 from vnpy.utils.vtConstant import EMPTY_UNICODE, EMPTY_STRING, EMPTY_FLOAT, EMPTY_INT
+from vnpy.utils.vtFunction import VtSlotObject
 
 
 ########################################################################
@@ -29,8 +30,10 @@ class StopOrder(object):
 
 
 ########################################################################
-class CtaBarData(object):
+class CtaBarData(VtSlotObject):
     """K线数据"""
+    __slots__ = ('vtSymbol', 'symbol', 'exchange', 'open', 'high', 'low', 'close',
+                 'date', 'time', 'datetime', 'volume', 'openInterest')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -53,8 +56,14 @@ class CtaBarData(object):
 
 
 ########################################################################
-class CtaTickData(object):
+class CtaTickData(VtSlotObject):
     """Tick数据"""
+    __slots__ = ('vtSymbol', 'symbol', 'exchange', 'lastPrice', 'volume', 'openInterest',
+                 'upperLimit', 'lowerLimit', 'date', 'time', 'datetime',
+                 'bidPrice1', 'bidPrice2', 'bidPrice3', 'bidPrice4', 'bidPrice5',
+                 'askPrice1', 'askPrice2', 'askPrice3', 'askPrice4', 'askPrice5',
+                 'bidVolume1', 'bidVolume2', 'bidVolume3', 'bidVolume4', 'bidVolume5',
+                 'askVolume1', 'askVolume2', 'askVolume3', 'askVolume4', 'askVolume5')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -14,19 +14,26 @@
    感到功能不足的用户（即希望更高频的交易），交易策略不应该出现4中所述的情况
 6. 对于想要实现4中所述情况的用户，需要实现一个策略信号引擎和交易委托引擎分开
    的定制化统结构（没错，得自己写）
+
+关于多进程运行策略：
+策略配置中包含"process"字段时，策略会在该名称对应的子进程中运行（详见ctaProcess.py），
+CtaEngine中保存的是主进程中的代理对象，其余逻辑和在本进程中运行的策略相同。
 """
 
 import json
+from multiprocessing import Queue
+from threading import Thread, RLock
 from collections import OrderedDict
 from datetime import timedelta, datetime
 
 from ctaBase import StopOrder, CtaTickData, CtaBarData
 from ctaConstant import *
+from ctaProcess import StrategyProcess, StrategyProxy
 from ctaSetting import STRATEGY_CLASS
 from vnpy.event.eventEngine import Event, EVENT_TICK, EVENT_ORDER, EVENT_POSITION, \
-    EVENT_TRADE, EVENT_CTA_LOG, EVENT_CTA_STRATEGY
+    EVENT_TRADE, EVENT_CTA_LOG, EVENT_CTA_STRATEGY, EVENT_CTA_REQUEST
 from vnpy.utils.vtConstant import *
-from vnpy.utils.vtFunction import todayDate, findConfPath
+from vnpy.utils.vtFunction import todayDate, findConfPath, parseTickDatetime
 from vnpy.utils.vtGateway import VtSubscribeReq, VtOrderReq, VtCancelOrderReq, VtLogData
 
 
@@ -41,6 +48,10 @@ class CtaEngine(object):
         self.mainEngine = mainEngine
         self.eventEngine = eventEngine
 
+        # 事件引擎分片模式下，行情在多个线程中处理，并且和委托、成交等事件并发，
+        # 推送给策略以及修改停止单、委托映射等数据时都需要持有该锁，策略回调中发单时会重入
+        self.lock = RLock()
+
         # 当前日期
         self.today = todayDate()
 
@@ -57,6 +68,10 @@ class CtaEngine(object):
         # key为vtOrderID，value为strategy对象
         self.orderStrategyDict = {}
 
+        # 保存策略名称和行情订阅映射的字典（用于移除策略时退订）
+        # key为策略名称，value为(订阅请求, 接口名称)
+        self.subscribeDict = {}
+
         # 本地停止单编号计数
         self.stopOrderCount = 0
         # stopOrderID = STOPORDERPREFIX + str(stopOrderCount)
@@ -73,6 +88,13 @@ class CtaEngine(object):
         # 引擎类型为实盘
         self.engineType = ENGINETYPE_TRADING
 
+        # 策略子进程字典，key为进程组名称，value为StrategyProcess对象
+        self.processDict = {}
+
+        # 子进程发回请求的队列，以及将请求转为事件的线程，在创建第一个子进程时创建
+        self.requestQueue = None
+        self.requestThread = None
+
         # 注册事件监听
         self.registerEvent()
 
@@ -140,8 +162,9 @@ class CtaEngine(object):
                 else:
                     req.offset = OFFSET_CLOSE
 
-        vt_order_id = self.mainEngine.sendOrder(req, contract.gatewayName)  # 发单
-        self.orderStrategyDict[vt_order_id] = strategy  # 保存vtOrderID和策略的映射关系
+        with self.lock:
+            vt_order_id = self.mainEngine.sendOrder(req, contract.gatewayName)  # 发单
+            self.orderStrategyDict[vt_order_id] = strategy  # 保存vtOrderID和策略的映射关系
 
         self.writeCtaLog(u'策略%s发送委托，%s，%s，%s@%s'
                          % (strategy.name, vtSymbol, req.direction, volume, price))
@@ -170,8 +193,9 @@ class CtaEngine(object):
     # ----------------------------------------------------------------------
     def sendStopOrder(self, vtSymbol, orderType, price, volume, strategy):
         """发停止单（本地实现）"""
-        self.stopOrderCount += 1
-        stop_order_id = STOPORDERPREFIX + str(self.stopOrderCount)
+        with self.lock:
+            self.stopOrderCount += 1
+            stop_order_id = STOPORDERPREFIX + str(self.stopOrderCount)
 
         so = StopOrder()
         so.vtSymbol = vtSymbol
@@ -195,9 +219,10 @@ class CtaEngine(object):
             so.direction = DIRECTION_LONG
             so.offset = OFFSET_CLOSE
 
-            # 保存stopOrder对象到字典中
-        self.stopOrderDict[stop_order_id] = so
-        self.workingStopOrderDict[stop_order_id] = so
+        # 保存stopOrder对象到字典中
+        with self.lock:
+            self.stopOrderDict[stop_order_id] = so
+            self.workingStopOrderDict[stop_order_id] = so
 
         return stop_order_id
 
@@ -205,91 +230,96 @@ class CtaEngine(object):
     def cancelStopOrder(self, stopOrderID):
         """撤销停止单"""
         # 检查停止单是否存在
-        if stopOrderID in self.workingStopOrderDict:
-            so = self.workingStopOrderDict[stopOrderID]
-            so.status = STOPORDER_CANCELLED
-            del self.workingStopOrderDict[stopOrderID]
+        with self.lock:
+            so = self.workingStopOrderDict.pop(stopOrderID, None)
+            if so:
+                so.status = STOPORDER_CANCELLED
 
     # ----------------------------------------------------------------------
     def processStopOrder(self, tick):
         """收到行情后处理本地停止单（检查是否要立即发出）"""
         vt_symbol = tick.vtSymbol
 
-        # 首先检查是否有策略交易该合约
-        if vt_symbol in self.tickStrategyDict:
-            # 遍历等待中的停止单，检查是否会被触发
-            for so in self.workingStopOrderDict.values():
-                if so.vtSymbol == vt_symbol:
-                    long_triggered = so.direction == DIRECTION_LONG and tick.lastPrice >= so.price  # 多头停止单被触发
-                    short_triggered = so.direction == DIRECTION_SHORT and tick.lastPrice <= so.price  # 空头停止单被触发
-
-                    if long_triggered or short_triggered:
-                        # 买入和卖出分别以涨停跌停价发单（模拟市价单）
-                        if so.direction == DIRECTION_LONG:
-                            price = tick.upperLimit
-                        else:
-                            price = tick.lowerLimit
-
-                        so.status = STOPORDER_TRIGGERED
-                        self.sendOrder(so.vtSymbol, so.orderType, price, so.volume, so.strategy)
-                        del self.workingStopOrderDict[so.stopOrderID]
+        # 遍历等待中的停止单，检查是否会被触发（停止单的合约不一定是策略订阅行情的合约）
+        for so in self.workingStopOrderDict.values():
+            if so.vtSymbol == vt_symbol:
+                long_triggered = so.direction == DIRECTION_LONG and tick.lastPrice >= so.price  # 多头停止单被触发
+                short_triggered = so.direction == DIRECTION_SHORT and tick.lastPrice <= so.price  # 空头停止单被触发
+
+                if long_triggered or short_triggered:
+                    # 买入和卖出分别以涨停跌停价发单（模拟市价单）
+                    if so.direction == DIRECTION_LONG:
+                        price = tick.upperLimit
+                    else:
+                        price = tick.lowerLimit
+
+                    so.status = STOPORDER_TRIGGERED
+                    self.sendOrder(so.vtSymbol, so.orderType, price, so.volume, so.strategy)
+                    del self.workingStopOrderDict[so.stopOrderID]
 
     # ----------------------------------------------------------------------
     def procecssTickEvent(self, event):
         """处理行情推送"""
         tick = event.dict_['data']
-        # 收到tick行情后，先处理本地停止单（检查是否要立即发出）
-        self.processStopOrder(tick)
 
-        # 推送tick到对应的策略实例进行处理
+        # 没有策略交易该合约，也没有等待中的停止单时无需加锁
         if tick.vtSymbol in self.tickStrategyDict:
             # 将vtTickData数据转化为ctaTickData
             cta_tick = CtaTickData()
-            d = cta_tick.__dict__
-            for key in d.keys():
-                if key != 'datetime':
-                    d[key] = tick.__getattribute__(key)
-            # 添加datetime字段
-            cta_tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
+            for key in CtaTickData.__slots__:
+                setattr(cta_tick, key, getattr(tick, key))
+            # 接口没有解析datetime字段时在这里解析
+            if not cta_tick.datetime:
+                cta_tick.datetime = parseTickDatetime(tick.date, tick.time)
+        elif self.workingStopOrderDict:
+            cta_tick = None
+        else:
+            return
+
+        with self.lock:
+            # 收到tick行情后，先处理本地停止单（检查是否要立即发出）
+            self.processStopOrder(tick)
 
             # 逐个推送到策略实例中
-            l = self.tickStrategyDict[tick.vtSymbol]
-            for strategy in l:
-                strategy.onTick(cta_tick)
+            if cta_tick is not None:
+                for strategy in self.tickStrategyDict.get(tick.vtSymbol, ()):
+                    strategy.onTick(cta_tick)
 
     # ----------------------------------------------------------------------
     def processOrderEvent(self, event):
         """处理委托推送"""
         order = event.dict_['data']
 
-        if order.vtOrderID in self.orderStrategyDict:
-            strategy = self.orderStrategyDict[order.vtOrderID]
-            strategy.onOrder(order)
+        with self.lock:
+            if order.vtOrderID in self.orderStrategyDict:
+                strategy = self.orderStrategyDict[order.vtOrderID]
+                strategy.onOrder(order)
 
     # ----------------------------------------------------------------------
     def processTradeEvent(self, event):
         """处理成交推送"""
         trade = event.dict_['data']
 
-        if trade.vtOrderID in self.orderStrategyDict:
-            strategy = self.orderStrategyDict[trade.vtOrderID]
+        with self.lock:
+            if trade.vtOrderID in self.orderStrategyDict:
+                strategy = self.orderStrategyDict[trade.vtOrderID]
 
-            # 计算策略持仓
-            if trade.direction == DIRECTION_LONG:
-                strategy.pos += trade.volume
-            else:
-                strategy.pos -= trade.volume
+                # 计算策略持仓
+                if trade.direction == DIRECTION_LONG:
+                    strategy.pos += trade.volume
+                else:
+                    strategy.pos -= trade.volume
 
-            strategy.onTrade(trade)
+                strategy.onTrade(trade)
 
-        # 更新持仓缓存数据
-        if trade.vtSymbol in self.tickStrategyDict:
-            pos_buffer = self.posBufferDict.get(trade.vtSymbol, None)
-            if not pos_buffer:
-                pos_buffer = PositionBuffer()
-                pos_buffer.vtSymbol = trade.vtSymbol
-                self.posBufferDict[trade.vtSymbol] = pos_buffer
-            pos_buffer.updateTradeData(trade)
+            # 更新持仓缓存数据
+            if trade.vtSymbol in self.tickStrategyDict:
+                pos_buffer = self.posBufferDict.get(trade.vtSymbol, None)
+                if not pos_buffer:
+                    pos_buffer = PositionBuffer()
+                    pos_buffer.vtSymbol = trade.vtSymbol
+                    self.posBufferDict[trade.vtSymbol] = pos_buffer
+                pos_buffer.updateTradeData(trade)
 
     # ----------------------------------------------------------------------
     def processPositionEvent(self, event):
@@ -297,13 +327,14 @@ class CtaEngine(object):
         pos = event.dict_['data']
 
         # 更新持仓缓存数据
-        if pos.vtSymbol in self.tickStrategyDict:
-            pos_buffer = self.posBufferDict.get(pos.vtSymbol, None)
-            if not pos_buffer:
-                pos_buffer = PositionBuffer()
-                pos_buffer.vtSymbol = pos.vtSymbol
-                self.posBufferDict[pos.vtSymbol] = pos_buffer
-            pos_buffer.updatePositionData(pos)
+        with self.lock:
+            if pos.vtSymbol in self.tickStrategyDict:
+                pos_buffer = self.posBufferDict.get(pos.vtSymbol, None)
+                if not pos_buffer:
+                    pos_buffer = PositionBuffer()
+                    pos_buffer.vtSymbol = pos.vtSymbol
+                    self.posBufferDict[pos.vtSymbol] = pos_buffer
+                pos_buffer.updatePositionData(pos)
 
     # ----------------------------------------------------------------------
     def registerEvent(self):
@@ -312,11 +343,12 @@ class CtaEngine(object):
         self.eventEngine.register(EVENT_ORDER, self.processOrderEvent)
         self.eventEngine.register(EVENT_TRADE, self.processTradeEvent)
         self.eventEngine.register(EVENT_POSITION, self.processPositionEvent)
+        self.eventEngine.register(EVENT_CTA_REQUEST, self.processRequestEvent)
 
     # ----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是CtaTickData或者CtaBarData）"""
-        self.mainEngine.dbInsert(dbName, collectionName, data.__dict__)
+        self.mainEngine.dbInsert(dbName, collectionName, data.toDict())
 
     # ----------------------------------------------------------------------
     def loadBar(self, dbName, collectionName, days):
@@ -330,7 +362,7 @@ class CtaEngine(object):
         if cursor:
             for d in cursor:
                 bar = CtaBarData()
-                bar.__dict__ = d
+                bar.fromDict(d)
                 l.append(bar)
 
         return l
@@ -347,7 +379,7 @@ class CtaEngine(object):
         if cursor:
             for d in cursor:
                 tick = CtaTickData()
-                tick.__dict__ = d
+                tick.fromDict(d)
                 l.append(tick)
 
         return l
@@ -381,17 +413,22 @@ class CtaEngine(object):
         if name in self.strategyDict:
             self.writeCtaLog(u'策略实例重名：%s' % name)
         else:
-            # 创建策略实例
-            strategy = strategy_class(self, setting)
+            # 创建策略实例，设置了进程组的策略在子进程中创建，这里保存的是代理对象
+            process_name = setting.get('process')
+            if process_name:
+                strategy = self.getStrategyProcess(process_name).addStrategy(strategy_class, setting)
+            else:
+                strategy = strategy_class(self, setting)
             self.strategyDict[name] = strategy
 
             # 保存Tick映射关系
-            if strategy.vtSymbol in self.tickStrategyDict:
-                l = self.tickStrategyDict[strategy.vtSymbol]
-            else:
-                l = []
-                self.tickStrategyDict[strategy.vtSymbol] = l
-            l.append(strategy)
+            with self.lock:
+                if strategy.vtSymbol in self.tickStrategyDict:
+                    l = self.tickStrategyDict[strategy.vtSymbol]
+                else:
+                    l = []
+                    self.tickStrategyDict[strategy.vtSymbol] = l
+                l.append(strategy)
 
             # 订阅合约
             contract = self.mainEngine.getContract(strategy.vtSymbol)
@@ -405,9 +442,37 @@ class CtaEngine(object):
                 req.productClass = strategy.productClass
 
                 self.mainEngine.subscribe(req, contract.gatewayName)
+                self.subscribeDict[name] = (req, contract.gatewayName)
             else:
                 self.writeCtaLog(u'%s的交易合约%s无法找到' % (name, strategy.vtSymbol))
 
+    # ----------------------------------------------------------------------
+    def removeStrategy(self, name):
+        """移除策略实例，停止后不再推送行情，没有其他模块订阅时退订合约"""
+        if name not in self.strategyDict:
+            self.writeCtaLog(u'策略实例不存在：%s' % name)
+            return
+
+        self.stopStrategy(name)
+
+        with self.lock:
+            strategy = self.strategyDict.pop(name)
+
+            # 事件处理线程可能正在遍历列表，因此替换为新的列表而不是原地删除
+            l = [s for s in self.tickStrategyDict.get(strategy.vtSymbol, []) if s is not strategy]
+            if l:
+                self.tickStrategyDict[strategy.vtSymbol] = l
+            else:
+                self.tickStrategyDict.pop(strategy.vtSymbol, None)
+
+        # 子进程中的策略，同时移除子进程中的策略实例
+        if isinstance(strategy, StrategyProxy):
+            strategy.strategyProcess.removeStrategy(name)
+
+        if name in self.subscribeDict:
+            req, gateway_name = self.subscribeDict.pop(name)
+            self.mainEngine.unsubscribe(req, gateway_name)
+
     # ----------------------------------------------------------------------
     def initStrategy(self, name):
         """初始化策略"""
@@ -440,19 +505,20 @@ class CtaEngine(object):
         if name in self.strategyDict:
             strategy = self.strategyDict[name]
 
-            if strategy.trading:
-                strategy.trading = False
-                strategy.onStop()
+            with self.lock:
+                if strategy.trading:
+                    strategy.trading = False
+                    strategy.onStop()
 
-                # 对该策略发出的所有限价单进行撤单
-                for vtOrderID, s in self.orderStrategyDict.items():
-                    if s is strategy:
-                        self.cancelOrder(vtOrderID)
+                    # 对该策略发出的所有限价单进行撤单
+                    for vtOrderID, s in self.orderStrategyDict.items():
+                        if s is strategy:
+                            self.cancelOrder(vtOrderID)
 
-                # 对该策略发出的所有本地停止单撤单
-                for stopOrderID, so in self.workingStopOrderDict.items():
-                    if so.strategy is strategy:
-                        self.cancelStopOrder(stopOrderID)
+                    # 对该策略发出的所有本地停止单撤单
+                    for stopOrderID, so in self.workingStopOrderDict.items():
+                        if so.strategy is strategy:
+                            self.cancelStopOrder(stopOrderID)
         else:
             self.writeCtaLog(u'策略实例不存在：%s' % name)
 
@@ -466,6 +532,8 @@ class CtaEngine(object):
                 setting = {}
                 for param in strategy.paramList:
                     setting[param] = strategy.__getattribute__(param)
+                if isinstance(strategy, StrategyProxy):
+                    setting['process'] = strategy.strategyProcess.name
                 l.append(setting)
 
             json_l = json.dumps(l, indent=4)
@@ -516,6 +584,56 @@ class CtaEngine(object):
         event = Event(EVENT_CTA_STRATEGY + name)
         self.eventEngine.put(event)
 
+    # ----------------------------------------------------------------------
+    def getStrategyProcess(self, name):
+        """获取进程组对应的策略子进程，若无则创建"""
+        if name in self.processDict:
+            return self.processDict[name]
+
+        if not self.requestQueue:
+            self.requestQueue = Queue()
+            self.requestThread = Thread(target=self.runRequest)
+            self.requestThread.daemon = True
+            self.requestThread.start()
+
+        strategy_process = StrategyProcess(name, self, self.requestQueue)
+        self.processDict[name] = strategy_process
+        self.writeCtaLog(u'启动策略进程：%s' % name)
+        return strategy_process
+
+    # ----------------------------------------------------------------------
+    def runRequest(self):
+        """读取子进程发回的请求，转为事件在事件引擎中处理，保证和其他事件在同一线程中执行"""
+        while True:
+            request = self.requestQueue.get()
+            if request is None:
+                break
+
+            event = Event(type_=EVENT_CTA_REQUEST)
+            event.dict_['data'] = request
+            self.eventEngine.put(event)
+
+    # ----------------------------------------------------------------------
+    def processRequestEvent(self, event):
+        """处理子进程发回的请求"""
+        process_name, request_id, method, args = event.dict_['data']
+        strategy_process = self.processDict.get(process_name)
+        if strategy_process:
+            strategy_process.processRequest(request_id, method, args)
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """停止所有策略子进程"""
+        for strategy_process in self.processDict.values():
+            strategy_process.stop()
+        self.processDict.clear()
+
+        if self.requestThread:
+            self.requestQueue.put(None)
+            self.requestThread.join()
+            self.requestThread = None
+            self.requestQueue = None
+
 
 ########################################################################
 class PositionBuffer(object):
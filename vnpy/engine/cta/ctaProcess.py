@@ -0,0 +1,609 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中实现了在独立进程中运行CTA策略的功能。
+
+所有策略默认都在事件引擎的线程中运行，受GIL限制只能使用一个CPU核心。
+在CTA_setting.json中为策略设置"process"字段（进程组名称）后，同一进程组的策略会在
+一个单独的子进程中运行：
+
+1. 主进程中用StrategyProxy代替策略实例保存在CtaEngine中，CtaEngine原有的tick推送、
+   停止单、委托成交映射以及持仓计算等逻辑都不需要改变
+2. tick数据通过共享内存的环形缓冲区TickRing传给子进程，子进程按vtSymbol推送给策略
+3. 委托、成交以及初始化、启动、停止等指令通过命令队列传给子进程，tick和命令按照主进程中推送的
+   顺序编号，子进程按编号顺序处理，因此策略收到的tick和委托、成交推送的先后顺序和主进程中一致
+4. 子进程中的策略调用的sendOrder、cancelOrder、sendStopOrder、loadBar等函数，
+   由CtaProcessEngine通过请求队列发回主进程，主进程在事件引擎线程中执行后返回结果
+
+因此基于CtaTemplate开发的策略无需任何修改即可在子进程中运行。
+"""
+
+import cPickle
+import ctypes
+import struct
+import traceback
+from multiprocessing import Condition, Process, Queue
+from multiprocessing.sharedctypes import RawArray, RawValue
+from Queue import Empty
+from threading import Lock
+from time import time
+
+from ctaBase import CtaTickData
+from ctaConstant import *
+from vnpy.utils.vtConstant import DIRECTION_LONG
+
+RING_SLOT_COUNT = 4096  # 环形缓冲区的槽位数
+RING_SLOT_SIZE = 1024  # 每个槽位的字节数
+SLOT_HEADER = struct.Struct('<IQ')  # 槽位头：数据长度、序号
+
+TICK_FIELDS = CtaTickData.__slots__  # tick数据序列化的字段顺序
+
+REQUEST_TIMEOUT = 10  # 子进程等待主进程返回结果的超时时间（秒）
+
+# 主进程发给子进程的命令
+COMMAND_ADD = 'add'  # 添加策略
+COMMAND_REMOVE = 'remove'  # 移除策略
+COMMAND_INIT = 'init'  # 初始化策略
+COMMAND_START = 'start'  # 启动策略
+COMMAND_STOP = 'stop'  # 停止策略
+COMMAND_ORDER = 'order'  # 委托推送
+COMMAND_TRADE = 'trade'  # 成交推送
+COMMAND_EXIT = 'exit'  # 退出子进程
+
+
+########################################################################
+class RequestTimeout(Exception):
+    """子进程等待主进程返回结果超时"""
+
+
+########################################################################
+class TickRing(object):
+    """
+    基于共享内存的单生产者单消费者环形缓冲区
+
+    head和tail分别为已写入和已读取的数据数量，只由生产者和消费者各自修改，因此无需加锁。
+    缓冲区满时新的数据会被丢弃，dropCount（仅在生产者进程中有效）记录丢弃的数量。
+    每条数据附带一个序号，用于和其他通道中的数据按照写入顺序合并处理。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, slot_count=RING_SLOT_COUNT, slot_size=RING_SLOT_SIZE):
+        """Constructor"""
+        self.slotCount = slot_count
+        self.slotSize = slot_size
+
+        self.buffer = RawArray(ctypes.c_char, slot_count * slot_size)
+        self.head = RawValue(ctypes.c_ulonglong, 0)
+        self.tail = RawValue(ctypes.c_ulonglong, 0)
+
+        self.dropCount = 0
+
+    # ----------------------------------------------------------------------
+    def put(self, data, seq=0):
+        """写入数据，成功返回True"""
+        length = len(data)
+        head = self.head.value
+        if length + SLOT_HEADER.size > self.slotSize or head - self.tail.value >= self.slotCount:
+            self.dropCount += 1
+            return False
+
+        offset = (head % self.slotCount) * self.slotSize
+        SLOT_HEADER.pack_into(self.buffer, offset, length, seq)
+        ctypes.memmove(ctypes.addressof(self.buffer) + offset + SLOT_HEADER.size, data, length)
+
+        # 数据写完之后再移动head，消费者才能读到
+        self.head.value = head + 1
+        return True
+
+    # ----------------------------------------------------------------------
+    def get(self):
+        """读取数据，返回(序号, 数据)，没有数据时返回None"""
+        tail = self.tail.value
+        if tail == self.head.value:
+            return None
+
+        offset = (tail % self.slotCount) * self.slotSize
+        length, seq = SLOT_HEADER.unpack_from(self.buffer, offset)
+        start = offset + SLOT_HEADER.size
+        data = self.buffer[start:start + length]
+
+        self.tail.value = tail + 1
+        return seq, data
+
+    # ----------------------------------------------------------------------
+    def size(self):
+        """未读取的数据数量"""
+        return self.head.value - self.tail.value
+
+
+########################################################################
+class WakeupSignal(object):
+    """
+    主进程通知子进程有新数据的信号
+
+    seq为主进程已经发出的tick和命令的最大编号。子进程处理完所有已发出的数据后在condition上阻塞等待，
+    主进程只在子进程等待时才调用notify，平时每次发出数据只需加锁更新编号。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.condition = Condition()
+        self.seq = RawValue(ctypes.c_ulonglong, 0)
+        self.waiting = RawValue(ctypes.c_bool, False)
+
+    # ----------------------------------------------------------------------
+    def publish(self, seq):
+        """主进程发出编号为seq的数据后调用，唤醒等待中的子进程"""
+        with self.condition:
+            self.seq.value = seq
+            if self.waiting.value:
+                self.condition.notify()
+
+    # ----------------------------------------------------------------------
+    def wait(self, seq):
+        """子进程已经处理到编号seq，没有更多已发出的数据时阻塞等待，返回False说明还有数据没有读到"""
+        with self.condition:
+            if self.seq.value > seq:
+                return False
+
+            self.waiting.value = True
+            self.condition.wait()
+            self.waiting.value = False
+            return True
+
+
+# ----------------------------------------------------------------------
+def packTick(tick):
+    """将CtaTickData序列化为字符串"""
+    return cPickle.dumps(tuple([getattr(tick, key) for key in TICK_FIELDS]), cPickle.HIGHEST_PROTOCOL)
+
+
+# ----------------------------------------------------------------------
+def unpackTick(data):
+    """从字符串中还原CtaTickData"""
+    tick = CtaTickData()
+    for key, value in zip(TICK_FIELDS, cPickle.loads(data)):
+        setattr(tick, key, value)
+    return tick
+
+
+########################################################################
+class StrategyProxy(object):
+    """
+    子进程中策略在主进程中的代理对象
+
+    保存策略的参数和变量（变量由子进程在putEvent时同步），
+    CtaEngine调用的onInit、onTick等函数会转发给子进程中的策略实例。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, strategy_process, strategy_class, setting):
+        """Constructor"""
+        self.strategyProcess = strategy_process
+
+        self.paramList = strategy_class.paramList
+        self.varList = strategy_class.varList
+
+        # 参数使用配置中的值，没有配置的则使用策略类的默认值
+        for key in self.paramList + ['name', 'vtSymbol', 'productClass', 'currency']:
+            setattr(self, key, setting.get(key, getattr(strategy_class, key, None)))
+
+        for key in self.varList:
+            setattr(self, key, getattr(strategy_class, key, None))
+
+        self.inited = False
+        self.trading = False
+        self.pos = 0
+
+    # ----------------------------------------------------------------------
+    def onInit(self):
+        """初始化策略"""
+        self.strategyProcess.sendCommand(COMMAND_INIT, self.name)
+
+    # ----------------------------------------------------------------------
+    def onStart(self):
+        """启动策略"""
+        self.strategyProcess.sendCommand(COMMAND_START, self.name)
+
+    # ----------------------------------------------------------------------
+    def onStop(self):
+        """停止策略"""
+        self.strategyProcess.sendCommand(COMMAND_STOP, self.name)
+
+    # ----------------------------------------------------------------------
+    def onTick(self, tick):
+        """收到行情TICK推送"""
+        self.strategyProcess.putTick(tick)
+
+    # ----------------------------------------------------------------------
+    def onOrder(self, order):
+        """收到委托变化推送"""
+        self.strategyProcess.sendCommand(COMMAND_ORDER, self.name, order)
+
+    # ----------------------------------------------------------------------
+    def onTrade(self, trade):
+        """收到成交推送"""
+        self.strategyProcess.sendCommand(COMMAND_TRADE, self.name, trade)
+
+    # ----------------------------------------------------------------------
+    def updateVar(self, var_dict):
+        """更新子进程同步过来的策略变量"""
+        for key, value in var_dict.items():
+            setattr(self, key, value)
+
+
+########################################################################
+class StrategyProcess(object):
+    """
+    主进程中管理一个策略子进程的对象
+
+    由CtaEngine创建，负责启动子进程、向子进程推送tick和命令，以及执行子进程发回的请求。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name, cta_engine, request_queue):
+        """Constructor"""
+        self.name = name
+        self.ctaEngine = cta_engine
+
+        self.ring = TickRing()
+        self.commandQueue = Queue()
+        self.replyQueue = Queue()
+        self.signal = WakeupSignal()
+
+        # 策略代理对象字典，key为策略名称
+        self.proxyDict = {}
+
+        # tick可能在多个事件引擎线程中推送，编号和写入环形缓冲区、命令队列时需要加锁
+        self.lock = Lock()
+        self.seq = 0  # tick和命令的顺序编号，被丢弃的tick不占用编号
+        self.lastTick = None
+
+        self.process = Process(target=runStrategyProcess,
+                               args=(name, self.ring, self.commandQueue, request_queue, self.replyQueue,
+                                     self.signal))
+        self.process.daemon = True
+        self.process.start()
+
+    # ----------------------------------------------------------------------
+    def addStrategy(self, strategy_class, setting):
+        """添加策略，返回主进程中的代理对象"""
+        proxy = StrategyProxy(self, strategy_class, setting)
+        self.proxyDict[proxy.name] = proxy
+        self.sendCommand(COMMAND_ADD, proxy.name, setting)
+        return proxy
+
+    # ----------------------------------------------------------------------
+    def removeStrategy(self, name):
+        """移除策略，子进程中的策略实例随之删除"""
+        self.proxyDict.pop(name, None)
+        self.sendCommand(COMMAND_REMOVE, name)
+
+    # ----------------------------------------------------------------------
+    def sendCommand(self, command, name, data=None):
+        """向子进程发送命令"""
+        with self.lock:
+            self.seq += 1
+            self.commandQueue.put((self.seq, command, name, data))
+            self.signal.publish(self.seq)
+
+    # ----------------------------------------------------------------------
+    def putTick(self, tick):
+        """向子进程推送tick，同一个tick只推送一次，由子进程分发给交易该合约的所有策略"""
+        with self.lock:
+            if tick is self.lastTick:
+                return
+            self.lastTick = tick
+
+            if self.ring.put(packTick(tick), self.seq + 1):
+                self.seq += 1
+                self.signal.publish(self.seq)
+                return
+
+        if self.ring.dropCount == 1:
+            self.ctaEngine.writeCtaLog(u'策略进程%s的行情缓冲区已满，tick数据被丢弃' % self.name)
+
+    # ----------------------------------------------------------------------
+    def processRequest(self, request_id, method, args):
+        """执行子进程发回的请求，需要返回结果的请求（request_id不为None）将结果发回子进程"""
+        cta_engine = self.ctaEngine
+        result = None
+
+        # 策略移除前发出的请求可能在移除之后才被处理，此时不再为其发单
+        if method == 'sendOrder' or method == 'sendStopOrder':
+            vt_symbol, order_type, price, volume, name = args
+            proxy = self.proxyDict.get(name)
+            if proxy:
+                func = getattr(cta_engine, method)
+                result = func(vt_symbol, order_type, price, volume, proxy)
+        elif method == 'cancelOrder':
+            cta_engine.cancelOrder(*args)
+        elif method == 'cancelStopOrder':
+            cta_engine.cancelStopOrder(*args)
+        elif method == 'insertData':
+            db_name, collection_name, d = args
+            cta_engine.mainEngine.dbInsert(db_name, collection_name, d)
+        elif method == 'loadBar':
+            result = cta_engine.loadBar(*args)
+        elif method == 'loadTick':
+            result = cta_engine.loadTick(*args)
+        elif method == 'writeCtaLog':
+            cta_engine.writeCtaLog(*args)
+        elif method == 'putStrategyEvent':
+            name, var_dict = args
+            proxy = self.proxyDict.get(name)
+            if proxy:
+                proxy.updateVar(var_dict)
+                cta_engine.putStrategyEvent(name)
+
+        if request_id is not None:
+            self.replyQueue.put((request_id, result))
+
+    # ----------------------------------------------------------------------
+    def stop(self, timeout=5):
+        """停止子进程"""
+        self.sendCommand(COMMAND_EXIT, None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+########################################################################
+class CtaProcessEngine(object):
+    """
+    子进程中的CTA策略引擎
+
+    提供CtaTemplate所需的接口，下单、撤单、读取数据等操作通过请求队列交给主进程执行。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name, ring, command_queue, request_queue, reply_queue, signal):
+        """Constructor"""
+        self.name = name
+        self.ring = ring
+        self.commandQueue = command_queue
+        self.requestQueue = request_queue
+        self.replyQueue = reply_queue
+        self.signal = signal
+
+        self.requestCount = 0
+        self.active = False
+        self.seq = 0  # 已经处理的tick和命令的编号
+
+        # 引擎类型为实盘
+        self.engineType = ENGINETYPE_TRADING
+
+        # 保存策略实例的字典，key为策略名称
+        self.strategyDict = {}
+
+        # 保存vtSymbol和策略实例列表映射的字典
+        self.tickStrategyDict = {}
+
+    # ----------------------------------------------------------------------
+    def send(self, method, *args):
+        """向主进程发送不需要返回结果的请求"""
+        self.requestQueue.put((self.name, None, method, args))
+
+    # ----------------------------------------------------------------------
+    def call(self, method, *args, **kwargs):
+        """
+        向主进程发送请求，并等待返回结果，
+        超过timeout（秒，默认为REQUEST_TIMEOUT，为None时一直等待）则抛出RequestTimeout
+        """
+        timeout = kwargs.get('timeout', REQUEST_TIMEOUT)
+
+        self.requestCount += 1
+        request_id = self.requestCount
+        self.requestQueue.put((self.name, request_id, method, args))
+
+        deadline = time() + timeout if timeout is not None else None
+        while True:
+            if deadline is None:
+                reply_id, result = self.replyQueue.get()
+            else:
+                try:
+                    reply_id, result = self.replyQueue.get(timeout=max(deadline - time(), 0))
+                except Empty:
+                    raise RequestTimeout(u'策略进程%s等待%s的结果超时' % (self.name, method))
+
+            if reply_id == request_id:
+                return result
+
+            # 之前超时的请求的结果，已经没有调用者在等待，直接丢弃
+            if reply_id < request_id:
+                continue
+
+    # ----------------------------------------------------------------------
+    def sendOrder(self, vtSymbol, orderType, price, volume, strategy):
+        """发单，委托号只能从返回结果中得到，因此不设超时"""
+        return self.call('sendOrder', vtSymbol, orderType, price, volume, strategy.name, timeout=None)
+
+    # ----------------------------------------------------------------------
+    def cancelOrder(self, vtOrderID):
+        """撤单"""
+        self.send('cancelOrder', vtOrderID)
+
+    # ----------------------------------------------------------------------
+    def sendStopOrder(self, vtSymbol, orderType, price, volume, strategy):
+        """发停止单（由主进程的CtaEngine在本地实现），和sendOrder一样不设超时"""
+        return self.call('sendStopOrder', vtSymbol, orderType, price, volume, strategy.name, timeout=None)
+
+    # ----------------------------------------------------------------------
+    def cancelStopOrder(self, stopOrderID):
+        """撤销停止单"""
+        self.send('cancelStopOrder', stopOrderID)
+
+    # ----------------------------------------------------------------------
+    def insertData(self, dbName, collectionName, data):
+        """插入数据到数据库"""
+        self.send('insertData', dbName, collectionName, data.toDict())
+
+    # ----------------------------------------------------------------------
+    def loadBar(self, dbName, collectionName, days):
+        """从数据库中读取Bar数据"""
+        return self.call('loadBar', dbName, collectionName, days)
+
+    # ----------------------------------------------------------------------
+    def loadTick(self, dbName, collectionName, days):
+        """从数据库中读取Tick数据"""
+        return self.call('loadTick', dbName, collectionName, days)
+
+    # ----------------------------------------------------------------------
+    def writeCtaLog(self, content):
+        """发出CTA模块日志"""
+        self.send('writeCtaLog', content)
+
+    # ----------------------------------------------------------------------
+    def putStrategyEvent(self, name):
+        """将策略变量同步到主进程，并触发策略状态变化事件"""
+        strategy = self.strategyDict[name]
+        var_dict = {}
+        for key in strategy.varList:
+            var_dict[key] = getattr(strategy, key)
+        self.send('putStrategyEvent', name, var_dict)
+
+    # ----------------------------------------------------------------------
+    def processTick(self, tick):
+        """推送tick到对应的策略实例"""
+        for strategy in self.tickStrategyDict.get(tick.vtSymbol, ()):
+            strategy.onTick(tick)
+
+    # ----------------------------------------------------------------------
+    def processCommand(self, command, name, data):
+        """处理主进程发来的命令"""
+        if command == COMMAND_EXIT:
+            self.active = False
+            return
+
+        if command == COMMAND_ADD:
+            self.addStrategy(data)
+            return
+
+        if command == COMMAND_REMOVE:
+            self.removeStrategy(name)
+            return
+
+        strategy = self.strategyDict.get(name)
+        if not strategy:
+            return
+
+        if command == COMMAND_ORDER:
+            strategy.onOrder(data)
+        elif command == COMMAND_TRADE:
+            # 计算策略持仓，和主进程中的CtaEngine保持一致
+            if data.direction == DIRECTION_LONG:
+                strategy.pos += data.volume
+            else:
+                strategy.pos -= data.volume
+            strategy.onTrade(data)
+        elif command == COMMAND_INIT:
+            # 初始化失败（如读取历史数据超时）时策略保持未初始化状态，可以重新初始化
+            strategy.inited = True
+            try:
+                strategy.onInit()
+            except Exception:
+                strategy.inited = False
+                raise
+            finally:
+                self.putStrategyEvent(name)
+        elif command == COMMAND_START:
+            strategy.trading = True
+            strategy.onStart()
+            self.putStrategyEvent(name)
+        elif command == COMMAND_STOP:
+            strategy.trading = False
+            strategy.onStop()
+            self.putStrategyEvent(name)
+
+    # ----------------------------------------------------------------------
+    def addStrategy(self, setting):
+        """创建策略实例"""
+        from ctaSetting import STRATEGY_CLASS
+
+        strategy = STRATEGY_CLASS[setting['className']](self, setting)
+        self.strategyDict[strategy.name] = strategy
+        self.tickStrategyDict.setdefault(strategy.vtSymbol, []).append(strategy)
+
+    # ----------------------------------------------------------------------
+    def removeStrategy(self, name):
+        """删除策略实例"""
+        strategy = self.strategyDict.pop(name, None)
+        if not strategy:
+            return
+
+        l = [s for s in self.tickStrategyDict.get(strategy.vtSymbol, []) if s is not strategy]
+        if l:
+            self.tickStrategyDict[strategy.vtSymbol] = l
+        else:
+            self.tickStrategyDict.pop(strategy.vtSymbol, None)
+
+    # ----------------------------------------------------------------------
+    def run(self):
+        """
+        子进程的主循环，按照主进程中的编号顺序处理tick和命令，没有可处理的数据时阻塞等待
+
+        命令队列的数据由后台线程写入管道，可能晚于之后写入环形缓冲区的tick到达，
+        因此下一个编号的数据还没有到达时不处理编号更大的数据
+        """
+        self.active = True
+        command = None  # 已经取出但还没轮到处理的命令
+        tick = None  # 已经取出但还没轮到处理的tick
+
+        while self.active:
+            busy = False
+
+            if command is None:
+                try:
+                    command = self.commandQueue.get_nowait()
+                except Empty:
+                    pass
+
+            # 处理tick直到轮到命令
+            while self.active:
+                if tick is None:
+                    tick = self.ring.get()
+                    if tick is None:
+                        break
+
+                seq, data = tick
+                if seq != self.seq + 1:
+                    break
+
+                self.seq = seq
+                tick = None
+                busy = True
+                self.safeCall(self.processTick, unpackTick(data))
+
+            if command is not None and command[0] == self.seq + 1:
+                self.seq, command_name, name, data = command
+                command = None
+                busy = True
+                self.safeCall(self.processCommand, command_name, name, data)
+
+            if busy:
+                continue
+
+            # 主进程发出的数据都已处理完，等待通知
+            if self.signal.wait(self.seq):
+                continue
+
+            # 下一个编号的数据已经发出但还没有读到。tick在通知之前就已写入环形缓冲区，
+            # 因此没有可读的tick（或者读到的tick编号更大）时，只能是还在管道中的命令，阻塞读取直到到达
+            if command is None and (tick is not None or not self.ring.size()):
+                command = self.commandQueue.get()
+
+    # ----------------------------------------------------------------------
+    def safeCall(self, func, *args):
+        """调用函数，策略抛出的异常写入日志，不影响子进程运行"""
+        try:
+            func(*args)
+        except Exception:
+            self.writeCtaLog(u'策略进程%s出错：%s' % (self.name, traceback.format_exc().decode('utf-8', 'replace')))
+
+
+# ----------------------------------------------------------------------
+def runStrategyProcess(name, ring, command_queue, request_queue, reply_queue, signal):
+    """策略子进程的入口函数"""
+    engine = CtaProcessEngine(name, ring, command_queue, request_queue, reply_queue, signal)
+    engine.run()
@@ -4,6 +4,9 @@
 本文件中实现了行情数据记录引擎，用于汇总TICK数据，并生成K线插入数据库。
 
 使用DR_setting.json来配置需要收集的合约，以及主力合约代码。
+
+事件引擎支持批量处理函数（EventEngine2.registerBatch）时，一批tick中需要插入的数据
+会一起交给插入线程，插入线程再将同一集合的数据合并后批量插入数据库。
 """
 
 import copy
@@ -13,9 +16,11 @@ from datetime import datetime
 
 from drBase import *
 from vnpy.event.eventEngine import *
-from vnpy.utils.vtFunction import todayDate, findConfPath
+from vnpy.utils.vtFunction import todayDate, findConfPath, parseTickDatetime
 from vnpy.utils.vtGateway import VtSubscribeReq, VtLogData
 
+DR_INSERT_BATCH = 1000  # 插入线程每次最多合并插入的数据条数
+
 
 ########################################################################
 class DrEngine(object):
@@ -121,11 +126,28 @@ class DrEngine(object):
             # 注册事件监听
             self.registerEvent()
 
-            # ----------------------------------------------------------------------
-
+    # ----------------------------------------------------------------------
     def procecssTickEvent(self, event):
         """处理行情推送"""
-        tick = event.dict_['data']
+        insert_list = []
+        self.processTick(event.dict_['data'], insert_list)
+
+        if insert_list:
+            self.queue.put(insert_list)
+
+    # ----------------------------------------------------------------------
+    def processTickBatch(self, event_list):
+        """批量处理行情推送，所有需要插入的数据一次性交给插入线程"""
+        insert_list = []
+        for event in event_list:
+            self.processTick(event.dict_['data'], insert_list)
+
+        if insert_list:
+            self.queue.put(insert_list)
+
+    # ----------------------------------------------------------------------
+    def processTick(self, tick, insert_list):
+        """处理tick数据，需要插入数据库的数据添加到insert_list中"""
         vt_symbol = tick.vtSymbol
 
         # 转化Tick格式
@@ -134,15 +156,16 @@ class DrEngine(object):
         for key in d.keys():
             if key != 'datetime':
                 d[key] = tick.__getattribute__(key)
-        dr_tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
+        # 接口没有解析datetime字段时在这里解析
+        dr_tick.datetime = tick.datetime or parseTickDatetime(tick.date, tick.time)
 
         # 更新Tick数据
         if vt_symbol in self.tickDict:
-            self.insertData(TICK_DB_NAME, vt_symbol, dr_tick)
+            insert_list.append((TICK_DB_NAME, vt_symbol, dr_tick.__dict__))
 
             if vt_symbol in self.activeSymbolDict:
                 active_symbol = self.activeSymbolDict[vt_symbol]
-                self.insertData(TICK_DB_NAME, active_symbol, dr_tick)
+                insert_list.append((TICK_DB_NAME, active_symbol, dr_tick.__dict__))
 
             # 发出日志
             self.writeDrLog(u'记录Tick数据%s，时间:%s, last:%s, bid:%s, ask:%s'
@@ -156,11 +179,11 @@ class DrEngine(object):
             if not bar.datetime or bar.datetime.minute != dr_tick.datetime.minute:
                 if bar.vtSymbol:
                     new_bar = copy.copy(bar)
-                    self.insertData(MINUTE_DB_NAME, vt_symbol, new_bar)
+                    insert_list.append((MINUTE_DB_NAME, vt_symbol, new_bar.__dict__))
 
                     if vt_symbol in self.activeSymbolDict:
                         active_symbol = self.activeSymbolDict[vt_symbol]
-                        self.insertData(MINUTE_DB_NAME, active_symbol, new_bar)
+                        insert_list.append((MINUTE_DB_NAME, active_symbol, new_bar.__dict__))
 
                     self.writeDrLog(u'记录分钟线数据%s，时间:%s, O:%s, H:%s, L:%s, C:%s'
                                     % (bar.vtSymbol, bar.time, bar.open, bar.high,
@@ -188,24 +211,54 @@ class DrEngine(object):
 
     # ----------------------------------------------------------------------
     def registerEvent(self):
-        """注册事件监听"""
-        self.eventEngine.register(EVENT_TICK, self.procecssTickEvent)
+        """注册事件监听，事件引擎支持时使用批量处理函数"""
+        if hasattr(self.eventEngine, 'registerBatch'):
+            self.eventEngine.registerBatch(EVENT_TICK, self.processTickBatch)
+        else:
+            self.eventEngine.register(EVENT_TICK, self.procecssTickEvent)
 
     # ----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是CtaTickData或者CtaBarData）"""
-        self.queue.put((dbName, collectionName, data.__dict__))
+        self.queue.put([(dbName, collectionName, data.__dict__)])
 
     # ----------------------------------------------------------------------
     def run(self):
-        """运行插入线程"""
-        while self.active:
+        """
+        运行插入线程，队列中的每一项为(dbName, collectionName, d)列表，
+        None为停止标志，在此之前存入的数据都会被插入
+        """
+        while True:
+            insert_list = self.queue.get()
+            if insert_list is None:
+                break
+
+            # 将队列中已有的数据一起取出
+            stopped = False
             try:
-                db_name, collection_name, d = self.queue.get(block=True, timeout=1)
-                self.mainEngine.dbInsert(db_name, collection_name, d)
+                while len(insert_list) < DR_INSERT_BATCH:
+                    data = self.queue.get_nowait()
+                    if data is None:
+                        stopped = True
+                        break
+                    insert_list.extend(data)
             except Empty:
                 pass
 
+            # 同一集合的数据合并后批量插入，集合内保持原有顺序
+            collection_dict = {}
+            for db_name, collection_name, d in insert_list:
+                collection_dict.setdefault((db_name, collection_name), []).append(d)
+
+            for (db_name, collection_name), d_list in collection_dict.items():
+                if len(d_list) == 1:
+                    self.mainEngine.dbInsert(db_name, collection_name, d_list[0])
+                else:
+                    self.mainEngine.dbInsertMany(db_name, collection_name, d_list)
+
+            if stopped:
+                break
+
     # ----------------------------------------------------------------------
     def start(self):
         """启动"""
@@ -214,9 +267,10 @@ class DrEngine(object):
 
     # ----------------------------------------------------------------------
     def stop(self):
-        """退出"""
+        """退出，等待队列中的数据插入完成"""
         if self.active:
             self.active = False
+            self.queue.put(None)
             self.thread.join()
 
     # ----------------------------------------------------------------------
@@ -8,23 +8,19 @@
 """
 
 import json
-import os
 import platform
+from threading import Lock
 
 from vnpy.event.eventEngine import *
 from vnpy.utils.vtConstant import *
+from vnpy.utils.vtFunction import findConfPath
 from vnpy.utils.vtGateway import VtLogData
 
 
 ########################################################################
 class RmEngine(object):
     """风控引擎"""
-    settingFileName = 'RM_setting.json'
-    settingFileName = os.path.abspath(
-        os.path.join(
-            os.getcwd(), os.path.pardir, "conf", settingFileName
-        )
-    )
+    settingFileName = findConfPath('RM_setting.json')
     name = u'风控模块'
 
     # ----------------------------------------------------------------------
@@ -36,11 +32,14 @@ class RmEngine(object):
         # 是否启动风控
         self.active = False
 
+        # 保护计数，分片模式下策略可能在多个行情处理线程中同时发单
+        self.lock = Lock()
+
         # 流控相关
         self.orderFlowCount = EMPTY_INT  # 单位时间内委托计数
         self.orderFlowLimit = EMPTY_INT  # 委托限制
         self.orderFlowClear = EMPTY_INT  # 计数清空时间（秒）
-        self.orderFlowTimer = EMPTY_INT  # 计数清空时间计时
+        self.orderFlowTimer = None  # 计数清空的定时任务
 
         # 单笔委托相关
         self.orderSizeLimit = EMPTY_INT  # 单笔委托最大限制
@@ -95,23 +94,30 @@ class RmEngine(object):
     def registerEvent(self):
         """注册事件监听"""
         self.eventEngine.register(EVENT_TRADE, self.updateTrade)
-        self.eventEngine.register(EVENT_TIMER, self.updateTimer)
+        self.startOrderFlowTimer()
 
     # ----------------------------------------------------------------------
     def updateTrade(self, event):
         """更新成交数据"""
         trade = event.dict_['data']
-        self.tradeCount += trade.volume
+        with self.lock:
+            self.tradeCount += trade.volume
 
     # ----------------------------------------------------------------------
     def updateTimer(self, event):
-        """更新定时器"""
-        self.orderFlowTimer += 1
-
-        # 如果计时超过了流控清空的时间间隔，则执行清空
-        if self.orderFlowTimer >= self.orderFlowClear:
+        """流控清空时间到达，清空流控计数"""
+        with self.lock:
             self.orderFlowCount = 0
-            self.orderFlowTimer = 0
+
+    # ----------------------------------------------------------------------
+    def startOrderFlowTimer(self):
+        """启动（或按照新的清空时间重新启动）流控计数清空的定时任务"""
+        if self.orderFlowTimer:
+            self.eventEngine.cancelTimer(self.orderFlowTimer)
+
+        # 清空时间最短为1秒
+        interval = max(self.orderFlowClear, 1) * 1000
+        self.orderFlowTimer = self.eventEngine.addTimer(interval, self.updateTimer, repeat=True)
 
     # ----------------------------------------------------------------------
     def writeRiskLog(self, content):
@@ -149,12 +155,6 @@ class RmEngine(object):
                               % (self.tradeCount, self.tradeLimit))
             return False
 
-        # 检查流控
-        if self.orderFlowCount >= self.orderFlowLimit:
-            self.writeRiskLog(u'委托流数量%s，超过限制每%s秒%s'
-                              % (self.orderFlowCount, self.orderFlowClear, self.orderFlowLimit))
-            return False
-
         # 检查总活动合约
         working_order_count = len(self.mainEngine.getAllWorkingOrders())
         if working_order_count >= self.workingOrderLimit:
@@ -162,21 +162,32 @@ class RmEngine(object):
                               % (working_order_count, self.workingOrderLimit))
             return False
 
-        # 对于通过风控的委托，增加流控计数
-        self.orderFlowCount += 1
+        # 检查流控，检查和增加计数在同一次加锁中完成，避免并发发单时超过限制
+        with self.lock:
+            order_flow_count = self.orderFlowCount
+            if order_flow_count < self.orderFlowLimit:
+                # 对于通过风控的委托，增加流控计数
+                self.orderFlowCount += 1
+
+        if order_flow_count >= self.orderFlowLimit:
+            self.writeRiskLog(u'委托流数量%s，超过限制每%s秒%s'
+                              % (order_flow_count, self.orderFlowClear, self.orderFlowLimit))
+            return False
 
         return True
 
     # ----------------------------------------------------------------------
     def clearOrderFlowCount(self):
         """清空流控计数"""
-        self.orderFlowCount = 0
+        with self.lock:
+            self.orderFlowCount = 0
         self.writeRiskLog(u'清空流控计数')
 
     # ----------------------------------------------------------------------
     def clearTradeCount(self):
         """清空成交数量计数"""
-        self.tradeCount = 0
+        with self.lock:
+            self.tradeCount = 0
         self.writeRiskLog(u'清空总成交计数')
 
     # ----------------------------------------------------------------------
@@ -188,6 +199,7 @@ class RmEngine(object):
     def setOrderFlowClear(self, n):
         """设置流控清空时间"""
         self.orderFlowClear = n
+        self.startOrderFlowTimer()
 
     # ----------------------------------------------------------------------
     def setOrderSizeLimit(self, n):
@@ -155,6 +155,7 @@ class BasicMonitor(QtGui.QTableWidget):
     
     """
     signal = QtCore.pyqtSignal(type(Event()))
+    batchSignal = QtCore.pyqtSignal(list)
 
     # ----------------------------------------------------------------------
     def __init__(self, main_engine=None, event_engine=None, parent=None):
@@ -175,6 +176,9 @@ class BasicMonitor(QtGui.QTableWidget):
         # 监控的事件类型
         self.eventType = ''
 
+        # 是否以合并模式监听事件（只处理最新数据）
+        self.conflate = False
+
         # 字体
         self.font = None
 
@@ -206,6 +210,11 @@ class BasicMonitor(QtGui.QTableWidget):
         """设置监控的事件类型"""
         self.eventType = event_type
 
+    # ----------------------------------------------------------------------
+    def setConflate(self, conflate):
+        """设置是否以合并模式监听事件"""
+        self.conflate = conflate
+
     # ----------------------------------------------------------------------
     def setFont(self, font):
         """设置字体"""
@@ -241,9 +250,13 @@ class BasicMonitor(QtGui.QTableWidget):
 
     # ----------------------------------------------------------------------
     def registerEvent(self):
-        """注册GUI更新相关的事件监听"""
-        self.signal.connect(self.updateEvent)
-        self.eventEngine.register(self.eventType, self.signal.emit)
+        """注册GUI更新相关的事件监听，非合并模式下事件引擎支持时按批接收事件"""
+        if not self.conflate and hasattr(self.eventEngine, 'registerBatch'):
+            self.batchSignal.connect(self.updateEventBatch)
+            self.eventEngine.registerBatch(self.eventType, self.batchSignal.emit)
+        else:
+            self.signal.connect(self.updateEvent)
+            self.eventEngine.register(self.eventType, self.signal.emit, conflate=self.conflate)
 
     # ----------------------------------------------------------------------
     def updateEvent(self, event):
@@ -251,6 +264,16 @@ class BasicMonitor(QtGui.QTableWidget):
         data = event.dict_['data']
         self.updateData(data)
 
+    # ----------------------------------------------------------------------
+    def updateEventBatch(self, event_list):
+        """收到一批事件更新，全部更新完之后再重绘表格"""
+        self.setUpdatesEnabled(False)
+        try:
+            for event in event_list:
+                self.updateEvent(event)
+        finally:
+            self.setUpdatesEnabled(True)
+
     # ----------------------------------------------------------------------
     def updateData(self, data):
         """将数据更新到表格中"""
@@ -404,6 +427,9 @@ class MarketMonitor(BasicMonitor):
         # 设置监控事件类型
         self.setEventType(EVENT_TICK)
 
+        # 行情只需显示最新数据，使用合并模式
+        self.setConflate(True)
+
         # 设置字体
         self.setFont(BASIC_FONT)
 
@@ -658,6 +684,7 @@ class TradingWidget(QtGui.QFrame):
         self.eventEngine = event_engine
 
         self.symbol = ''
+        self.subscription = None  # 当前合约的行情订阅，(订阅请求, 接口名称)
 
         # 添加交易接口
         self.gatewayList.extend(main_engine.gatewayDict.keys())
@@ -903,7 +930,7 @@ class TradingWidget(QtGui.QFrame):
 
         # 重新注册事件监听
         self.eventEngine.deregister(EVENT_TICK + self.symbol, self.signal.emit)
-        self.eventEngine.register(EVENT_TICK + vt_symbol, self.signal.emit)
+        self.eventEngine.register(EVENT_TICK + vt_symbol, self.signal.emit, conflate=True)
 
         # 订阅合约
         req = VtSubscribeReq()
@@ -914,6 +941,12 @@ class TradingWidget(QtGui.QFrame):
 
         self.mainEngine.subscribe(req, gateway_name)
 
+        # 先订阅新合约再退订原来的合约，合约不变或者仍被其他模块订阅时不会发出退订
+        if self.subscription:
+            old_req, old_gateway_name = self.subscription
+            self.mainEngine.unsubscribe(old_req, old_gateway_name)
+        self.subscription = (req, gateway_name)
+
         # 更新组件当前交易的合约
         self.symbol = vt_symbol
 
@@ -1115,3 +1148,89 @@ class ContractMonitor(BasicMonitor):
         """显示"""
         super(ContractMonitor, self).show()
         self.refresh()
+
+
+########################################################################
+class EventStatsData(object):
+    """事件引擎性能统计监控中的一行数据"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, category, event_type, handler_name, summary):
+        """Constructor"""
+        self.key = '|'.join([category, event_type, handler_name])
+        self.category = category  # 统计类别
+        self.eventType = event_type  # 事件类型
+        self.handlerName = handler_name  # 处理函数
+        self.count = summary['count']  # 次数
+        self.mean = int(summary['mean'])  # 平均耗时（微秒）
+        self.p50 = summary['p50']  # 50%分位（微秒）
+        self.p99 = summary['p99']  # 99%分位（微秒）
+        self.max = int(summary['max'])  # 最大耗时（微秒）
+
+
+########################################################################
+class EventStatsMonitor(BasicMonitor):
+    """
+    事件引擎性能统计监控
+
+    打开时会开启事件引擎的性能统计，显示各事件类型的排队时间和各处理函数的执行时间，
+    标题栏显示各优先级通道当前的长度和最大长度
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, main_engine, event_engine, parent=None):
+        """Constructor"""
+        super(EventStatsMonitor, self).__init__(main_engine, event_engine, parent)
+
+        d = OrderedDict()
+        d['category'] = {'chinese': u'类别', 'cellType': BasicCell}
+        d['eventType'] = {'chinese': u'事件类型', 'cellType': BasicCell}
+        d['handlerName'] = {'chinese': u'处理函数', 'cellType': BasicCell}
+        d['count'] = {'chinese': u'次数', 'cellType': BasicCell}
+        d['mean'] = {'chinese': u'平均(us)', 'cellType': BasicCell}
+        d['p50'] = {'chinese': u'50%(us)', 'cellType': BasicCell}
+        d['p99'] = {'chinese': u'99%(us)', 'cellType': BasicCell}
+        d['max'] = {'chinese': u'最大(us)', 'cellType': BasicCell}
+        self.setHeaderDict(d)
+
+        self.setDataKey('key')
+        self.setEventType(EVENT_ENGINE_STATS)
+        self.setFont(BASIC_FONT)
+        self.setSorting(True)
+
+        self.setWindowTitle(u'事件引擎统计')
+        self.setMinimumSize(800, 500)
+        self.initTable()
+        self.registerEvent()
+
+    # ----------------------------------------------------------------------
+    def updateEvent(self, event):
+        """收到统计事件更新"""
+        self.updateStats(event.dict_['data'])
+
+    # ----------------------------------------------------------------------
+    def updateStats(self, stats):
+        """将统计数据更新到表格中"""
+        if not stats:
+            return
+
+        for event_type, summary in stats['wait'].items():
+            self.updateData(EventStatsData(u'排队', event_type, '', summary))
+
+        for event_type, handler_dict in stats['handler'].items():
+            for handler_name, summary in handler_dict.items():
+                self.updateData(EventStatsData(u'处理', event_type, handler_name, summary))
+
+        self.setWindowTitle(u'事件引擎统计    队列长度：%s    最大长度：%s'
+                            % (stats['queueSize'], stats['highWater']))
+
+    # ----------------------------------------------------------------------
+    def show(self):
+        """显示时开启性能统计"""
+        super(EventStatsMonitor, self).show()
+
+        stats = self.mainEngine.getEventStats()
+        if stats is None:
+            self.mainEngine.setEventStatsEnabled(True)
+        else:
+            self.updateStats(stats)
@@ -23,8 +23,7 @@ class MainWindow(QtGui.QMainWindow):
 
         self.widgetDict = {}  # 用来保存子窗口的字典
 
-        self.sbTrigger = 10  # 10秒刷新一次
-        self.sbCount = 0
+        self.sbInterval = 10000  # 10秒刷新一次
         self.statusLabel = QtGui.QLabel()
 
         self.initUi()
@@ -125,6 +124,9 @@ class MainWindow(QtGui.QMainWindow):
         rm_action = QtGui.QAction(u'风险管理', self)
         rm_action.triggered.connect(self.openRm)
 
+        stats_action = QtGui.QAction(u'事件引擎统计', self)
+        stats_action.triggered.connect(self.openEventStats)
+
         # 创建菜单
         menu_bar = self.menuBar()
 
@@ -165,6 +167,7 @@ class MainWindow(QtGui.QMainWindow):
         function_menu.addAction(contract_action)
         function_menu.addAction(dr_action)
         function_menu.addAction(rm_action)
+        function_menu.addAction(stats_action)
 
         # 算法相关
         algo_menu = menu_bar.addMenu(u'算法')
@@ -184,19 +187,13 @@ class MainWindow(QtGui.QMainWindow):
         self.statusBar().addPermanentWidget(self.statusLabel)
         self.statusLabel.setText(self.getCpuMemory())
 
-        self.sbCount = 0
-        self.sbTrigger = 10  # 10秒刷新一次
         self.signalStatusBar.connect(self.updateStatusBar)
-        self.eventEngine.register(EVENT_TIMER, self.signalStatusBar.emit)
+        self.eventEngine.addTimer(self.sbInterval, self.signalStatusBar.emit, repeat=True)
 
     # ----------------------------------------------------------------------
     def updateStatusBar(self, event):
         """在状态栏更新CPU和内存信息"""
-        self.sbCount += 1
-
-        if self.sbCount == self.sbTrigger:
-            self.sbCount = 0
-            self.statusLabel.setText(self.getCpuMemory())
+        self.statusLabel.setText(self.getCpuMemory())
 
     # ----------------------------------------------------------------------
     @staticmethod
@@ -258,6 +255,15 @@ class MainWindow(QtGui.QMainWindow):
             self.widgetDict['rmM'] = RmEngineManager(self.mainEngine.rmEngine, self.eventEngine)
             self.widgetDict['rmM'].show()
 
+    # ----------------------------------------------------------------------
+    def openEventStats(self):
+        """打开事件引擎统计"""
+        try:
+            self.widgetDict['statsM'].show()
+        except KeyError:
+            self.widgetDict['statsM'] = EventStatsMonitor(self.mainEngine, self.eventEngine)
+            self.widgetDict['statsM'].show()
+
     # ----------------------------------------------------------------------
     def closeEvent(self, event):
         """关闭事件"""
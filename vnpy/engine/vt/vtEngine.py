@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import importlib
 import os
 import shelve
 from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
 
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
@@ -10,6 +13,7 @@ from pymongo.errors import ConnectionFailure
 from vnpy.engine.cta.ctaEngine import CtaEngine
 from vnpy.engine.dr.drEngine import DrEngine
 from vnpy.engine.rm.rmEngine import RmEngine
+from vnpy.event.eventJournal import EventJournal
 from vnpy.utils.vtFunction import loadMongoSetting, findDataPath, findRootPath
 from vnpy.utils.vtGateway import *
 
@@ -31,6 +35,10 @@ class MainEngine(object):
         # MongoDB数据库相关
         self.dbClient = None  # MongoDB客户端对象
 
+        # 事件日志相关
+        self.journal = None  # 事件日志对象
+        self.journalTimer = None  # 定时写入硬盘的定时任务
+
         # 调用一个个初始化函数
         self.gatewayDict = None
         self.initGateway()
@@ -42,48 +50,83 @@ class MainEngine(object):
 
     # ----------------------------------------------------------------------
     def initGateway(self):
-        """初始化接口对象"""
-        # 用来保存接口对象的字典
+        """
+        初始化接口，只查找gate目录下的接口而不导入接口模块，
+        接口模块在第一次使用（如连接）时才导入并创建接口对象，避免启动时加载所有接口的API
+        """
+        # 用来保存接口对象的字典，尚未创建的接口对象为None
         self.gatewayDict = OrderedDict()
 
-        # 创建我们想要接入的接口对象
-        gate_dir = os.listdir(findRootPath() + '/gate')
+        # 接口名称和(接口模块, 接口类名称)的映射字典
+        self.gatewayModuleDict = {}
+        self.gatewayLock = Lock()
 
-        for _name in gate_dir:
+        gate_path = os.path.join(findRootPath(), 'gate')
 
-            if _name.startswith("__"):
+        for _name in sorted(os.listdir(gate_path)):
+            if _name.startswith("__") or not os.path.isdir(os.path.join(gate_path, _name)):
                 continue
-            try:
-                gate_module = __import__("vnpy.gate.{}.{}".format(_name.lower(), "{}Gateway".format(_name.lower())),
-                                         fromlist=["{}Gateway".format(_name.title())])
-                gateway = getattr(gate_module, "{}Gateway".format(_name.title()))
-                self.addGateway(gateway, _name.upper())
-                self.gatewayDict[_name.upper()].setQryEnabled(True)
-            except Exception, e:
-                print e
+
+            module_name = "vnpy.gate.{}.{}Gateway".format(_name.lower(), _name.lower())
+            class_name = "{}Gateway".format(_name.title())
+            self.gatewayModuleDict[_name.upper()] = (module_name, class_name)
+            self.gatewayDict[_name.upper()] = None
 
     # ----------------------------------------------------------------------
     def addGateway(self, gateway, gateway_name=None):
         """创建接口"""
         self.gatewayDict[gateway_name] = gateway(self.eventEngine, gateway_name)
 
+    # ----------------------------------------------------------------------
+    def loadGateway(self, gateway_name):
+        """导入接口模块并创建接口对象，失败时返回None"""
+        module_name, class_name = self.gatewayModuleDict[gateway_name]
+        try:
+            gate_module = importlib.import_module(module_name)
+            gateway = getattr(gate_module, class_name)
+        except Exception, e:
+            self.writeLog(u'接口加载失败：%s，%s' % (gateway_name, e))
+            return None
+
+        self.addGateway(gateway, gateway_name)
+        self.gatewayDict[gateway_name].setQryEnabled(True)
+        return self.gatewayDict[gateway_name]
+
+    # ----------------------------------------------------------------------
+    def getGateway(self, gateway_name):
+        """获取接口对象，第一次使用时才创建，接口不存在或者加载失败时返回None"""
+        if gateway_name not in self.gatewayDict:
+            self.writeLog(u'接口不存在：%s' % gateway_name)
+            return None
+
+        # 接口可能同时在界面线程和策略线程中第一次使用
+        with self.gatewayLock:
+            gateway = self.gatewayDict[gateway_name]
+            if gateway is None:
+                gateway = self.loadGateway(gateway_name)
+
+        return gateway
+
     # ----------------------------------------------------------------------
     def connect(self, gateway_name):
         """连接特定名称的接口"""
-        if gateway_name in self.gatewayDict:
-            gateway = self.gatewayDict[gateway_name]
+        gateway = self.getGateway(gateway_name)
+        if gateway:
             gateway.connect()
-        else:
-            self.writeLog(u'接口不存在：%s' % gateway_name)
 
     # ----------------------------------------------------------------------
     def subscribe(self, subscribe_req, gateway_name):
         """订阅特定接口的行情"""
-        if gateway_name in self.gatewayDict:
-            gateway = self.gatewayDict[gateway_name]
+        gateway = self.getGateway(gateway_name)
+        if gateway:
             gateway.subscribe(subscribe_req)
-        else:
-            self.writeLog(u'接口不存在：%s' % gateway_name)
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, subscribe_req, gateway_name):
+        """退订特定接口的行情，subscribe_req和订阅时相同"""
+        gateway = self.getGateway(gateway_name)
+        if gateway:
+            gateway.unsubscribe(subscribe_req)
 
     # ----------------------------------------------------------------------
     def sendOrder(self, order_req, gateway_name):
@@ -92,50 +135,93 @@ class MainEngine(object):
         if not self.rmEngine.checkRisk(order_req):
             return ''
 
-        if gateway_name in self.gatewayDict:
-            gateway = self.gatewayDict[gateway_name]
+        gateway = self.getGateway(gateway_name)
+        if gateway:
             return gateway.sendOrder(order_req)
-        else:
-            self.writeLog(u'接口不存在：%s' % gateway_name)
 
     # ----------------------------------------------------------------------
     def cancelOrder(self, cancel_order_req, gateway_name):
         """对特定接口撤单"""
-        if gateway_name in self.gatewayDict:
-            gateway = self.gatewayDict[gateway_name]
+        gateway = self.getGateway(gateway_name)
+        if gateway:
             gateway.cancelOrder(cancel_order_req)
-        else:
-            self.writeLog(u'接口不存在：%s' % gateway_name)
 
     # ----------------------------------------------------------------------
     def qryAccount(self, gateway_name):
         """查询特定接口的账户"""
-        if gateway_name in self.gatewayDict:
-            gateway = self.gatewayDict[gateway_name]
+        gateway = self.getGateway(gateway_name)
+        if gateway:
             gateway.qryAccount()
-        else:
-            self.writeLog(u'接口不存在：%s' % gateway_name)
 
     # ----------------------------------------------------------------------
     def qryPosition(self, gateway_name):
         """查询特定接口的持仓"""
-        if gateway_name in self.gatewayDict:
-            gateway = self.gatewayDict[gateway_name]
+        gateway = self.getGateway(gateway_name)
+        if gateway:
             gateway.qryPosition()
-        else:
-            self.writeLog(u'接口不存在：%s' % gateway_name)
+
+    # ----------------------------------------------------------------------
+    def setEventStatsEnabled(self, enabled, interval=10):
+        """开启或关闭事件引擎的性能统计，interval为推送统计事件的间隔（秒）"""
+        self.eventEngine.setStatsEnabled(enabled, interval)
+
+    # ----------------------------------------------------------------------
+    def getEventStats(self):
+        """查询事件引擎的性能统计数据，统计关闭时返回None"""
+        return self.eventEngine.getStats()
+
+    # ----------------------------------------------------------------------
+    def startJournal(self, file_name=''):
+        """开始记录事件日志，默认保存在data目录下以当前时间命名的文件中"""
+        if self.journal:
+            return
+
+        if not file_name:
+            file_name = findDataPath('EventJournal_%s.vtj' % datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+        self.journal = EventJournal(file_name)
+        self.eventEngine.setJournal(self.journal)
+        self.journalTimer = self.eventEngine.addTimer(1000, self.flushJournal, repeat=True)
+        self.writeLog(u'开始记录事件日志：%s' % file_name)
+
+    # ----------------------------------------------------------------------
+    def flushJournal(self, event):
+        """定时将事件日志写入硬盘"""
+        if self.journal:
+            self.journal.flush()
+
+    # ----------------------------------------------------------------------
+    def stopJournal(self):
+        """停止记录事件日志"""
+        if not self.journal:
+            return
+
+        self.eventEngine.setJournal(None)
+        self.eventEngine.cancelTimer(self.journalTimer)
+        self.journal.close()
+        self.writeLog(u'停止记录事件日志，共记录%d条' % self.journal.count)
+
+        self.journal = None
+        self.journalTimer = None
 
     # ----------------------------------------------------------------------
     def exit(self):
         """退出程序前调用，保证正常退出"""
         # 安全关闭所有接口
         for gateway in self.gatewayDict.values():
-            gateway.close()
+            if gateway:
+                gateway.close()
 
-        # 停止事件引擎
-        self.eventEngine.stop()
+        # 停止策略子进程
+        self.ctaEngine.stop()
 
-        # 停止数据记录引擎
+        # 停止记录事件日志
+        self.stopJournal()
+
+        # 停止事件引擎，先处理完队列中的事件（如行情记录需要插入的数据）
+        self.eventEngine.stop(drain=True)
+
+        # 停止数据记录引擎，等待数据插入完成
         self.drEngine.stop()
 
         # 保存数据引擎里的合约数据到硬盘
@@ -176,6 +262,14 @@ class MainEngine(object):
             collection = db[collection_name]
             collection.insert(d)
 
+    # ----------------------------------------------------------------------
+    def dbInsertMany(self, db_name, collection_name, d_list):
+        """向MongoDB中批量插入数据，d_list是数据列表"""
+        if self.dbClient:
+            db = self.dbClient[db_name]
+            collection = db[collection_name]
+            collection.insert(d_list)
+
     # ----------------------------------------------------------------------
     def dbQuery(self, db_name, collection_name, d):
         """从MongoDB中读取数据，d是查询要求，返回的是数据库查询的指针"""
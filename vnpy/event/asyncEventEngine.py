@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是基于asyncio事件循环的事件驱动引擎。
+
+Python 2下需要安装asyncio的移植版本trollius（pip install trollius），
+协程的写法为@asyncio.coroutine装饰的生成器，使用yield From(...)等待，
+Return(...)返回结果；Python 3下则直接使用标准库中的asyncio。
+"""
+
+from threading import Lock, Thread
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from eventEngine import Event, HandlerTable, TopicTrie, WILDCARD, getTopic
+from eventType import *
+from timerWheel import TimerTask
+
+# 将协程包装为任务的函数，旧版本中名为async
+ensureFuture = getattr(asyncio, 'ensure_future', None) or getattr(asyncio, 'async')
+
+
+########################################################################
+class AsyncEventEngine(object):
+    """
+    基于asyncio事件循环的事件驱动引擎
+
+    和EventEngine2一样提供register、deregister、put、start、stop以及addTimer、cancelTimer，
+    区别在于：
+    1. 所有事件都在单独线程中运行的asyncio事件循环里处理，put是线程安全的，
+       可以直接在CTP等接口的回调线程中调用
+    2. 处理函数可以是协程（返回协程或者Future对象），引擎会将其加入事件循环后立即处理
+       下一个处理函数，因此在处理函数中等待IO不会阻塞行情等事件的处理
+    3. 计时器事件和定时任务直接使用事件循环的计时功能，不需要单独的计时器线程
+
+    事件按照存入的顺序处理，没有EventEngine2的优先级和合并模式。
+
+    协程处理函数的写法（Python 2 + trollius）：
+
+    @asyncio.coroutine
+    def onTick(self, event):
+        yield From(asyncio.sleep(0))
+        ...
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """初始化事件引擎"""
+        # 事件循环以及运行事件循环的线程
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = Thread(target=self.__run)
+
+        # 事件引擎开关
+        self.__active = False
+
+        # 计时器事件的触发间隔（默认1秒），以及下次触发的事件循环时间
+        self.__timerSleep = 1
+        self.__timerNext = 0
+
+        # 处理函数表，注册和注销时创建新的处理函数元组替换（写时复制），
+        # 事件循环线程遍历的元组不会被其他线程修改
+        self.__handlers = HandlerTable()
+
+        # 通配符监听的处理函数
+        self.__wildcards = TopicTrie()
+
+        # 注册锁，register和deregister可能在不同的线程中调用
+        self.__registerLock = Lock()
+
+        # 定时任务字典，key为TimerTask，value为事件循环返回的计时句柄
+        self.__timerTasks = {}
+
+    # ----------------------------------------------------------------------
+    def __run(self):
+        """运行在事件循环线程中的函数"""
+        asyncio.set_event_loop(self.__loop)
+
+        self.__timerNext = self.__loop.time()
+        self.__loop.call_soon(self.__onTimer)
+
+        self.__loop.run_forever()
+
+    # ----------------------------------------------------------------------
+    def __process(self, event):
+        """处理事件"""
+        handlers = self.__handlers
+
+        # 检查是否存在对该事件进行监听的处理函数
+        handler_tuple = handlers.handlers.get(event.type_)
+        if handler_tuple:
+            for handler in handler_tuple:
+                self.__callHandler(handler, event)
+
+        # 带有路由键的事件，同时推送给监听type_+key_的处理函数
+        if event.key_:
+            routed = handlers.routedHandlers.get(event.type_)
+            if routed:
+                handler_tuple = routed.get(event.key_)
+                if handler_tuple:
+                    for handler in handler_tuple:
+                        self.__callHandler(handler, event)
+
+        # 推送给通配符匹配的处理函数
+        if self.__wildcards.count:
+            for handler in self.__wildcards.match(getTopic(event)):
+                self.__callHandler(handler, event)
+
+    # ----------------------------------------------------------------------
+    def __callHandler(self, handler, event):
+        """调用处理函数，若返回的是协程则加入事件循环运行"""
+        result = handler(event)
+
+        if result is not None and (asyncio.iscoroutine(result) or isinstance(result, asyncio.Future)):
+            ensureFuture(result, loop=self.__loop)
+
+    # ----------------------------------------------------------------------
+    def __onTimer(self):
+        """处理计时器事件，并安排下一次触发"""
+        if not self.__active:
+            return
+
+        self.__process(Event(type_=EVENT_TIMER))
+
+        # 按照固定的时间点触发，避免处理耗时造成的累计误差
+        self.__timerNext += self.__timerSleep
+        self.__loop.call_at(self.__timerNext, self.__onTimer)
+
+    # ----------------------------------------------------------------------
+    def start(self):
+        """引擎启动"""
+        # 将引擎设为启动
+        self.__active = True
+
+        # 启动事件循环线程，计时器事件随事件循环一起启动
+        self.__thread.start()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """停止引擎，未启动或者已经停止时不做任何操作"""
+        if not self.__active:
+            return
+
+        # 将引擎设为停止
+        self.__active = False
+
+        # 停止事件循环，并等待线程退出
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+
+    # ----------------------------------------------------------------------
+    def register(self, type_, handler, conflate=False):
+        """
+        注册事件处理函数监听，处理函数可以是普通函数，也可以是协程函数，
+        type_以WILDCARD结尾时监听所有以该前缀开头的事件
+        本引擎没有合并模式，conflate参数只为和EventEngine2的接口兼容，会被忽略
+        """
+        with self.__registerLock:
+            if type_.endswith(WILDCARD):
+                self.__wildcards.add(type_[:-1], handler)
+            else:
+                self.__handlers.add(type_, handler)
+
+    # ----------------------------------------------------------------------
+    def deregister(self, type_, handler):
+        """注销事件处理函数监听"""
+        with self.__registerLock:
+            if type_.endswith(WILDCARD):
+                self.__wildcards.remove(type_[:-1], handler)
+            else:
+                self.__handlers.remove(type_, handler)
+
+    # ----------------------------------------------------------------------
+    def put(self, event):
+        """向事件循环中存入事件，可以在任意线程中调用，引擎停止后存入的事件直接丢弃"""
+        try:
+            self.__loop.call_soon_threadsafe(self.__process, event)
+        except RuntimeError:
+            # 事件循环已经关闭
+            pass
+
+    # ----------------------------------------------------------------------
+    def addTimer(self, interval, callback, repeat=False):
+        """
+        添加定时任务，interval为时间间隔（毫秒），repeat为True时重复执行
+        callback和事件处理函数一样接收一个event对象（也可以是协程函数），在事件循环中调用
+        返回TimerTask对象，可用于cancelTimer取消
+        """
+        task = TimerTask(callback, interval, repeat)
+        self.__loop.call_soon_threadsafe(self.__scheduleTimer, task)
+        return task
+
+    # ----------------------------------------------------------------------
+    def cancelTimer(self, task):
+        """取消定时任务"""
+        task.active = False
+
+        try:
+            self.__loop.call_soon_threadsafe(self.__unscheduleTimer, task)
+        except RuntimeError:
+            # 事件循环已经关闭，定时任务不会再执行
+            pass
+
+    # ----------------------------------------------------------------------
+    def __scheduleTimer(self, task):
+        """在事件循环中安排定时任务的下一次执行"""
+        if task.active:
+            self.__timerTasks[task] = self.__loop.call_later(task.interval / 1000.0, self.__onTimerTask, task)
+
+    # ----------------------------------------------------------------------
+    def __unscheduleTimer(self, task):
+        """在事件循环中取消定时任务"""
+        handle = self.__timerTasks.pop(task, None)
+        if handle:
+            handle.cancel()
+
+    # ----------------------------------------------------------------------
+    def __onTimerTask(self, task):
+        """执行到期的定时任务"""
+        self.__timerTasks.pop(task, None)
+        if not task.active:
+            return
+
+        if task.repeat:
+            self.__scheduleTimer(task)
+        else:
+            task.active = False
+
+        event = Event(type_=EVENT_TIMER_TASK)
+        event.dict_['data'] = task
+        self.__callHandler(task.callback, event)
+
+    # ----------------------------------------------------------------------
+    def getLoop(self):
+        """获取事件循环，处理函数中需要使用事件循环的其他功能时调用"""
+        return self.__loop
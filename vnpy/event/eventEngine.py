@@ -1,12 +1,56 @@
 # -*- coding: utf-8 -*-
 
+import cPickle
+import platform
+import tempfile
+import time
 from Queue import Queue, Empty
-from threading import Thread
-from time import sleep
-
-from PyQt4.QtCore import QTimer
+from collections import deque
+from threading import Thread, Condition, Lock, current_thread
 
 from eventType import *
+from timerWheel import TimerTask, TimerWheel
+
+# 事件优先级，数值越小越优先处理
+PRIORITY_HIGH = 0  # 成交、委托等交易回报
+PRIORITY_NORMAL = 1  # 持仓、资金、日志、计时器等
+PRIORITY_LOW = 2  # 行情推送
+
+# 默认的事件优先级设置，key为事件类型（带后缀的事件类型如EVENT_TICK+vtSymbol使用前缀的设置）
+# 未在其中的事件类型使用PRIORITY_NORMAL
+DEFAULT_PRIORITY_DICT = {
+    EVENT_TRADE: PRIORITY_HIGH,
+    EVENT_ORDER: PRIORITY_HIGH,
+    EVENT_ERROR: PRIORITY_HIGH,
+    EVENT_TICK: PRIORITY_LOW
+}
+
+# 通配符，注册的事件类型以其结尾时，监听所有以该前缀开头的事件（如EVENT_TICK+'rb*'）
+WILDCARD = '*'
+
+# 有界队列已满时的处理策略
+POLICY_BLOCK = 'block'  # 阻塞推送事件的线程，直到队列空出位置
+POLICY_DROP_OLDEST = 'dropOldest'  # 丢弃同一优先级通道中最早的事件
+POLICY_CONFLATE = 'conflate'  # 按照路由键（或vtSymbol）合并，队列中只保留最新的事件
+POLICY_SPILL = 'spill'  # 暂存到磁盘文件中，队列空出位置后再读回
+
+# 默认的队列已满处理策略，key为事件类型，未在其中的事件类型使用POLICY_BLOCK
+DEFAULT_POLICY_DICT = {
+    EVENT_TICK: POLICY_CONFLATE
+}
+
+# 处理线程每次从队列中取出的事件数量上限
+DEFAULT_BATCH_SIZE = 100
+
+# 事件环形缓冲区的默认长度（会向上取整为2的幂），以及缓冲区已满时推送线程的等待时间（秒）
+DEFAULT_RING_SIZE = 65536
+RING_FULL_SLEEP = 0.0001
+
+# 性能统计使用的计时函数，Windows上time.clock的精度更高
+if platform.system() == 'Windows':
+    timer = time.clock
+else:
+    timer = time.time
 
 
 ########################################################################
@@ -34,6 +78,8 @@ class EventEngine(object):
     register：公共方法，向引擎中注册监听函数
     deregister：公共方法，向引擎中注销监听函数
     put：公共方法，向事件队列中存入新的事件
+    addTimer：公共方法，添加定时任务
+    cancelTimer：公共方法，取消定时任务
     
     事件监听函数必须定义为输入参数仅为一个event对象，即：
     
@@ -48,10 +94,10 @@ class EventEngine(object):
     """
 
     # ----------------------------------------------------------------------
-    def __init__(self):
-        """初始化事件引擎"""
+    def __init__(self, max_queue_size=0):
+        """初始化事件引擎，max_queue_size大于0时事件队列为有界队列，队列已满时put会阻塞"""
         # 事件队列
-        self.__queue = Queue()
+        self.__queue = Queue(max_queue_size)
 
         # 事件引擎开关
         self.__active = False
@@ -60,6 +106,8 @@ class EventEngine(object):
         self.__thread = Thread(target=self.__run)
 
         # 计时器，用于触发计时器事件
+        # PyQt4只有EventEngine需要，在这里才导入，无界面运行（如bin/server.py）时无需加载
+        from PyQt4.QtCore import QTimer
         self.__timer = QTimer()
         self.__timer.timeout.connect(self.__onTimer)
 
@@ -67,6 +115,13 @@ class EventEngine(object):
         # 其中每个键对应的值是一个列表，列表中保存了对该事件进行监听的函数功能
         self.__handlers = {}
 
+        # 通配符监听的处理函数
+        self.__wildcards = TopicTrie()
+
+        # 定时任务字典，key为TimerTask，value为对应的Qt计时器
+        self.__timerTasks = {}
+        self.register(EVENT_TIMER_TASK, self.__processTimerTask)
+
     # ----------------------------------------------------------------------
     def __run(self):
         """引擎运行"""
@@ -89,6 +144,16 @@ class EventEngine(object):
             # for handler in self.__handlers[event.type_]:
             # handler(event)
 
+        # 带有路由键的事件，同时推送给监听type_+key_的处理函数
+        if event.key_:
+            type_ = event.type_ + event.key_
+            if type_ in self.__handlers:
+                [handler(event) for handler in self.__handlers[type_]]
+
+        # 推送给通配符匹配的处理函数
+        if self.__wildcards.count:
+            [handler(event) for handler in self.__wildcards.match(getTopic(event))]
+
     # ----------------------------------------------------------------------
     def __onTimer(self):
         """向事件队列中存入计时器事件"""
@@ -124,8 +189,15 @@ class EventEngine(object):
         self.__thread.join()
 
     # ----------------------------------------------------------------------
-    def register(self, type_, handler):
-        """注册事件处理函数监听"""
+    def register(self, type_, handler, conflate=False):
+        """
+        注册事件处理函数监听，type_以WILDCARD结尾时监听所有以该前缀开头的事件
+        本引擎没有合并模式，conflate参数只为和EventEngine2的接口兼容，会被忽略
+        """
+        if type_.endswith(WILDCARD):
+            self.__wildcards.add(type_[:-1], handler)
+            return
+
         # 尝试获取该事件类型对应的处理函数列表，若无则创建
         try:
             handler_list = self.__handlers[type_]
@@ -140,6 +212,10 @@ class EventEngine(object):
     # ----------------------------------------------------------------------
     def deregister(self, type_, handler):
         """注销事件处理函数监听"""
+        if type_.endswith(WILDCARD):
+            self.__wildcards.remove(type_[:-1], handler)
+            return
+
         # 尝试获取该事件类型对应的处理函数列表，若无则忽略该次注销请求
         try:
             handler_list = self.__handlers[type_]
@@ -159,141 +235,1405 @@ class EventEngine(object):
         """向事件队列中存入事件"""
         self.__queue.put(event)
 
+    # ----------------------------------------------------------------------
+    def addTimer(self, interval, callback, repeat=False):
+        """
+        添加定时任务，interval为时间间隔（毫秒），repeat为True时重复执行
+        callback和事件处理函数一样接收一个event对象，在事件处理线程中调用
+        返回TimerTask对象，可用于cancelTimer取消
+        """
+        from PyQt4.QtCore import QTimer
+
+        task = TimerTask(callback, interval, repeat)
+
+        qt_timer = QTimer()
+        qt_timer.setSingleShot(not repeat)
+        qt_timer.timeout.connect(lambda: self.__onTimerTask(task))
+        qt_timer.start(interval)
+
+        self.__timerTasks[task] = qt_timer
+        return task
+
+    # ----------------------------------------------------------------------
+    def cancelTimer(self, task):
+        """取消定时任务"""
+        task.active = False
+
+        qt_timer = self.__timerTasks.pop(task, None)
+        if qt_timer:
+            qt_timer.stop()
+
+    # ----------------------------------------------------------------------
+    def __onTimerTask(self, task):
+        """定时任务到期后，向事件队列中存入定时任务事件"""
+        event = Event(type_=EVENT_TIMER_TASK)
+        event.dict_['data'] = task
+        self.put(event)
+
+    # ----------------------------------------------------------------------
+    def __processTimerTask(self, event):
+        """在事件处理线程中执行定时任务"""
+        task = event.dict_['data']
+        if not task.active:
+            return
+
+        # 单次任务的Qt计时器已经停止，只需移除
+        if not task.repeat:
+            task.active = False
+            self.__timerTasks.pop(task, None)
+        task.callback(event)
+
 
 ########################################################################
 class EventEngine2(object):
     """
-    计时器使用python线程的事件驱动引擎        
+    计时器使用python线程的事件驱动引擎
+
+    事件队列按照优先级分为多条通道，处理线程总是先处理高优先级通道中的事件，
+    从而保证成交、委托等回报不会排在大量的行情推送之后。
+    事件类型对应的优先级可以通过setPriority修改，默认设置见DEFAULT_PRIORITY_DICT。
+    同一优先级通道内的事件依然按照先进先出的顺序处理。
+
+    注册时传入conflate=True的处理函数工作在合并模式：同一事件类型、同一vtSymbol
+    在队列中最多只保留一个待处理事件，新的事件会直接替换掉队列中尚未处理的旧事件，
+    因此该处理函数总是只收到最新的数据（适用于GUI等不需要每个tick的消费者）。
+    未开启合并模式的处理函数（如行情记录）依然会收到每一个事件。
+
+    shard_count大于0时引擎工作在分片模式：行情事件按照vtSymbol的哈希值分配到shard_count个
+    处理线程中，同一合约的行情始终由同一线程按顺序处理，不同合约之间互不阻塞；委托、成交、
+    持仓、资金、计时器、日志等其他事件则全部由单独的全局线程按顺序处理，相互之间不会乱序。
+    注意分片模式下行情处理函数可能同时在多个线程中被调用（针对不同的合约），并且和其他事件的
+    处理函数并发执行，处理函数中修改的共享状态（如CtaEngine、RmEngine中的字典和计数）需要加锁。
+    shard_count为0（默认）时所有事件都由同一个线程处理，和原先的行为一致。
+
+    注册的事件类型以WILDCARD结尾时为通配符监听，如EVENT_TICK+'rb*'监听所有rb合约的行情，
+    EVENT_ORDER+'CTP.*'监听CTP接口的所有委托（匹配的对象为type_+key_）。通配符保存在前缀树中，
+    每个具体事件类型匹配的结果会被缓存，因此分发的开销和精确匹配相同。合并模式的通配符
+    监听需要包含完整的事件类型前缀（如EVENT_TICK+'*'）。
+
+    处理函数保存在HandlerTable中，注册和注销时在锁的保护下创建新的元组替换原有的元组
+    （写时复制），因此可以在任意线程中注册和注销，处理线程分发事件时无需加锁，
+    也不会遍历到正在被修改的列表。
+
+    通过addTimer可以添加毫秒级精度的单次或者重复执行的定时任务，任务由计时器线程中的
+    分层时间轮（TimerWheel）调度，到期后以EVENT_TIMER_TASK事件的形式存入队列，
+    回调函数在事件处理线程中执行，添加和取消任务的复杂度都是O(1)。
+    原有的每秒一次的EVENT_TIMER事件不受影响。
+
+    通过setStatsEnabled可以开启性能统计：记录事件在队列中的等待时间、各处理函数的
+    执行时间分布以及队列长度的最大值，统计结果可以通过getStats查询，同时每隔一段时间
+    以EVENT_ENGINE_STATS事件的形式推送。统计关闭时（默认）几乎没有额外开销。
+
+    max_queue_size大于0时每个处理线程的事件队列为有界队列，队列已满时按照事件类型
+    对应的策略处理新的事件（见POLICY_*，默认设置见DEFAULT_POLICY_DICT，可通过setPolicy修改）：
+    阻塞推送线程、丢弃最早的事件、按合约合并、或者暂存到磁盘。丢弃、合并、暂存和阻塞
+    的次数可以通过getPressureCount查询。max_queue_size为0（默认）时队列长度不受限制。
+
+    通过setJournal设置事件日志（见eventJournal.EventJournal）后，存入队列的事件会被记录下来，
+    之后可以用EventReplayer回放。
+
+    对于CTP行情回调这类推送频率很高、且只在一个线程中推送的场合，可以通过createRing创建
+    预分配的环形缓冲区EventRing，推送线程调用ring.put存入事件时不需要加锁，只有在处理线程
+    休眠时才需要唤醒；全局处理线程每次取事件前批量读出所有缓冲区中的事件，再按照put的
+    逻辑（优先级、合并、有界队列等）一次性存入队列。
+
+    处理线程每次加锁时取出队列中所有的事件（最多batch_size个），逐个处理完之后再取下一批，
+    因此突发的大量事件只需要很少的加锁和唤醒次数；batch_size为1时和逐个取出的行为一致。
+    注意一批事件处理完之前，新存入的高优先级事件需要等待。
+    通过registerBatch注册的批量处理函数，在每批事件处理完之后一次性收到该批中对应
+    事件类型的所有事件（列表，多个批量处理函数共用同一个列表，不应修改），适用于数据库批量
+    插入、界面一次性刷新等场合。批量处理函数不支持合并模式和通配符。
+
+    处理线程在队列为空时不设超时地等待，存入事件或者停止引擎时才会被唤醒，因此空闲时不会
+    定期醒来检查，stop也可以立即返回。stop(drain=True)会先处理完队列中等待的事件
+    （如行情记录尚未插入的数据）再退出。
     """
 
     # ----------------------------------------------------------------------
-    def __init__(self):
+    def __init__(self, priority_dict=None, shard_count=0, max_queue_size=0, policy_dict=None,
+                 batch_size=DEFAULT_BATCH_SIZE):
         """初始化事件引擎"""
-        # 事件队列
-        self.__queue = Queue()
+        # 全局事件的处理线程（非分片模式下处理所有事件）
+        self.__globalWorker = EventWorker(self.__run, max_queue_size)
+
+        # 分片模式下按vtSymbol分配事件的处理线程
+        self.__shardWorkers = [EventWorker(self.__run, max_queue_size) for _ in range(shard_count)]
+        self.__shardCount = shard_count
+
+        self.__workers = [self.__globalWorker] + self.__shardWorkers
+        self.__workerThreads = frozenset(worker.thread for worker in self.__workers)
+
+        # 事件环形缓冲区，由全局处理线程读取
+        self.__rings = []
+
+        # 处理线程每次取出的事件数量上限
+        self.__batchSize = max(batch_size, 1)
+
+        # 事件类型和优先级的映射字典
+        self.__priorityDict = dict(DEFAULT_PRIORITY_DICT)
+        if priority_dict:
+            self.__priorityDict.update(priority_dict)
+        self.__priorityCache = {}  # 缓存具体事件类型（包括后缀）对应的优先级
+
+        # 有界队列的长度上限，以及事件类型和队列已满处理策略的映射字典
+        self.__maxQueueSize = max_queue_size
+        self.__policyDict = dict(DEFAULT_POLICY_DICT)
+        if policy_dict:
+            self.__policyDict.update(policy_dict)
+        self.__policyCache = {}
+
+        # 按POLICY_CONFLATE策略合并的事件位置，key为事件类型，value为{vtSymbol: ConflationSlot}字典
+        self.__pressureSlots = {}
+
+        # 事件日志，为None时不记录
+        self.__journal = None
 
         # 事件引擎开关
         self.__active = False
 
-        # 事件处理线程
-        self.__thread = Thread(target=self.__run)
-
         # 计时器，用于触发计时器事件
         self.__timer = Thread(target=self.__runTimer)
         self.__timerActive = False  # 计时器工作状态
         self.__timerSleep = 1  # 计时器触发间隔（默认1秒）
 
-        # 这里的__handlers是一个字典，用来保存对应的事件调用关系
-        # 其中每个键对应的值是一个列表，列表中保存了对该事件进行监听的函数功能
-        self.__handlers = {}
+        # 时间轮，用于调度定时任务
+        self.__timerWheel = TimerWheel()
+        self.__timerCondition = Condition()  # 用于时间轮的线程同步以及唤醒计时器线程
+        self.__timerTick = 0.001  # 时间轮的刻度（秒）
+        self.__timerStart = timer()  # 时间轮第0个刻度对应的时间
+
+        # 这里的__handlers是一个处理函数表，用来保存对应的事件调用关系
+        # 其中每个事件类型对应一个元组，元组中保存了对该事件进行监听的函数功能
+        self.__handlers = HandlerTable()
+
+        # 合并模式的处理函数表
+        self.__conflatedHandlers = HandlerTable()
+
+        # 批量处理函数表
+        self.__batchHandlers = HandlerTable()
+
+        # 通配符监听的处理函数（包括合并模式）
+        self.__wildcards = TopicTrie()
+        self.__conflatedWildcards = TopicTrie()
+
+        # 注册和注销处理函数时使用的锁
+        self.__registerLock = Lock()
+
+        # 合并模式下等待处理的事件位置，key为事件类型，value为{vtSymbol: ConflationSlot}字典
+        self.__conflationSlots = {}
+
+        # 性能统计，为None时说明统计关闭
+        self.__stats = None
+        self.__statsInterval = 10  # 推送统计事件的间隔（计时器触发次数）
+        self.__statsCount = 0
+
+        # 定时任务到期后由引擎自身的处理函数执行
+        self.register(EVENT_TIMER_TASK, self.__processTimerTask)
 
     # ----------------------------------------------------------------------
-    def __run(self):
-        """引擎运行"""
-        while self.__active:
+    def __run(self, worker):
+        """引擎运行，每个处理线程批量取出各自队列中的事件处理"""
+        batch_size = self.__batchSize
+
+        while True:
+            # 全局处理线程负责将环形缓冲区中的事件存入队列
+            if worker.rings:
+                self.__drainRings(worker.rings)
+
+            event_list = worker.getBatch(batch_size)
+            if not event_list:
+                # 停止后（drain模式下则是队列已经处理完）退出
+                if not worker.active and not worker.hasRingData():
+                    break
+                continue
+
+            # 非drain模式下停止时，放弃队列中剩余的事件
+            if not worker.active and not worker.drain:
+                break
+
+            stats = self.__stats
+            batch_handlers = self.__batchHandlers
+            batch_dict = {} if batch_handlers.handlers else None
+
+            for event in event_list:
+                # 合并模式的事件在取出时已经读取了其中最新的数据，包装为元组以示区别
+                if event.__class__ is tuple:
+                    event = event[0]
+                    handlers = self.__conflatedHandlers
+                    wildcards = self.__conflatedWildcards
+                else:
+                    handlers = self.__handlers
+                    wildcards = self.__wildcards
+
+                    if batch_dict is not None:
+                        self.__collectBatch(event, batch_handlers, batch_dict)
+
+                if stats is None:
+                    self.__process(event, handlers, wildcards)
+                else:
+                    self.__processWithStats(event, handlers, wildcards, stats)
+
+            # 该批事件处理完之后调用批量处理函数
+            if batch_dict:
+                self.__processBatch(batch_dict, batch_handlers, stats)
+
+    # ----------------------------------------------------------------------
+    def __drainRings(self, rings):
+        """读出所有环形缓冲区中的事件，批量存入队列"""
+        for ring in rings:
+            if ring.head != ring.tail:
+                self.__putBatch(ring.drain())
+
+    # ----------------------------------------------------------------------
+    def __getWorker(self, event):
+        """获取负责处理该事件的线程"""
+        if not self.__shardCount:
+            return self.__globalWorker
+
+        # 只有行情事件分片处理，其他事件（包括带有vtSymbol的委托、成交等）作为全局事件处理，
+        # 保证同一委托的回报和成交按顺序处理
+        if not event.type_.startswith(EVENT_TICK):
+            return self.__globalWorker
+
+        vt_symbol = getattr(event.dict_.get('data'), 'vtSymbol', None)
+        if not vt_symbol:
+            return self.__globalWorker
+
+        return self.__shardWorkers[hash(vt_symbol) % self.__shardCount]
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __process(event, handlers, wildcards):
+        """
+        处理事件，handlers为处理函数表，wildcards为通配符监听的前缀树
+        处理函数元组在注册时已经创建好，这里只读取不修改，因此无需加锁
+        """
+        # 检查是否存在对该事件进行监听的处理函数，若存在，则按顺序将事件传递给处理函数执行
+        handler_tuple = handlers.handlers.get(event.type_)
+        if handler_tuple:
+            for handler in handler_tuple:
+                handler(event)
+
+        # 带有路由键的事件，同时推送给监听type_+key_的处理函数（按前缀和路由键查询，无需拼接字符串）
+        if event.key_:
+            routed = handlers.routedHandlers.get(event.type_)
+            if routed:
+                handler_tuple = routed.get(event.key_)
+                if handler_tuple:
+                    for handler in handler_tuple:
+                        handler(event)
+
+        # 推送给通配符匹配的处理函数
+        if wildcards.count:
+            for handler in wildcards.match(getTopic(event)):
+                handler(event)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __processWithStats(event, handlers, wildcards, stats):
+        """
+        处理事件，同时记录排队时间和各处理函数的执行时间，
+        handlers为处理函数字典，wildcards为通配符监听的前缀树
+        """
+        # 统计开启前就已经存入队列的事件没有推送时间
+        if event.time_ is not None:
+            stats.recordWait(event.type_, timer() - event.time_)
+
+        handler_tuple = handlers.handlers.get(event.type_, ())
+        if event.key_:
+            handler_tuple += handlers.routedHandlers.get(event.type_, {}).get(event.key_, ())
+        if wildcards.count:
+            handler_tuple += wildcards.match(getTopic(event))
+
+        # 带后缀的事件类型按照前缀统计，避免每个合约单独生成一组数据
+        prefix = getTypePrefix(event.type_)
+        for handler in handler_tuple:
+            start = timer()
+            handler(event)
+            stats.recordHandler(prefix, handler, timer() - start)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __collectBatch(event, batch_handlers, batch_dict):
+        """将事件按照批量处理函数监听的事件类型（包括type_+key_）归类"""
+        type_ = event.type_
+        if type_ in batch_handlers.handlers:
             try:
-                event = self.__queue.get(block=True, timeout=1)  # 获取事件的阻塞时间设为1秒
-                self.__process(event)
-            except Empty:
-                pass
+                batch_dict[type_].append(event)
+            except KeyError:
+                batch_dict[type_] = [event]
+
+        if event.key_:
+            routed = batch_handlers.routedHandlers.get(type_)
+            if routed and event.key_ in routed:
+                batch_dict.setdefault(type_ + event.key_, []).append(event)
 
     # ----------------------------------------------------------------------
-    def __process(self, event):
-        """处理事件"""
-        # 检查是否存在对该事件进行监听的处理函数
-        if event.type_ in self.__handlers:
-            # 若存在，则按顺序将事件传递给处理函数执行
-            [handler(event) for handler in self.__handlers[event.type_]]
+    @staticmethod
+    def __processBatch(batch_dict, batch_handlers, stats):
+        """将归类后的事件列表推送给批量处理函数"""
+        for type_, event_list in batch_dict.items():
+            # 处理期间可能已被注销
+            handler_tuple = batch_handlers.handlers.get(type_)
+            if not handler_tuple:
+                continue
+
+            if stats is None:
+                for handler in handler_tuple:
+                    handler(event_list)
+            else:
+                prefix = getTypePrefix(type_)
+                for handler in handler_tuple:
+                    start = timer()
+                    handler(event_list)
+                    stats.recordHandler(prefix, handler, timer() - start)
 
-            # 以上语句为Python列表解析方式的写法，对应的常规循环写法为：
-            # for handler in self.__handlers[event.type_]:
-            # handler(event)
+    # ----------------------------------------------------------------------
+    def __putConflated(self, event, slot_dict, lane):
+        """向队列中存入合并模式的事件，调用时需持有对应线程的condition"""
+        # 按照路由键或者数据的vtSymbol进行合并，都没有的事件则按事件类型合并
+        key = event.key_ or getattr(event.dict_.get('data'), 'vtSymbol', None)
+
+        try:
+            slot = slot_dict[key]
+        except KeyError:
+            slot = ConflationSlot()
+            slot_dict[key] = slot
+
+        # 若该位置已经在队列中等待处理，则直接替换为新的事件，否则加入队列
+        if slot.event is None:
+            lane.append(slot)
+        slot.event = event
 
     # ----------------------------------------------------------------------
-    def __runTimer(self):
-        """运行在计时器线程中的循环函数"""
-        while self.__timerActive:
-            # 创建计时器事件
-            event = Event(type_=EVENT_TIMER)
+    def __putBounded(self, event, worker, lane, priority):
+        """
+        队列已满（或者有暂存在磁盘中的事件）时，按照事件类型的策略处理事件，
+        调用时需持有对应线程的condition，返回True说明事件还需要存入队列
+        """
+        type_ = event.type_
+        policy = self.__getPolicy(type_)
+
+        # 暂存到磁盘：已有暂存的事件时，新的事件也需要暂存，保证先进先出
+        if policy == POLICY_SPILL:
+            if worker.spill is None:
+                worker.spill = EventSpill()
+
+            try:
+                worker.spill.put(priority, event)
+            except (cPickle.PicklingError, TypeError):
+                # 无法序列化的事件只能直接存入队列
+                return True
+
+            worker.countPressure('spilled', type_)
+            return False
+
+        if not worker.isFull():
+            return True
+
+        # 阻塞推送线程，引擎的处理线程推送的事件不能阻塞，否则可能和其他处理线程相互等待而死锁
+        if policy == POLICY_BLOCK:
+            if current_thread() in self.__workerThreads:
+                return True
+
+            worker.countPressure('blocked', type_)
+            while self.__active and worker.isFull():
+                worker.notFull.wait()
+            return True
+
+        # 丢弃同一通道中最早的事件，通道为空时丢弃新的事件
+        if policy == POLICY_DROP_OLDEST:
+            if not lane:
+                worker.countPressure('dropped', type_)
+                return False
+
+            old = lane.popleft()
+            if old.__class__ is ConflationSlot:
+                slot = old
+                old = slot.event
+                slot.event = None
+            worker.countPressure('dropped', old.type_)
+            return True
+
+        # 按照路由键或者vtSymbol合并，只合并到仍是该合约在队列中最新事件的位置
+        if policy == POLICY_CONFLATE:
+            key = event.key_ or getattr(event.dict_.get('data'), 'vtSymbol', None)
+            slot_dict = self.__pressureSlots.setdefault(type_, {})
+
+            try:
+                slot = slot_dict[key]
+            except KeyError:
+                slot = ConflationSlot(conflated=False)
+                slot_dict[key] = slot
+
+            if slot.event is None:
+                lane.append(slot)
+            else:
+                worker.countPressure('conflated', type_)
+            slot.event = event
+            return False
+
+        return True
+
+    # ----------------------------------------------------------------------
+    def __getPriority(self, type_):
+        """获取事件类型对应的优先级"""
+        try:
+            return self.__priorityCache[type_]
+        except KeyError:
+            pass
+
+        priority = self.__priorityDict.get(type_)
+
+        # 对于带后缀的事件类型（如EVENT_TICK+vtSymbol），使用前缀的优先级设置
+        if priority is None:
+            priority = self.__priorityDict.get(getTypePrefix(type_), PRIORITY_NORMAL)
+
+        self.__priorityCache[type_] = priority
+        return priority
+
+    # ----------------------------------------------------------------------
+    def __getPolicy(self, type_):
+        """获取事件类型对应的队列已满处理策略"""
+        try:
+            return self.__policyCache[type_]
+        except KeyError:
+            pass
+
+        policy = self.__policyDict.get(type_)
+        if policy is None:
+            policy = self.__policyDict.get(getTypePrefix(type_), POLICY_BLOCK)
 
-            # 向队列中存入计时器事件
-            self.put(event)
+        self.__policyCache[type_] = policy
+        return policy
+
+    # ----------------------------------------------------------------------
+    def __runTimer(self):
+        """运行在计时器线程中的循环函数，定时推送计时器事件，同时驱动时间轮"""
+        wheel = self.__timerWheel
+        next_time = timer()  # 下次推送计时器事件的时间
 
-            # 等待
-            sleep(self.__timerSleep)
+        while self.__timerActive:
+            now = timer()
+
+            if now >= next_time:
+                # 创建计时器事件
+                event = Event(type_=EVENT_TIMER)
+
+                # 向队列中存入计时器事件
+                self.put(event)
+
+                # 统计开启时定期推送统计事件
+                if self.__stats is not None:
+                    self.__statsCount += 1
+                    if self.__statsCount >= self.__statsInterval:
+                        self.__statsCount = 0
+                        event = Event(type_=EVENT_ENGINE_STATS)
+                        event.dict_['data'] = self.getStats()
+                        self.put(event)
+
+                # 如果落后太多（如系统休眠后），则从当前时间重新计时
+                next_time += self.__timerSleep
+                if next_time < now:
+                    next_time = now + self.__timerSleep
+
+            # 时间轮前进到当前时间，取出到期的任务
+            task_list = []
+            with self.__timerCondition:
+                current_tick = int((now - self.__timerStart) / self.__timerTick)
+                while wheel.currentTick < current_tick:
+                    wheel.skip(current_tick)
+                    for task in wheel.advance():
+                        task_list.append(task)
+                        if task.repeat:
+                            wheel.add(task, task.expire + task.interval)
+
+                # 没有到期任务时，等待到下一个需要处理的刻度或者下次推送计时器事件的时间，
+                # 时间轮中没有任务时只等待计时器事件，期间有新的任务添加时会被唤醒
+                # 注意Python 2中带超时的Condition.wait内部是轮询（每次休眠最多50毫秒），
+                # 因此计时器线程在等待期间每秒仍会被唤醒约20次，处理线程的等待不带超时，没有这个问题
+                if not task_list and self.__timerActive:
+                    wake_time = next_time
+                    if wheel.count:
+                        wake_time = min(wake_time, self.__timerStart +
+                                        (wheel.currentTick + wheel.getWaitTicks()) * self.__timerTick)
+                    timeout = wake_time - timer()
+                    if timeout > 0:
+                        self.__timerCondition.wait(timeout)
+
+            # 到期的任务存入队列，由事件处理线程执行
+            for task in task_list:
+                event = Event(type_=EVENT_TIMER_TASK)
+                event.dict_['data'] = task
+                self.put(event)
 
     # ----------------------------------------------------------------------
     def start(self):
         """引擎启动"""
         # 将引擎设为启动
         self.__active = True
+        for ring in self.__rings:
+            ring.active = True
 
         # 启动事件处理线程
-        self.__thread.start()
+        for worker in self.__workers:
+            worker.active = True
+            worker.thread.start()
 
         # 启动计时器，计时器事件间隔默认设定为1秒
         self.__timerActive = True
         self.__timer.start()
 
     # ----------------------------------------------------------------------
-    def stop(self):
-        """停止引擎"""
+    def stop(self, drain=False):
+        """停止引擎，drain为True时先处理完队列中等待的事件再退出"""
+        # 停止计时器，不再产生新的计时器事件
+        with self.__timerCondition:
+            self.__timerActive = False
+            self.__timerCondition.notify()
+        if self.__timer.is_alive():
+            self.__timer.join()
+
+        # 分片线程中的处理函数可能向全局线程推送事件（如日志），因此最后停止全局线程
+        if drain:
+            self.__stopWorkers(self.__shardWorkers, True)
+            self.__stopWorkers([self.__globalWorker], True)
+
         # 将引擎设为停止
         self.__active = False
+        for ring in self.__rings:
+            ring.active = False
 
-        # 停止计时器
-        self.__timerActive = False
-        self.__timer.join()
+        self.__stopWorkers(self.__workers, False)
 
-        # 等待事件处理线程退出
-        self.__thread.join()
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __stopWorkers(workers, drain):
+        """通知处理线程停止，同时唤醒被有界队列阻塞的推送线程，并等待处理线程退出"""
+        for worker in workers:
+            with worker.condition:
+                worker.active = False
+                worker.drain = drain
+                worker.condition.notify()
+                worker.notFull.notify_all()
+
+        for worker in workers:
+            if worker.thread.is_alive():
+                worker.thread.join()
 
     # ----------------------------------------------------------------------
-    def register(self, type_, handler):
-        """注册事件处理函数监听"""
-        # 尝试获取该事件类型对应的处理函数列表，若无则创建
-        try:
-            handler_list = self.__handlers[type_]
-        except KeyError:
-            handler_list = []
-            self.__handlers[type_] = handler_list
+    def register(self, type_, handler, conflate=False):
+        """
+        注册事件处理函数监听，conflate为True时该处理函数工作在合并模式，
+        type_以WILDCARD结尾时监听所有以该前缀开头的事件
+        """
+        with self.__registerLock:
+            if type_.endswith(WILDCARD):
+                wildcards = self.__conflatedWildcards if conflate else self.__wildcards
+                wildcards.add(type_[:-1], handler)
+            else:
+                handlers = self.__conflatedHandlers if conflate else self.__handlers
+                handlers.add(type_, handler)
+
+            # 合并模式需要创建该事件类型的合并位置字典
+            if conflate:
+                self.__updateConflationSlots()
 
-        # 若要注册的处理器不在该事件的处理器列表中，则注册该事件
-        if handler not in handler_list:
-            handler_list.append(handler)
+    # ----------------------------------------------------------------------
+    def registerBatch(self, type_, handler):
+        """
+        注册批量处理函数，handler接收的参数为事件列表，在每批事件处理完之后调用，
+        不支持通配符，注销时使用deregister
+        """
+        if type_.endswith(WILDCARD):
+            raise ValueError(u'批量处理函数不支持通配符：%s' % type_)
+
+        with self.__registerLock:
+            self.__batchHandlers.add(type_, handler)
 
     # ----------------------------------------------------------------------
     def deregister(self, type_, handler):
-        """注销事件处理函数监听"""
-        # 尝试获取该事件类型对应的处理函数列表，若无则忽略该次注销请求
-        try:
-            handler_list = self.__handlers[type_]
+        """注销事件处理函数监听（包括合并模式和批量处理的处理函数）"""
+        with self.__registerLock:
+            if type_.endswith(WILDCARD):
+                self.__wildcards.remove(type_[:-1], handler)
+                self.__conflatedWildcards.remove(type_[:-1], handler)
+            else:
+                self.__handlers.remove(type_, handler)
+                self.__conflatedHandlers.remove(type_, handler)
+                self.__batchHandlers.remove(type_, handler)
+
+            # 合并模式的处理函数已全部注销，则不再需要合并位置
+            self.__updateConflationSlots()
 
-            # 如果该函数存在于列表中，则移除
-            if handler in handler_list:
-                handler_list.remove(handler)
+    # ----------------------------------------------------------------------
+    def __updateConflationSlots(self):
+        """
+        更新需要合并的事件类型，监听EVENT_TICK+vtSymbol时EVENT_TICK带路由键的事件也需要合并，
+        调用时需持有注册锁
+        """
+        slots = {}
+        for type_ in self.__conflatedHandlers.handlers.keys() + self.__conflatedWildcards.getPrefixes():
+            for t in (type_, getTypePrefix(type_)):
+                slots[t] = self.__conflationSlots.get(t, {})
+        self.__conflationSlots = slots
 
-            # 如果函数列表为空，则从引擎中移除该事件类型
-            if not handler_list:
-                del self.__handlers[type_]
-        except KeyError:
-            pass
+    # ----------------------------------------------------------------------
+    def setPriority(self, type_, priority):
+        """设置事件类型的优先级，type_可以是EVENT_TICK这样的前缀，也可以是带后缀的具体类型"""
+        self.__priorityDict[type_] = priority
+        self.__priorityCache = {}
+
+    # ----------------------------------------------------------------------
+    def setPolicy(self, type_, policy):
+        """设置事件类型在有界队列已满时的处理策略，type_可以是前缀，也可以是带后缀的具体类型"""
+        self.__policyDict[type_] = policy
+        self.__policyCache = {}
+
+    # ----------------------------------------------------------------------
+    def getPressureCount(self):
+        """
+        获取有界队列已满时各策略的处理次数，格式为
+        {'dropped': {事件类型: 次数}, 'conflated': {...}, 'spilled': {...}, 'blocked': {...}}
+        """
+        d = {'dropped': {}, 'conflated': {}, 'spilled': {}, 'blocked': {}}
+        for worker in self.__workers:
+            with worker.condition:
+                for name, count_dict in worker.pressureCount.items():
+                    for type_, count in count_dict.items():
+                        d[name][type_] = d[name].get(type_, 0) + count
+        return d
+
+    # ----------------------------------------------------------------------
+    def setJournal(self, journal):
+        """设置事件日志，为None时停止记录"""
+        self.__journal = journal
+
+    # ----------------------------------------------------------------------
+    def createRing(self, size=DEFAULT_RING_SIZE):
+        """
+        创建事件环形缓冲区，返回EventRing对象，只能在同一个线程中调用其put函数
+        （如gateway的行情回调线程）
+        """
+        worker = self.__globalWorker
+        ring = EventRing(worker, size)
+        ring.active = self.__active
+
+        with worker.condition:
+            self.__rings = self.__rings + [ring]
+            worker.rings = tuple(self.__rings)
+
+        return ring
+
+    # ----------------------------------------------------------------------
+    def getQueueSize(self):
+        """获取各优先级通道中等待处理的事件数量（列表，包括所有处理线程）"""
+        return [sum(n) for n in zip(*[worker.size() for worker in self.__workers])]
+
+    # ----------------------------------------------------------------------
+    def addTimer(self, interval, callback, repeat=False):
+        """
+        添加定时任务，interval为时间间隔（毫秒），repeat为True时重复执行
+        callback和事件处理函数一样接收一个event对象，在事件处理线程中调用
+        返回TimerTask对象，可用于cancelTimer取消
+        """
+        ticks = max(int(round(interval / 1000.0 / self.__timerTick)), 1)
+        task = TimerTask(callback, ticks, repeat)
+
+        with self.__timerCondition:
+            current_tick = int((timer() - self.__timerStart) / self.__timerTick)
+            self.__timerWheel.add(task, current_tick + ticks)
+            self.__timerCondition.notify()
+
+        return task
+
+    # ----------------------------------------------------------------------
+    def cancelTimer(self, task):
+        """取消定时任务"""
+        with self.__timerCondition:
+            task.active = False
+            self.__timerWheel.remove(task)
+
+    # ----------------------------------------------------------------------
+    def __processTimerTask(self, event):
+        """在事件处理线程中执行定时任务"""
+        task = event.dict_['data']
+        if not task.active:
+            return
+
+        if not task.repeat:
+            task.active = False
+        task.callback(event)
+
+    # ----------------------------------------------------------------------
+    def setStatsEnabled(self, enabled, interval=10):
+        """
+        开启或关闭性能统计，interval为推送EVENT_ENGINE_STATS事件的间隔（秒）
+        每次开启时都会清空之前的统计数据
+        """
+        self.__statsInterval = interval
+        self.__statsCount = 0
+
+        if enabled:
+            self.__stats = EventStats(len(self.__globalWorker.lanes))
+        else:
+            self.__stats = None
+
+    # ----------------------------------------------------------------------
+    def getStats(self):
+        """获取性能统计数据（字典），统计关闭时返回None"""
+        stats = self.__stats
+        if stats is None:
+            return None
+
+        d = stats.getSnapshot()
+        d['queueSize'] = self.getQueueSize()
+        d['pressure'] = self.getPressureCount()
+        return d
 
     # ----------------------------------------------------------------------
     def put(self, event):
         """向事件队列中存入事件"""
-        self.__queue.put(event)
+        journal = self.__journal
+        if journal is not None:
+            journal.write(event)
+
+        worker = self.__getWorker(event)
+
+        stats = self.__stats
+        if stats is not None:
+            event.time_ = timer()
+
+        with worker.condition:
+            self.__enqueue(event, worker, stats)
+            worker.condition.notify()
+
+    # ----------------------------------------------------------------------
+    def __putBatch(self, event_list):
+        """批量存入事件，每个处理线程只加锁和唤醒一次"""
+        journal = self.__journal
+        stats = self.__stats
+        now = timer() if stats is not None else None
+
+        # 按照处理线程分组
+        if self.__shardCount:
+            worker_dict = {}
+            for event in event_list:
+                worker_dict.setdefault(self.__getWorker(event), []).append(event)
+        else:
+            worker_dict = {self.__globalWorker: event_list}
+
+        for worker, events in worker_dict.items():
+            with worker.condition:
+                for event in events:
+                    if journal is not None:
+                        journal.write(event)
+                    event.time_ = now
+                    self.__enqueue(event, worker, stats)
+                worker.condition.notify()
+
+    # ----------------------------------------------------------------------
+    def __enqueue(self, event, worker, stats):
+        """将事件存入处理线程的队列，调用时需持有对应线程的condition"""
+        type_ = event.type_
+        priority = self.__getPriority(type_)
+        lane = worker.lanes[priority]
+        slot_dict = self.__conflationSlots.get(type_)
+
+        # 只有合并模式处理函数的事件类型，无需再按普通方式入队
+        if slot_dict is not None:
+            self.__putConflated(event, slot_dict, lane)
+            append = (self.__handlers.contains(type_, event.key_) or
+                      self.__batchHandlers.contains(type_, event.key_) or
+                      (self.__wildcards.count and self.__wildcards.match(getTopic(event))))
+        else:
+            append = True
+
+        # 有界队列已满时按照策略处理
+        if append and self.__maxQueueSize and (worker.spill or worker.isFull()):
+            append = self.__putBounded(event, worker, lane, priority)
+
+        if append:
+            lane.append(event)
+
+            # 普通方式入队的事件排在合并位置之后，该位置不再是同一合约最新的事件，
+            # 需要废弃，否则之后合并进去的事件会被先于本事件处理而导致乱序
+            pressure_slots = self.__pressureSlots.get(type_)
+            if pressure_slots:
+                key = event.key_ or getattr(event.dict_.get('data'), 'vtSymbol', None)
+                pressure_slots.pop(key, None)
+
+        if stats is not None:
+            stats.recordQueueSize(priority, len(lane))
+
+
+########################################################################
+class EventWorker(object):
+    """事件处理线程及其按优先级划分的事件队列"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, target, max_size=0):
+        """Constructor"""
+        # 事件队列，每个优先级对应一条通道，列表索引即为优先级
+        self.lanes = [deque() for _ in range(PRIORITY_LOW + 1)]
+
+        lock = Lock()
+        self.condition = Condition(lock)  # 用于通道的线程同步以及唤醒处理线程
+        self.notFull = Condition(lock)  # 用于唤醒被有界队列阻塞的推送线程
+
+        # 有界队列相关
+        self.maxSize = max_size  # 队列长度上限，为0时不限制
+        self.spill = None  # 暂存到磁盘的事件，需要时创建
+        self.pressureCount = {'dropped': {}, 'conflated': {}, 'spilled': {}, 'blocked': {}}
+
+        # 由本线程读取的事件环形缓冲区，以及本线程是否正在等待（环形缓冲区据此判断是否需要唤醒）
+        self.rings = ()
+        self.waiting = False
+
+        # 线程是否在运行，以及停止时是否需要先处理完队列中的事件
+        self.active = False
+        self.drain = False
+
+        # 事件处理线程，target为引擎的处理函数，传入本对象作为参数
+        self.thread = Thread(target=target, args=(self,))
+
+    # ----------------------------------------------------------------------
+    def getBatch(self, n):
+        """
+        按照优先级从通道中取出最多n个事件（列表），若无事件则阻塞等待，直到存入事件或者停止，
+        环形缓冲区中有待读取的事件或者已经停止时返回空列表
+        """
+        with self.condition:
+            event_list = self.popBatch(n)
+            if not event_list and self.active:
+                # 先设置等待标志再检查环形缓冲区，保证推送线程要么看到等待标志，要么事件已被看到
+                self.waiting = True
+                if not self.hasRingData():
+                    # 不设超时，Python 2中带超时的等待实际上是轮询
+                    self.condition.wait()
+                self.waiting = False
+                event_list = self.popBatch(n)
+
+        return event_list
+
+    # ----------------------------------------------------------------------
+    def hasRingData(self):
+        """环形缓冲区中是否有待读取的事件"""
+        for ring in self.rings:
+            if ring.head != ring.tail:
+                return True
+        return False
+
+    # ----------------------------------------------------------------------
+    def popBatch(self, n):
+        """
+        按照优先级从通道中取出最多n个事件（列表），调用时需持有condition
+        合并模式的位置在这里读取其中最新的事件，合并模式处理函数的事件包装为(event,)元组
+        """
+        event_list = []
+        for lane in self.lanes:
+            while lane and len(event_list) < n:
+                event = lane.popleft()
+
+                if event.__class__ is ConflationSlot:
+                    slot = event
+                    event = slot.event
+                    slot.event = None
+
+                    # 队列已满时合并的事件依然交给普通的处理函数
+                    if slot.conflated:
+                        event = (event,)
+
+                event_list.append(event)
+
+        # 有界队列空出了位置，读回暂存的事件并唤醒被阻塞的推送线程
+        if event_list and self.maxSize:
+            if self.spill:
+                self.loadSpill()
+            self.notFull.notify_all()
+
+        return event_list
+
+    # ----------------------------------------------------------------------
+    def loadSpill(self):
+        """队列长度低于上限的一半时，将暂存在磁盘中的事件读回队列，调用时需持有condition"""
+        # 上限为1时一半为0，至少读回一个事件，否则暂存的事件永远不会被处理
+        n = max(self.maxSize // 2, 1) - sum(self.size())
+        while n > 0 and self.spill:
+            priority, event = self.spill.get()
+            self.lanes[priority].append(event)
+            n -= 1
+
+    # ----------------------------------------------------------------------
+    def isFull(self):
+        """队列是否已满"""
+        return sum(self.size()) >= self.maxSize
+
+    # ----------------------------------------------------------------------
+    def countPressure(self, name, type_):
+        """记录有界队列已满时的处理次数，调用时需持有condition"""
+        count_dict = self.pressureCount[name]
+        count_dict[type_] = count_dict.get(type_, 0) + 1
+
+    # ----------------------------------------------------------------------
+    def size(self):
+        """获取各优先级通道中等待处理的事件数量（列表）"""
+        return [len(lane) for lane in self.lanes]
+
+
+########################################################################
+class EventRing(object):
+    """
+    单生产者单消费者的事件环形缓冲区
+
+    槽位列表预先分配，head和tail分别为已写入和已读取的事件数量，只由推送线程和处理线程
+    各自修改，依靠GIL保证单个赋值的原子性，因此存取事件都不需要加锁。
+    推送线程只有在处理线程正在等待时才需要获取锁唤醒它，避免了每个事件一次的锁和唤醒开销。
+    缓冲区已满时推送线程等待处理线程读取（引擎停止时则丢弃事件），fullCount记录等待的次数。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, worker, size=DEFAULT_RING_SIZE):
+        """Constructor"""
+        n = 1
+        while n < size:
+            n <<= 1
+
+        self.slots = [None] * n
+        self.mask = n - 1
+        self.head = 0
+        self.tail = 0
+
+        self.worker = worker  # 读取本缓冲区的处理线程
+        self.active = False  # 引擎是否在运行
+        self.fullCount = 0
+        self.dropCount = 0
+
+    # ----------------------------------------------------------------------
+    def put(self, event):
+        """存入事件，只能在同一个推送线程中调用"""
+        head = self.head
+        while head - self.tail > self.mask:
+            if not self.active:
+                self.dropCount += 1
+                return
+            self.fullCount += 1
+            time.sleep(RING_FULL_SLEEP)
+
+        self.slots[head & self.mask] = event
+        self.head = head + 1
+
+        # 处理线程正在等待时才需要唤醒
+        worker = self.worker
+        if worker.waiting:
+            with worker.condition:
+                worker.condition.notify()
+
+    # ----------------------------------------------------------------------
+    def drain(self):
+        """读出所有待读取的事件（列表），只能在处理线程中调用"""
+        slots = self.slots
+        mask = self.mask
+        tail = self.tail
+        head = self.head
+
+        event_list = []
+        while tail != head:
+            index = tail & mask
+            event_list.append(slots[index])
+            slots[index] = None
+            tail += 1
+
+        self.tail = tail
+        return event_list
+
+    # ----------------------------------------------------------------------
+    def __len__(self):
+        """待读取的事件数量"""
+        return self.head - self.tail
+
+
+########################################################################
+class ConflationSlot(object):
+    """
+    合并模式下在队列中等待处理的位置，event总是保存最新的事件
+
+    conflated为True时由合并模式的处理函数处理，为False时说明是有界队列已满时
+    按POLICY_CONFLATE策略合并的事件，由普通的处理函数处理
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, conflated=True):
+        """Constructor"""
+        self.event = None  # 最新的事件，为None时说明该位置不在队列中
+        self.conflated = conflated
+
+
+########################################################################
+class EventSpill(object):
+    """
+    有界队列已满时暂存事件的磁盘文件，先进先出
+
+    事件以pickle格式追加写入临时文件，读取完所有事件后清空文件
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.file = tempfile.TemporaryFile()
+        self.readPos = 0  # 下一个读取位置
+        self.count = 0  # 暂存的事件数量
+
+    # ----------------------------------------------------------------------
+    def __len__(self):
+        """暂存的事件数量"""
+        return self.count
+
+    # ----------------------------------------------------------------------
+    def put(self, priority, event):
+        """写入事件"""
+        data = cPickle.dumps((priority, event), cPickle.HIGHEST_PROTOCOL)
+        self.file.seek(0, 2)
+        self.file.write(data)
+        self.count += 1
+
+    # ----------------------------------------------------------------------
+    def get(self):
+        """读取最早的事件，返回(priority, event)"""
+        self.file.seek(self.readPos)
+        d = cPickle.load(self.file)
+        self.readPos = self.file.tell()
+        self.count -= 1
+
+        # 已经全部读取，清空文件
+        if not self.count:
+            self.file.seek(0)
+            self.file.truncate()
+            self.readPos = 0
+
+        return d
+
+
+########################################################################
+class HandlerTable(object):
+    """
+    处理函数表
+
+    每个事件类型对应一个处理函数元组，注册和注销时创建新的元组替换（写时复制），
+    分发事件的线程读取到的总是完整的元组，无需加锁。add和remove需要由调用者加锁。
+
+    对于带后缀的事件类型（如EVENT_TICK+vtSymbol），同时按照前缀和后缀保存在routedHandlers中，
+    分发带路由键的事件时直接用event.type_和event.key_查询，无需拼接字符串。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.handlers = {}  # key为事件类型，value为处理函数元组
+        self.routedHandlers = {}  # key为事件类型前缀，value为{后缀: 处理函数元组}字典
+
+    # ----------------------------------------------------------------------
+    def add(self, type_, handler):
+        """添加处理函数"""
+        handler_tuple = self.handlers.get(type_, ())
+        if handler not in handler_tuple:
+            self.__set(type_, handler_tuple + (handler,))
+
+    # ----------------------------------------------------------------------
+    def remove(self, type_, handler):
+        """移除处理函数"""
+        handler_tuple = self.handlers.get(type_, ())
+        if handler in handler_tuple:
+            self.__set(type_, tuple([h for h in handler_tuple if h != handler]))
+
+    # ----------------------------------------------------------------------
+    def contains(self, type_, key_=None):
+        """是否有处理函数监听该事件类型（以及type_+key_）"""
+        if type_ in self.handlers:
+            return True
+        return bool(key_ and key_ in self.routedHandlers.get(type_, ()))
+
+    # ----------------------------------------------------------------------
+    def __set(self, type_, handler_tuple):
+        """替换事件类型对应的处理函数元组，为空时移除该事件类型"""
+        if handler_tuple:
+            self.handlers[type_] = handler_tuple
+        else:
+            self.handlers.pop(type_, None)
+
+        prefix = getTypePrefix(type_)
+        if prefix == type_:
+            return
+
+        # 路由字典同样先复制再替换
+        suffix = type_[len(prefix):]
+        routed = dict(self.routedHandlers.get(prefix, {}))
+        if handler_tuple:
+            routed[suffix] = handler_tuple
+        else:
+            routed.pop(suffix, None)
+
+        if routed:
+            self.routedHandlers[prefix] = routed
+        else:
+            self.routedHandlers.pop(prefix, None)
+
+
+########################################################################
+class TopicTrie(object):
+    """
+    通配符监听使用的前缀树
+
+    每个节点是一个字典，key为下一个字符，处理函数元组保存在key为None的位置。
+    match的结果按具体的事件类型缓存，注册和注销时替换为新的缓存字典，因此分发时只需一次字典查询。
+    add和remove需要由调用者加锁，match无需加锁。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.root = {}  # 根节点
+        self.count = 0  # 处理函数数量，为0时无需匹配
+        self.cache = {}  # 匹配结果缓存，key为具体的事件类型，value为处理函数元组
+
+    # ----------------------------------------------------------------------
+    def add(self, prefix, handler):
+        """添加监听prefix开头的事件的处理函数"""
+        node = self.root
+        for c in prefix:
+            node = node.setdefault(c, {})
+
+        handler_tuple = node.get(None, ())
+        if handler not in handler_tuple:
+            node[None] = handler_tuple + (handler,)
+            self.count += 1
+            self.cache = {}
+
+    # ----------------------------------------------------------------------
+    def remove(self, prefix, handler):
+        """移除处理函数"""
+        node = self.root
+        for c in prefix:
+            node = node.get(c)
+            if node is None:
+                return
+
+        handler_tuple = node.get(None, ())
+        if handler in handler_tuple:
+            handler_tuple = tuple([h for h in handler_tuple if h != handler])
+            if handler_tuple:
+                node[None] = handler_tuple
+            else:
+                del node[None]
+            self.count -= 1
+            self.cache = {}
+
+    # ----------------------------------------------------------------------
+    def match(self, topic):
+        """获取匹配该事件类型的所有处理函数（元组），前缀较短的在前"""
+        # 先取得缓存字典再遍历，遍历期间注册或注销替换了缓存时，过期的结果只会写入旧的缓存
+        cache = self.cache
+        try:
+            return cache[topic]
+        except KeyError:
+            pass
+
+        result = ()
+        node = self.root
+        for c in topic:
+            result += node.get(None, ())
+            node = node.get(c)
+            if node is None:
+                break
+        else:
+            result += node.get(None, ())
+
+        cache[topic] = result
+        return result
+
+    # ----------------------------------------------------------------------
+    def getPrefixes(self):
+        """获取所有注册了处理函数的前缀（列表）"""
+        prefixes = []
+        stack = [('', self.root)]
+        while stack:
+            prefix, node = stack.pop()
+            for c, child in node.items():
+                if c is None:
+                    prefixes.append(prefix)
+                else:
+                    stack.append((prefix + c, child))
+        return prefixes
+
+
+########################################################################
+class LatencyHistogram(object):
+    """
+    耗时分布直方图，以微秒为单位按2的幂次划分区间，
+    第n个区间保存耗时小于2^n微秒（且不小于2^(n-1)微秒）的次数
+    """
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.count = 0  # 次数
+        self.total = 0.0  # 总耗时（秒）
+        self.max = 0.0  # 最大耗时（秒）
+        self.buckets = [0] * 64  # 各区间的次数
+
+    # ----------------------------------------------------------------------
+    def record(self, seconds):
+        """记录一次耗时"""
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[int(seconds * 1000000).bit_length()] += 1
+
+    # ----------------------------------------------------------------------
+    def percentile(self, p):
+        """获取百分位数（微秒），返回所在区间的上限（不超过最大耗时）"""
+        target = self.count * p / 100.0
+        n = 0
+        for i, c in enumerate(self.buckets):
+            n += c
+            if c and n >= target:
+                return min(1 << i, self.max * 1000000)
+        return 0
+
+    # ----------------------------------------------------------------------
+    def getSummary(self):
+        """获取统计摘要（字典），耗时单位为微秒"""
+        if not self.count:
+            return {'count': 0, 'mean': 0, 'p50': 0, 'p99': 0, 'max': 0}
+
+        return {
+            'count': self.count,
+            'mean': self.total / self.count * 1000000,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max * 1000000
+        }
+
+
+########################################################################
+class EventStats(object):
+    """事件引擎的性能统计数据"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, lane_count):
+        """Constructor"""
+        self.lock = Lock()  # 分片模式下会有多个处理线程同时记录
+
+        self.waitDict = {}  # 排队时间，key为事件类型，value为LatencyHistogram
+        self.handlerDict = {}  # 处理函数执行时间，key为(事件类型, 处理函数)，value为LatencyHistogram
+        self.highWater = [0] * lane_count  # 各优先级通道长度的最大值
+
+    # ----------------------------------------------------------------------
+    def recordWait(self, type_, seconds):
+        """记录事件的排队时间"""
+        with self.lock:
+            try:
+                histogram = self.waitDict[type_]
+            except KeyError:
+                histogram = LatencyHistogram()
+                self.waitDict[type_] = histogram
+            histogram.record(seconds)
+
+    # ----------------------------------------------------------------------
+    def recordHandler(self, type_, handler, seconds):
+        """记录处理函数的执行时间"""
+        key = (type_, handler)
+        with self.lock:
+            try:
+                histogram = self.handlerDict[key]
+            except KeyError:
+                histogram = LatencyHistogram()
+                self.handlerDict[key] = histogram
+            histogram.record(seconds)
+
+    # ----------------------------------------------------------------------
+    def recordQueueSize(self, priority, size):
+        """记录通道的长度，调用时已持有对应线程的condition"""
+        if size > self.highWater[priority]:
+            self.highWater[priority] = size
+
+    # ----------------------------------------------------------------------
+    def getSnapshot(self):
+        """
+        获取统计数据的快照，格式为
+        {'highWater': [各通道长度最大值],
+         'wait': {事件类型: 摘要},
+         'handler': {事件类型: {处理函数名称: 摘要}}}
+        """
+        with self.lock:
+            d = {
+                'highWater': list(self.highWater),
+                'wait': dict((type_, h.getSummary()) for type_, h in self.waitDict.items()),
+                'handler': {}
+            }
+
+            for (type_, handler), histogram in self.handlerDict.items():
+                handler_dict = d['handler'].setdefault(type_, {})
+
+                # 同名的处理函数（如同一个类的多个实例）加上序号区分
+                name = getHandlerName(handler)
+                n = 1
+                while name in handler_dict:
+                    n += 1
+                    name = '%s#%d' % (getHandlerName(handler), n)
+
+                handler_dict[name] = histogram.getSummary()
+
+        return d
 
 
 ########################################################################
 class Event(object):
-    """事件对象"""
+    """
+    事件对象
+
+    key_为路由键（如vtSymbol），设置后引擎会将该事件同时推送给监听type_和
+    type_+key_的处理函数，因此无需再为特定合约额外创建一个事件。
+    time_为存入队列的时间，只在事件引擎开启性能统计时记录。
+    """
+    __slots__ = ('type_', 'key_', 'dict_', 'time_')
 
     # ----------------------------------------------------------------------
-    def __init__(self, type_=None):
+    def __init__(self, type_=None, key_=None):
         """Constructor"""
         self.type_ = type_  # 事件类型
+        self.key_ = key_  # 路由键
         self.dict_ = {}  # 字典用于保存具体的事件数据
+        self.time_ = None  # 存入队列的时间
+
+
+# ----------------------------------------------------------------------
+def getTypePrefix(type_):
+    """获取带后缀事件类型的前缀，如EVENT_TICK+vtSymbol返回EVENT_TICK，不带后缀的返回自身"""
+    n = type_.find('.')
+    if n >= 0:
+        return type_[:n + 1]
+    return type_
+
+
+# ----------------------------------------------------------------------
+def getTopic(event):
+    """获取通配符监听匹配的对象，带有路由键的事件为type_+key_"""
+    if event.key_:
+        return event.type_ + event.key_
+    return event.type_
+
+
+# ----------------------------------------------------------------------
+def getHandlerName(handler):
+    """获取处理函数的名称，对象方法返回类名.方法名"""
+    name = getattr(handler, '__name__', None) or repr(handler)
+    obj = getattr(handler, '__self__', None)
+    if obj is not None:
+        name = '.'.join([obj.__class__.__name__, name])
+    return name
 
 
 if __name__ == '__main__':
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是事件日志的记录和回放功能。
+
+EventJournal以追加写入的方式，将经过事件引擎的事件（默认为tick、委托、成交、持仓、
+资金、合约）连同存入队列的时间记录到二进制文件中；EventReplayer通过内存映射读取该
+文件，按照记录时的节奏（或者指定的倍速、或者尽可能快）将事件重新推送到事件引擎中，
+从而可以在没有交易接口连接的情况下复现实盘中的问题，或者对各个功能引擎进行压力测试。
+
+文件格式：
+文件头为JOURNAL_MAGIC，之后是连续的记录，每条记录由RECORD_HEADER（时间戳、数据长度）
+以及pickle序列化的(type_, key_, dict_)组成。程序异常退出时最后一条记录可能不完整，
+回放时会忽略。
+"""
+
+import cPickle
+import mmap
+import os
+import struct
+from threading import Thread, Lock
+from time import time, sleep
+
+from eventEngine import Event, getTypePrefix
+from eventType import *
+
+JOURNAL_MAGIC = 'VTEJ0001'  # 文件头
+RECORD_HEADER = struct.Struct('<dI')  # 记录头：时间戳（秒）、数据长度
+
+# 默认记录的事件类型
+DEFAULT_JOURNAL_TYPES = (EVENT_TICK, EVENT_ORDER, EVENT_TRADE, EVENT_POSITION,
+                         EVENT_ACCOUNT, EVENT_CONTRACT)
+
+
+########################################################################
+class EventJournal(object):
+    """
+    事件日志记录
+
+    通过EventEngine2.setJournal设置后，引擎在put时调用write记录事件，
+    可能被多个推送线程同时调用，因此写入时需要加锁。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name, type_list=DEFAULT_JOURNAL_TYPES):
+        """Constructor，type_list为需要记录的事件类型（前缀），为None时记录所有事件"""
+        self.fileName = file_name
+        self.typeSet = set(type_list) if type_list is not None else None
+
+        self.lock = Lock()
+        self.count = 0  # 本次记录的事件数量
+
+        # 已存在的文件需要检查文件头，之后继续追加
+        new_file = not os.path.exists(file_name) or not os.path.getsize(file_name)
+        if not new_file:
+            with open(file_name, 'rb') as f:
+                if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+                    raise ValueError(u'不是有效的事件日志文件：%s' % file_name)
+
+        self.file = open(file_name, 'ab')
+        if new_file:
+            self.file.write(JOURNAL_MAGIC)
+
+    # ----------------------------------------------------------------------
+    def write(self, event):
+        """记录事件，无法序列化的事件会被忽略"""
+        if self.typeSet is not None and getTypePrefix(event.type_) not in self.typeSet:
+            return
+
+        try:
+            data = cPickle.dumps((event.type_, event.key_, event.dict_), cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError):
+            return
+
+        header = RECORD_HEADER.pack(time(), len(data))
+
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(header)
+            self.file.write(data)
+            self.count += 1
+
+    # ----------------------------------------------------------------------
+    def flush(self):
+        """将缓存的数据写入硬盘"""
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """关闭文件"""
+        with self.lock:
+            self.file.close()
+
+
+########################################################################
+class EventReplayer(object):
+    """
+    事件日志回放
+
+    speed为回放速度：1为按照记录时的节奏，N为N倍速，0为尽可能快地推送。
+    replay在当前线程中回放，start则在单独的线程中回放，可以通过stop中止。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name, event_engine):
+        """Constructor"""
+        self.fileName = file_name
+        self.eventEngine = event_engine
+
+        self.active = False  # 回放状态
+        self.count = 0  # 已回放的事件数量
+        self.thread = None
+
+    # ----------------------------------------------------------------------
+    def readEvents(self):
+        """按顺序读取日志中的事件，生成(时间戳, 事件)"""
+        with open(self.fileName, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(JOURNAL_MAGIC):
+                return
+
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if mm[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+                    raise ValueError(u'不是有效的事件日志文件：%s' % self.fileName)
+
+                pos = len(JOURNAL_MAGIC)
+                while pos + RECORD_HEADER.size <= size:
+                    timestamp, length = RECORD_HEADER.unpack_from(mm, pos)
+                    pos += RECORD_HEADER.size
+
+                    # 不完整的记录
+                    if pos + length > size:
+                        break
+
+                    type_, key_, dict_ = cPickle.loads(mm[pos:pos + length])
+                    pos += length
+
+                    event = Event(type_=type_, key_=key_)
+                    event.dict_ = dict_
+                    yield timestamp, event
+            finally:
+                mm.close()
+
+    # ----------------------------------------------------------------------
+    def replay(self, speed=1):
+        """回放日志，返回回放的事件数量"""
+        self.active = True
+        self.count = 0
+
+        first_timestamp = None
+        start = time()
+
+        for timestamp, event in self.readEvents():
+            if not self.active:
+                break
+
+            # 按照记录时的节奏等待
+            if speed:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+
+                delay = start + (timestamp - first_timestamp) / speed - time()
+                if delay > 0:
+                    sleep(delay)
+
+            self.eventEngine.put(event)
+            self.count += 1
+
+        self.active = False
+        return self.count
+
+    # ----------------------------------------------------------------------
+    def start(self, speed=1):
+        """在单独的线程中开始回放"""
+        self.active = True
+        self.thread = Thread(target=self.replay, args=(speed,))
+        self.thread.start()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """中止回放"""
+        self.active = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
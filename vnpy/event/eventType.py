@@ -14,6 +14,8 @@
 # 系统相关
 EVENT_TIMER = 'eTimer'  # 计时器事件，每隔1秒发送一次
 EVENT_LOG = 'eLog'  # 日志事件，全局通用
+EVENT_ENGINE_STATS = 'eEngineStats'  # 事件引擎性能统计事件，开启统计后定期发送
+EVENT_TIMER_TASK = 'eTimerTask'  # 定时任务到期事件，由事件引擎内部处理
 
 # Gateway相关
 EVENT_TICK = 'eTick.'  # TICK行情事件，可后接具体的vtSymbol
@@ -27,6 +29,7 @@ EVENT_ERROR = 'eError.'  # 错误回报事件
 # CTA模块相关
 EVENT_CTA_LOG = 'eCtaLog'  # CTA相关的日志事件
 EVENT_CTA_STRATEGY = 'eCtaStrategy.'  # CTA策略状态变化事件
+EVENT_CTA_REQUEST = 'eCtaRequest'  # CTA策略子进程发回主进程的请求事件
 
 # 行情记录模块相关
 EVENT_DATARECORDER_LOG = 'eDataRecorderLog'  # 行情记录日志更新事件
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是事件引擎使用的分层时间轮，用于以毫秒级的精度调度单次或者重复的定时任务。
+
+时间轮分为WHEEL_LEVELS层，每层有WHEEL_SLOTS个槽位：
+第0层的每个槽位对应一个刻度（tick），第1层的每个槽位对应WHEEL_SLOTS个刻度，以此类推。
+任务按照到期时间距离当前刻度的远近放入对应层的槽位中，每当低一层转完一圈时，
+高一层当前槽位中的任务会被重新分配到低层的槽位中，最终在第0层到期。
+
+每个槽位是一个集合，因此添加和取消任务的复杂度都是O(1)。
+时间轮本身不是线程安全的，由事件引擎负责加锁以及驱动刻度前进。
+"""
+
+WHEEL_BITS = 8  # 每层槽位数对应的二进制位数
+WHEEL_SLOTS = 1 << WHEEL_BITS  # 每层的槽位数
+WHEEL_MASK = WHEEL_SLOTS - 1
+WHEEL_LEVELS = 4  # 层数，1毫秒的刻度下可以覆盖约49天
+
+
+########################################################################
+class TimerTask(object):
+    """
+    定时任务
+
+    由事件引擎的addTimer创建并返回，可以传给cancelTimer取消。
+    """
+    __slots__ = ('callback', 'interval', 'repeat', 'active', 'expire', 'slot')
+
+    # ----------------------------------------------------------------------
+    def __init__(self, callback, interval, repeat):
+        """Constructor"""
+        self.callback = callback  # 回调函数
+        self.interval = interval  # 时间间隔
+        self.repeat = repeat  # 是否重复执行
+        self.active = True  # 是否有效，取消后为False
+        self.expire = 0  # 到期的刻度
+        self.slot = None  # 所在的槽位，不在时间轮中时为None
+
+
+########################################################################
+class TimerWheel(object):
+    """分层时间轮"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.currentTick = 0  # 当前刻度
+        self.wheels = [[set() for _ in range(WHEEL_SLOTS)] for _ in range(WHEEL_LEVELS)]
+        self.count = 0  # 时间轮中的任务数量
+
+    # ----------------------------------------------------------------------
+    def add(self, task, expire):
+        """将任务加入时间轮，expire为到期的刻度，早于当前刻度的任务在下一个刻度到期"""
+        if expire <= self.currentTick:
+            expire = self.currentTick + 1
+        task.expire = expire
+
+        if task.slot is None:
+            self.count += 1
+        else:
+            task.slot.discard(task)
+        self.place(task)
+
+    # ----------------------------------------------------------------------
+    def place(self, task):
+        """按照到期刻度将任务放入对应的槽位，任务的到期刻度不能早于当前刻度"""
+        expire = task.expire
+        diff = expire - self.currentTick
+        level = 0
+        while level < WHEEL_LEVELS - 1 and diff >= 1 << (WHEEL_BITS * (level + 1)):
+            level += 1
+
+        # 超出最高层范围的任务先放在最高层最远的槽位，之后再逐步分配
+        if level == WHEEL_LEVELS - 1 and diff >= 1 << (WHEEL_BITS * WHEEL_LEVELS):
+            expire = self.currentTick + (1 << (WHEEL_BITS * WHEEL_LEVELS)) - 1
+
+        slot = self.wheels[level][(expire >> (WHEEL_BITS * level)) & WHEEL_MASK]
+        slot.add(task)
+        task.slot = slot
+
+    # ----------------------------------------------------------------------
+    def remove(self, task):
+        """将任务移出时间轮"""
+        if task.slot is not None:
+            task.slot.discard(task)
+            task.slot = None
+            self.count -= 1
+
+    # ----------------------------------------------------------------------
+    def advance(self):
+        """时间轮前进一个刻度，返回到期的任务列表"""
+        self.currentTick += 1
+        tick = self.currentTick
+
+        # 低层转完一圈时，将高层当前槽位中的任务重新分配
+        level = 1
+        while level < WHEEL_LEVELS and not (tick >> (WHEEL_BITS * (level - 1))) & WHEEL_MASK:
+            slot = self.wheels[level][(tick >> (WHEEL_BITS * level)) & WHEEL_MASK]
+            if slot:
+                tasks = list(slot)
+                slot.clear()
+                for task in tasks:
+                    self.place(task)
+            level += 1
+
+        slot = self.wheels[0][tick & WHEEL_MASK]
+        if not slot:
+            return []
+
+        tasks = list(slot)
+        slot.clear()
+        for task in tasks:
+            task.slot = None
+        self.count -= len(tasks)
+        return tasks
+
+    # ----------------------------------------------------------------------
+    def skip(self, target):
+        """
+        一次跳过之后没有任务需要处理的刻度，最多前进到target - 1，
+        之后调用advance处理下一个刻度，避免在空闲时逐个刻度前进
+        """
+        if self.count:
+            n = min(self.getWaitTicks() - 1, target - 1 - self.currentTick)
+        else:
+            n = target - 1 - self.currentTick
+
+        if n > 0:
+            self.currentTick += n
+
+    # ----------------------------------------------------------------------
+    def getWaitTicks(self):
+        """
+        获取距离下一个需要处理的刻度的刻度数，在此之前不会有任务到期，驱动线程可以据此休眠。
+        只检查第0层，最多到第0层转完一圈（此时可能需要重新分配高层的任务）。
+        """
+        tick = self.currentTick
+        level0 = self.wheels[0]
+        n = 1
+        while n < WHEEL_SLOTS:
+            index = (tick + n) & WHEEL_MASK
+            if level0[index] or not index:
+                break
+            n += 1
+        return n
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是CTP数据和VT数据之间的转换。
+
+VT类型和CTP类型的映射字典依赖CTP常量表defineDict，导入本模块时只创建空字典，
+在第一次使用时（创建CtpGateway或者转换委托、成交）由loadMaps填充，避免导入时加载常量表。
+"""
+
+from ctpTable import defineDict
+from vnpy.utils.vtFunction import parseTickDatetime
+from vnpy.utils.vtGateway import *
+
+# 以下为一些VT类型和CTP类型的映射字典，由loadMaps填充
+priceTypeMap = {}  # 价格类型映射
+priceTypeMapReverse = {}
+
+directionMap = {}  # 方向类型映射
+directionMapReverse = {}
+
+offsetMap = {}  # 开平类型映射
+offsetMapReverse = {}
+
+posiDirectionMap = {}  # 持仓类型映射
+posiDirectionMapReverse = {}
+
+productClassMap = {}  # 产品类型映射
+productClassMapReverse = {}
+
+orderStatusMap = {}  # 报单状态映射
+orderStatusMapReverse = {}
+
+mapsLoaded = False  # 映射字典是否已经填充
+
+# 交易所类型映射
+exchangeMap = {
+    EXCHANGE_CFFEX: 'CFFEX',
+    EXCHANGE_SHFE: 'SHFE',
+    EXCHANGE_CZCE: 'CZCE',
+    EXCHANGE_DCE: 'DCE',
+    EXCHANGE_SSE: 'SSE',
+    EXCHANGE_UNKNOWN: ''
+}
+exchangeMapReverse = {v: k for k, v in exchangeMap.items()}
+
+# 行情毫秒数对应的时间后缀，如500对应'.5'
+millisecSuffixList = ['.' + str(i // 100) for i in range(1000)]
+
+
+# ----------------------------------------------------------------------
+def parseCtpDatetime(date, time):
+    """解析行情的时间，格式错误时返回None，不在API的回调线程中抛出异常"""
+    try:
+        return parseTickDatetime(date, time)
+    except ValueError:
+        return None
+
+
+# ----------------------------------------------------------------------
+def loadMaps():
+    """根据CTP常量表填充映射字典，只在第一次调用时执行，重复填充的结果相同因此无需加锁"""
+    global mapsLoaded
+    if mapsLoaded:
+        return
+
+    priceTypeMap.update({
+        PRICETYPE_LIMITPRICE: defineDict["THOST_FTDC_OPT_LimitPrice"],
+        PRICETYPE_MARKETPRICE: defineDict["THOST_FTDC_OPT_AnyPrice"]
+    })
+
+    directionMap.update({
+        DIRECTION_LONG: defineDict['THOST_FTDC_D_Buy'],
+        DIRECTION_SHORT: defineDict['THOST_FTDC_D_Sell']
+    })
+
+    offsetMap.update({
+        OFFSET_OPEN: defineDict['THOST_FTDC_OF_Open'],
+        OFFSET_CLOSE: defineDict['THOST_FTDC_OF_Close'],
+        OFFSET_CLOSETODAY: defineDict['THOST_FTDC_OF_CloseToday'],
+        OFFSET_CLOSEYESTERDAY: defineDict['THOST_FTDC_OF_CloseYesterday']
+    })
+
+    posiDirectionMap.update({
+        DIRECTION_NET: defineDict["THOST_FTDC_PD_Net"],
+        DIRECTION_LONG: defineDict["THOST_FTDC_PD_Long"],
+        DIRECTION_SHORT: defineDict["THOST_FTDC_PD_Short"]
+    })
+
+    productClassMap.update({
+        PRODUCT_FUTURES: defineDict["THOST_FTDC_PC_Futures"],
+        PRODUCT_OPTION: defineDict["THOST_FTDC_PC_Options"],
+        PRODUCT_COMBINATION: defineDict["THOST_FTDC_PC_Combination"]
+    })
+
+    # CTP中排队和不在队列中的状态对应同一个VT状态
+    orderStatusMap.update({
+        STATUS_ALLTRADED: defineDict["THOST_FTDC_OST_AllTraded"],
+        STATUS_PARTTRADED: defineDict["THOST_FTDC_OST_PartTradedQueueing"],
+        STATUS_NOTTRADED: defineDict["THOST_FTDC_OST_NoTradeQueueing"],
+        STATUS_CANCELLED: defineDict["THOST_FTDC_OST_Canceled"]
+    })
+
+    for d, reverse in [(priceTypeMap, priceTypeMapReverse),
+                       (directionMap, directionMapReverse),
+                       (offsetMap, offsetMapReverse),
+                       (posiDirectionMap, posiDirectionMapReverse),
+                       (productClassMap, productClassMapReverse),
+                       (orderStatusMap, orderStatusMapReverse)]:
+        reverse.update({v: k for k, v in d.items()})
+
+    # 不在队列中的委托已经结束（如FAK/FOK剩余部分被撤销），按已撤销处理，避免一直留在活动委托中
+    orderStatusMapReverse[defineDict["THOST_FTDC_OST_PartTradedNotQueueing"]] = STATUS_CANCELLED
+    orderStatusMapReverse[defineDict["THOST_FTDC_OST_NoTradeNotQueueing"]] = STATUS_CANCELLED
+
+    mapsLoaded = True
+
+
+# ----------------------------------------------------------------------
+def convertTick(data, gateway_name):
+    """将CTP的行情字典转换为VtTickData"""
+    tick = VtTickData()
+    tick.gatewayName = gateway_name
+
+    tick.symbol = data['InstrumentID']
+    tick.exchange = exchangeMapReverse.get(data['ExchangeID'], u'未知')
+    tick.vtSymbol = tick.symbol
+
+    tick.lastPrice = data['LastPrice']
+    tick.volume = data['Volume']
+    tick.openInterest = data['OpenInterest']
+    tick.date = data['TradingDay']
+
+    # 毫秒数超出范围（异常数据）时按原来的方式拼接，时间解析失败时datetime为None
+    millisec = data['UpdateMillisec']
+    if 0 <= millisec < 1000:
+        tick.time = data['UpdateTime'] + millisecSuffixList[millisec]
+    else:
+        tick.time = '.'.join([data['UpdateTime'], str(millisec // 100)])
+    tick.datetime = parseCtpDatetime(tick.date, tick.time)
+
+    tick.openPrice = data['OpenPrice']
+    tick.highPrice = data['HighestPrice']
+    tick.lowPrice = data['LowestPrice']
+    tick.preClosePrice = data['PreClosePrice']
+
+    tick.upperLimit = data['UpperLimitPrice']
+    tick.lowerLimit = data['LowerLimitPrice']
+
+    # CTP只有一档行情
+    tick.bidPrice1 = data['BidPrice1']
+    tick.bidVolume1 = data['BidVolume1']
+    tick.askPrice1 = data['AskPrice1']
+    tick.askVolume1 = data['AskVolume1']
+    return tick
+
+
+# ----------------------------------------------------------------------
+def convertOrder(data, gateway_name):
+    """将CTP的报单回报字典转换为VtOrderData"""
+    if not mapsLoaded:
+        loadMaps()
+
+    order = VtOrderData()
+    order.gatewayName = gateway_name
+
+    # 保存代码和报单号
+    order.symbol = data['InstrumentID']
+    order.exchange = exchangeMapReverse.get(data['ExchangeID'], EXCHANGE_UNKNOWN)
+    order.vtSymbol = order.symbol
+
+    order.orderID = data['OrderRef']
+
+    order.direction = directionMapReverse.get(data['Direction'], DIRECTION_UNKNOWN)
+    order.offset = offsetMapReverse.get(data['CombOffsetFlag'], OFFSET_UNKNOWN)
+    order.status = orderStatusMapReverse.get(data['OrderStatus'], STATUS_UNKNOWN)
+
+    # 价格、报单量等数值
+    order.price = data['LimitPrice']
+    order.totalVolume = data['VolumeTotalOriginal']
+    order.tradedVolume = data['VolumeTraded']
+    order.orderTime = data['InsertTime']
+    order.cancelTime = data['CancelTime']
+    order.frontID = data['FrontID']
+    order.sessionID = data['SessionID']
+
+    # CTP的报单号一致性维护需要基于frontID, sessionID, orderID三个字段
+    # 但在本接口设计中，已经考虑了CTP的OrderRef的自增性，避免重复
+    order.vtOrderID = gateway_name + '.' + order.orderID
+    return order
+
+
+# ----------------------------------------------------------------------
+def convertTrade(data, gateway_name):
+    """将CTP的成交回报字典转换为VtTradeData"""
+    if not mapsLoaded:
+        loadMaps()
+
+    trade = VtTradeData()
+    trade.gatewayName = gateway_name
+
+    # 保存代码和报单号
+    trade.symbol = data['InstrumentID']
+    trade.exchange = exchangeMapReverse.get(data['ExchangeID'], EXCHANGE_UNKNOWN)
+    trade.vtSymbol = trade.symbol
+
+    trade.tradeID = data['TradeID']
+    trade.vtTradeID = gateway_name + '.' + trade.tradeID
+
+    trade.orderID = data['OrderRef']
+    trade.vtOrderID = gateway_name + '.' + trade.orderID
+
+    # 方向、开平
+    trade.direction = directionMapReverse.get(data['Direction'], EMPTY_STRING)
+    trade.offset = offsetMapReverse.get(data['OffsetFlag'], EMPTY_STRING)
+
+    # 价格、数量等数值
+    trade.price = data['Price']
+    trade.volume = data['Volume']
+    trade.tradeTime = data['TradeTime']
+    return trade
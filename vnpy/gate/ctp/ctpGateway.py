@@ -10,64 +10,18 @@ vtSymbol直接使用symbol
 import json
 import os
 from copy import copy
+from threading import Lock
 
 from vnpy.ext.vnctpmd import MdApi
 from vnpy.ext.vnctptd import TdApi
 
-from ctpDataType import *
+from ctpConvert import *
 from vnpy.utils.vtFunction import findConfPath, findTempPath
 from vnpy.utils.vtGateway import *
 
-# 以下为一些VT类型和CTP类型的映射字典
-# 价格类型映射
-priceTypeMap = {
-    PRICETYPE_LIMITPRICE: defineDict["THOST_FTDC_OPT_LimitPrice"],
-    PRICETYPE_MARKETPRICE: defineDict["THOST_FTDC_OPT_AnyPrice"]
-}
-priceTypeMapReverse = {v: k for k, v in priceTypeMap.items()}
-
-# 方向类型映射
-directionMap = {
-    DIRECTION_LONG: defineDict['THOST_FTDC_D_Buy'],
-    DIRECTION_SHORT: defineDict['THOST_FTDC_D_Sell']
-}
-directionMapReverse = {v: k for k, v in directionMap.items()}
-
-# 开平类型映射
-offsetMap = {
-    OFFSET_OPEN: defineDict['THOST_FTDC_OF_Open'],
-    OFFSET_CLOSE: defineDict['THOST_FTDC_OF_Close'],
-    OFFSET_CLOSETODAY: defineDict['THOST_FTDC_OF_CloseToday'],
-    OFFSET_CLOSEYESTERDAY: defineDict['THOST_FTDC_OF_CloseYesterday']
-}
-offsetMapReverse = {v: k for k, v in offsetMap.items()}
-
-# 交易所类型映射
-exchangeMap = {
-    EXCHANGE_CFFEX: 'CFFEX',
-    EXCHANGE_SHFE: 'SHFE',
-    EXCHANGE_CZCE: 'CZCE',
-    EXCHANGE_DCE: 'DCE',
-    EXCHANGE_SSE: 'SSE',
-    EXCHANGE_UNKNOWN: ''
-}
-exchangeMapReverse = {v: k for k, v in exchangeMap.items()}
-
-# 持仓类型映射
-posiDirectionMap = {
-    DIRECTION_NET: defineDict["THOST_FTDC_PD_Net"],
-    DIRECTION_LONG: defineDict["THOST_FTDC_PD_Long"],
-    DIRECTION_SHORT: defineDict["THOST_FTDC_PD_Short"]
-}
-posiDirectionMapReverse = {v: k for k, v in posiDirectionMap.items()}
-
-# 产品类型映射
-productClassMap = {
-    PRODUCT_FUTURES: defineDict["THOST_FTDC_PC_Futures"],
-    PRODUCT_OPTION: defineDict["THOST_FTDC_PC_Options"],
-    PRODUCT_COMBINATION: defineDict["THOST_FTDC_PC_Combination"]
-}
-productClassMapReverse = {v: k for k, v in productClassMap.items()}
+# 查询调度中的查询名称
+QUERY_ACCOUNT = 'account'
+QUERY_POSITION = 'position'
 
 
 ########################################################################
@@ -79,6 +33,9 @@ class CtpGateway(VtGateway):
         """Constructor"""
         super(CtpGateway, self).__init__(event_engine, gateway_name)
 
+        # 发单、撤单以及回报转换使用的映射字典在创建接口时才根据CTP常量表生成
+        loadMaps()
+
         self.mdApi = CtpMdApi(self)  # 行情API
         self.tdApi = CtpTdApi(self)  # 交易API
 
@@ -87,11 +44,16 @@ class CtpGateway(VtGateway):
 
         self.qryEnabled = False  # 是否要启动循环查询
 
-        self.qryFunctionList = []
+        self.qryRate = 1.0  # 每秒允许的查询次数，和柜台的流控限制一致
+        self.qryInterval = 3.0  # 例行查询的初始间隔（秒）
+        self.qryMaxInterval = 30.0  # 查询结果没有变化时，例行查询间隔加倍的上限（秒）
+        self.qryTimerInterval = 100  # 查询调度的定时任务间隔（毫秒）
+        self.qryTimer = None  # 查询定时任务
+        self.queryScheduler = None  # 查询调度，初始化查询时创建
 
-        self.qryCount = 0  # 查询触发倒计时
-        self.qryTrigger = 2  # 查询触发点
-        self.qryNextFunction = 0  # 上次运行的查询函数索引
+        # CTP的行情回调总是在行情API的同一个线程中，可以使用无锁的环形缓冲区推送
+        if hasattr(event_engine, 'createRing'):
+            self.tickRing = event_engine.createRing()
 
     # ----------------------------------------------------------------------
     def connect(self):
@@ -116,6 +78,11 @@ class CtpGateway(VtGateway):
             broker_id = str(setting['brokerID'])
             td_address = str(setting['tdAddress'])
             md_address = str(setting['mdAddress'])
+
+            # 查询的流控和间隔为可选配置
+            self.qryRate = setting.get('qryRate', self.qryRate)
+            self.qryInterval = setting.get('qryInterval', self.qryInterval)
+            self.qryMaxInterval = setting.get('qryMaxInterval', self.qryMaxInterval)
         except KeyError:
             log = VtLogData()
             log.gatewayName = self.gatewayName
@@ -135,6 +102,11 @@ class CtpGateway(VtGateway):
         """订阅行情"""
         self.mdApi.subscribe(subscribe_req)
 
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, subscribe_req):
+        """退订行情"""
+        self.mdApi.unsubscribe(subscribe_req)
+
     # ----------------------------------------------------------------------
     def sendOrder(self, order_req):
         """发单"""
@@ -147,17 +119,27 @@ class CtpGateway(VtGateway):
 
     # ----------------------------------------------------------------------
     def qryAccount(self):
-        """查询账户资金"""
-        self.tdApi.qryAccount()
+        """查询账户资金，启动了查询调度时以高优先级排队，遵守流控限制"""
+        if self.queryScheduler:
+            self.queryScheduler.request(QUERY_ACCOUNT)
+        else:
+            self.tdApi.qryAccount()
 
     # ----------------------------------------------------------------------
     def qryPosition(self):
         """查询持仓"""
-        self.tdApi.qryPosition()
+        if self.queryScheduler:
+            self.queryScheduler.request(QUERY_POSITION)
+        else:
+            self.tdApi.qryPosition()
 
     # ----------------------------------------------------------------------
     def close(self):
         """关闭"""
+        if self.qryTimer:
+            self.eventEngine.cancelTimer(self.qryTimer)
+            self.qryTimer = None
+
         if self.mdConnected:
             self.mdApi.close()
         if self.tdConnected:
@@ -167,33 +149,46 @@ class CtpGateway(VtGateway):
     def initQuery(self):
         """初始化连续查询"""
         if self.qryEnabled:
-            # 需要循环的查询函数列表
-            self.qryFunctionList = [self.qryAccount, self.qryPosition]
+            if not self.queryScheduler:
+                # 需要例行查询的函数，回报没有变化时查询间隔逐渐加大
+                self.queryScheduler = VtQueryScheduler(self.qryRate)
+                self.queryScheduler.addQuery(QUERY_ACCOUNT, self.tdApi.qryAccount,
+                                             self.qryInterval, self.qryMaxInterval)
+                self.queryScheduler.addQuery(QUERY_POSITION, self.tdApi.qryPosition,
+                                             self.qryInterval, self.qryMaxInterval)
 
             self.startQuery()
 
     # ----------------------------------------------------------------------
     def query(self, event):
-        """注册到事件处理引擎上的查询函数"""
-        self.qryCount += 1
+        """由事件引擎定时调用的查询函数"""
+        # 交易服务器登录后才发出查询
+        if self.tdConnected:
+            self.queryScheduler.run()
 
-        if self.qryCount > self.qryTrigger:
-            # 清空倒计时
-            self.qryCount = 0
+    # ----------------------------------------------------------------------
+    def startQuery(self):
+        """启动连续查询"""
+        if not self.qryTimer:
+            self.qryTimer = self.eventEngine.addTimer(self.qryTimerInterval, self.query, repeat=True)
 
-            # 执行查询函数
-            function = self.qryFunctionList[self.qryNextFunction]
-            function()
+    # ----------------------------------------------------------------------
+    def requestQuery(self, name):
+        """按需查询（如成交后刷新持仓），排在例行查询之前"""
+        if self.queryScheduler:
+            self.queryScheduler.request(name)
 
-            # 计算下次查询函数的索引，如果超过了列表长度，则重新设为0
-            self.qryNextFunction += 1
-            if self.qryNextFunction == len(self.qryFunctionList):
-                self.qryNextFunction = 0
+    # ----------------------------------------------------------------------
+    def onQueryResult(self, name, changed):
+        """查询回报全部收到后由交易API调用"""
+        if self.queryScheduler:
+            self.queryScheduler.onResult(name, changed)
 
     # ----------------------------------------------------------------------
-    def startQuery(self):
-        """启动连续查询"""
-        self.eventEngine.register(EVENT_TIMER, self.query)
+    def resetQuery(self):
+        """交易服务器断开后调用"""
+        if self.queryScheduler:
+            self.queryScheduler.reset()
 
     # ----------------------------------------------------------------------
     def setQryEnabled(self, qry_enabled):
@@ -214,11 +209,13 @@ class CtpMdApi(MdApi):
         self.gatewayName = gateway.gatewayName  # gateway对象名称
 
         self.reqID = EMPTY_INT  # 操作请求编号
+        self.reqIDLock = Lock()  # 保护请求编号
 
         self.connectionStatus = False  # 连接状态
         self.loginStatus = False  # 登录状态
 
-        self.subscribedSymbols = set()  # 已订阅合约代码
+        # 订阅管理，合约被多个模块订阅时只发送一次请求，登录前的订阅在登录后一次性发送
+        self.subscriptionManager = VtSubscriptionManager(self.subscribeSymbols, self.unsubscribeSymbols)
 
         self.userID = EMPTY_STRING  # 账号
         self.password = EMPTY_STRING  # 密码
@@ -243,6 +240,9 @@ class CtpMdApi(MdApi):
         self.loginStatus = False
         self.gateway.mdConnected = False
 
+        # 断线后服务器上的订阅失效，重新登录后恢复
+        self.subscriptionManager.setOnline(False)
+
         log = VtLogData()
         log.gatewayName = self.gatewayName
         log.logContent = u'行情服务器连接断开'
@@ -277,9 +277,8 @@ class CtpMdApi(MdApi):
             log.logContent = u'行情服务器登录完成'
             self.gateway.onLog(log)
 
-            # 重新订阅之前订阅的合约
-            for subscribeReq in self.subscribedSymbols:
-                self.subscribe(subscribeReq)
+            # 一次性订阅登录前以及断线前订阅的合约
+            self.subscriptionManager.setOnline(True)
 
         # 否则，推送错误信息
         else:
@@ -296,6 +295,7 @@ class CtpMdApi(MdApi):
         if error['ErrorID'] == 0:
             self.loginStatus = False
             self.gateway.mdConnected = False
+            self.subscriptionManager.setOnline(False)
 
             log = VtLogData()
             log.gatewayName = self.gatewayName
@@ -327,33 +327,7 @@ class CtpMdApi(MdApi):
     # ----------------------------------------------------------------------
     def onRtnDepthMarketData(self, data):
         """行情推送"""
-        tick = VtTickData()
-        tick.gatewayName = self.gatewayName
-
-        tick.symbol = data['InstrumentID']
-        tick.exchange = exchangeMapReverse.get(data['ExchangeID'], u'未知')
-        tick.vtSymbol = tick.symbol  # '.'.join([tick.symbol, EXCHANGE_UNKNOWN])
-
-        tick.lastPrice = data['LastPrice']
-        tick.volume = data['Volume']
-        tick.openInterest = data['OpenInterest']
-        tick.time = '.'.join([data['UpdateTime'], str(data['UpdateMillisec'] / 100)])
-        tick.date = data['TradingDay']
-
-        tick.openPrice = data['OpenPrice']
-        tick.highPrice = data['HighestPrice']
-        tick.lowPrice = data['LowestPrice']
-        tick.preClosePrice = data['PreClosePrice']
-
-        tick.upperLimit = data['UpperLimitPrice']
-        tick.lowerLimit = data['LowerLimitPrice']
-
-        # CTP只有一档行情
-        tick.bidPrice1 = data['BidPrice1']
-        tick.bidVolume1 = data['BidVolume1']
-        tick.askPrice1 = data['AskPrice1']
-        tick.askVolume1 = data['AskVolume1']
-
+        tick = convertTick(data, self.gatewayName)
         self.gateway.onTick(tick)
 
     # ----------------------------------------------------------------------
@@ -408,9 +382,26 @@ class CtpMdApi(MdApi):
         """订阅合约"""
         # 这里的设计是，如果尚未登录就调用了订阅方法
         # 则先保存订阅请求，登录完成后会自动订阅
-        if self.loginStatus:
-            self.subscribeMarketData(str(subscribe_req.symbol))
-        self.subscribedSymbols.add(subscribe_req)
+        self.subscriptionManager.subscribe(str(subscribe_req.symbol))
+        self.subscriptionManager.flush()
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, subscribe_req):
+        """退订合约，最后一个订阅该合约的模块退订时才向服务器发送退订"""
+        self.subscriptionManager.unsubscribe(str(subscribe_req.symbol))
+        self.subscriptionManager.flush()
+
+    # ----------------------------------------------------------------------
+    def subscribeSymbols(self, symbol_list):
+        """向服务器发送订阅，vnctpmd的订阅函数每次只接受一个合约代码"""
+        for symbol in symbol_list:
+            self.subscribeMarketData(symbol)
+
+    # ----------------------------------------------------------------------
+    def unsubscribeSymbols(self, symbol_list):
+        """向服务器发送退订"""
+        for symbol in symbol_list:
+            self.unSubscribeMarketData(symbol)
 
     # ----------------------------------------------------------------------
     def login(self):
@@ -422,13 +413,20 @@ class CtpMdApi(MdApi):
                 'Password': self.password,
                 'BrokerID': self.brokerID
             }
-            self.reqID += 1
             print "--->>> reqUserLogin Md"
-            self.reqUserLogin(req, self.reqID)
+            self.reqUserLogin(req, self.nextReqID())
+
+    # ----------------------------------------------------------------------
+    def nextReqID(self):
+        """生成新的请求编号"""
+        with self.reqIDLock:
+            self.reqID += 1
+            return self.reqID
 
     # ----------------------------------------------------------------------
     def close(self):
         """关闭"""
+        self.subscriptionManager.setOnline(False)
         self.exit()
 
 
@@ -446,6 +444,7 @@ class CtpTdApi(TdApi):
 
         self.reqID = EMPTY_INT  # 操作请求编号
         self.orderRef = EMPTY_INT  # 订单编号
+        self.orderRefLock = Lock()  # 保护请求编号和订单编号，事件引擎分片模式下可能有多个线程同时发单
 
         self.connectionStatus = False  # 连接状态
         self.loginStatus = False  # 登录状态
@@ -459,6 +458,9 @@ class CtpTdApi(TdApi):
         self.sessionID = EMPTY_INT  # 会话编号
 
         self.posBufferDict = {}  # 缓存持仓数据的字典
+        self.posSnapshotList = []  # 本次持仓查询回报的持仓数据，用于判断持仓是否变化
+        self.lastPosSnapshot = None  # 上次持仓查询的结果
+        self.lastAccountSnapshot = None  # 上次资金查询的结果
         self.symbolExchangeDict = {}  # 保存合约代码和交易所的印射关系
         self.symbolSizeDict = {}  # 保存合约代码和合约大小的印射关系
 
@@ -480,6 +482,7 @@ class CtpTdApi(TdApi):
         self.connectionStatus = False
         self.loginStatus = False
         self.gateway.tdConnected = False
+        self.gateway.resetQuery()
 
         log = VtLogData()
         log.gatewayName = self.gatewayName
@@ -518,9 +521,8 @@ class CtpTdApi(TdApi):
                 'BrokerID': self.brokerID,
                 'InvestorID': self.userID
             }
-            self.reqID += 1
             print "--->>> reqSettlementInfoConfirm"
-            self.reqSettlementInfoConfirm(req, self.reqID)
+            self.reqSettlementInfoConfirm(req, self.nextReqID())
 
             # 否则，推送错误信息
         else:
@@ -610,9 +612,8 @@ class CtpTdApi(TdApi):
         self.gateway.onLog(log)
 
         # 查询合约代码
-        self.reqID += 1
         print "--->>> reqQryInstrument"
-        self.reqQryInstrument({}, self.reqID)
+        self.reqQryInstrument({}, self.nextReqID())
 
     # ----------------------------------------------------------------------
     @staticmethod
@@ -701,6 +702,15 @@ class CtpTdApi(TdApi):
             pos = pos_buffer.updateBuffer(data, size)
         self.gateway.onPosition(pos)
 
+        # 全部回报收到后比较持仓是否变化，没有变化时查询调度会加大例行查询的间隔
+        self.posSnapshotList.append((pos.vtPositionName, pos.position, pos.ydPosition, pos.frozen, pos.price))
+        if last:
+            snapshot = sorted(self.posSnapshotList)
+            self.posSnapshotList = []
+            changed = snapshot != self.lastPosSnapshot
+            self.lastPosSnapshot = snapshot
+            self.gateway.onQueryResult(QUERY_POSITION, changed)
+
     # ----------------------------------------------------------------------
     def onRspQryTradingAccount(self, data, error, n, last):
         """资金账户查询回报"""
@@ -728,6 +738,14 @@ class CtpTdApi(TdApi):
         # 推送
         self.gateway.onAccount(account)
 
+        # 只比较成交和出入金才会改变的字段，持仓盈亏以及由其计算的balance、available随行情变化，
+        # 比较这些字段会使有持仓时的每次查询都被认为有变化
+        snapshot = (account.margin, account.commission, account.closeProfit,
+                    data['Deposit'], data['Withdraw'])
+        changed = snapshot != self.lastAccountSnapshot
+        self.lastAccountSnapshot = snapshot
+        self.gateway.onQueryResult(QUERY_ACCOUNT, changed)
+
     # ----------------------------------------------------------------------
     @staticmethod
     def onRspQryInvestor(data, error, n, last):
@@ -990,63 +1008,12 @@ class CtpTdApi(TdApi):
     def onRtnOrder(self, data):
         """报单回报"""
         # 更新最大报单编号
-        print "onRtnOrder", data
         newref = data['OrderRef']
-        self.orderRef = max(self.orderRef, int(newref))
+        with self.orderRefLock:
+            self.orderRef = max(self.orderRef, int(newref))
 
         # 创建报单数据对象
-        order = VtOrderData()
-        order.gatewayName = self.gatewayName
-
-        # 保存代码和报单号
-        order.symbol = data['InstrumentID']
-        order.exchange = exchangeMapReverse[data['ExchangeID']]
-        order.vtSymbol = order.symbol  # '.'.join([order.symbol, order.exchange])
-
-        order.orderID = data['OrderRef']
-
-        # 方向
-        if data['Direction'] == '0':
-            order.direction = DIRECTION_LONG
-        elif data['Direction'] == '1':
-            order.direction = DIRECTION_SHORT
-        else:
-            order.direction = DIRECTION_UNKNOWN
-
-        # 开平
-        if data['CombOffsetFlag'] == '0':
-            order.offset = OFFSET_OPEN
-        elif data['CombOffsetFlag'] == '1':
-            order.offset = OFFSET_CLOSE
-        else:
-            order.offset = OFFSET_UNKNOWN
-
-        # 状态
-        if data['OrderStatus'] == '0':
-            order.status = STATUS_ALLTRADED
-        elif data['OrderStatus'] == '1':
-            order.status = STATUS_PARTTRADED
-        elif data['OrderStatus'] == '3':
-            order.status = STATUS_NOTTRADED
-        elif data['OrderStatus'] == '5':
-            order.status = STATUS_CANCELLED
-        else:
-            order.status = STATUS_UNKNOWN
-
-        # 价格、报单量等数值
-        order.price = data['LimitPrice']
-        order.totalVolume = data['VolumeTotalOriginal']
-        order.tradedVolume = data['VolumeTraded']
-        order.orderTime = data['InsertTime']
-        order.cancelTime = data['CancelTime']
-        order.frontID = data['FrontID']
-        order.sessionID = data['SessionID']
-
-        # CTP的报单号一致性维护需要基于frontID, sessionID, orderID三个字段
-        # 但在本接口设计中，已经考虑了CTP的OrderRef的自增性，避免重复
-        # 唯一可能出现OrderRef重复的情况是多处登录并在非常接近的时间内（几乎同时发单）
-        # 考虑到VtTrader的应用场景，认为以上情况不会构成问题
-        order.vtOrderID = '.'.join([self.gatewayName, order.orderID])
+        order = convertOrder(data, self.gatewayName)
 
         # 推送
         self.gateway.onOrder(order)
@@ -1054,36 +1021,16 @@ class CtpTdApi(TdApi):
     # ----------------------------------------------------------------------
     def onRtnTrade(self, data):
         """成交回报"""
-        # 创建报单数据对象
-        print "onRtnTrade", data
-        trade = VtTradeData()
-        trade.gatewayName = self.gatewayName
-
-        # 保存代码和报单号
-        trade.symbol = data['InstrumentID']
-        trade.exchange = exchangeMapReverse[data['ExchangeID']]
-        trade.vtSymbol = trade.symbol  # '.'.join([trade.symbol, trade.exchange])
-
-        trade.tradeID = data['TradeID']
-        trade.vtTradeID = '.'.join([self.gatewayName, trade.tradeID])
-
-        trade.orderID = data['OrderRef']
-        trade.vtOrderID = '.'.join([self.gatewayName, trade.orderID])
-
-        # 方向
-        trade.direction = directionMapReverse.get(data['Direction'], '')
-
-        # 开平
-        trade.offset = offsetMapReverse.get(data['OffsetFlag'], '')
-
-        # 价格、报单量等数值
-        trade.price = data['Price']
-        trade.volume = data['Volume']
-        trade.tradeTime = data['TradeTime']
+        # 创建成交数据对象
+        trade = convertTrade(data, self.gatewayName)
 
         # 推送
         self.gateway.onTrade(trade)
 
+        # 成交后持仓和资金发生变化，优先刷新
+        self.gateway.requestQuery(QUERY_POSITION)
+        self.gateway.requestQuery(QUERY_ACCOUNT)
+
     # ----------------------------------------------------------------------
     def onErrRtnOrderInsert(self, data, error):
         """发单错误回报（交易所）"""
@@ -1410,33 +1357,40 @@ class CtpTdApi(TdApi):
                 'Password': self.password,
                 'BrokerID': self.brokerID
             }
-            self.reqID += 1
             print "--->>> reqUserLogin Td"
-            self.reqUserLogin(req, self.reqID)
+            self.reqUserLogin(req, self.nextReqID())
 
     # ----------------------------------------------------------------------
     def qryAccount(self):
-        """查询账户"""
-        self.reqID += 1
+        """查询账户，返回API的返回值，非0表示请求未发出（如超过流控限制）"""
         print "--->>> reqQryTradingAccount"
-        self.reqQryTradingAccount({}, self.reqID)
+        return self.reqQryTradingAccount({}, self.nextReqID())
 
     # ----------------------------------------------------------------------
     def qryPosition(self):
         """查询持仓"""
-        self.reqID += 1
         req = {
             'BrokerID': self.brokerID,
             'InvestorID': self.userID
         }
         print "--->>> reqQryInvestorPosition"
-        self.reqQryInvestorPosition(req, self.reqID)
+        return self.reqQryInvestorPosition(req, self.nextReqID())
+
+    # ----------------------------------------------------------------------
+    def nextReqID(self):
+        """生成新的请求编号"""
+        with self.orderRefLock:
+            self.reqID += 1
+            return self.reqID
 
     # ----------------------------------------------------------------------
     def sendOrder(self, order_req):
         """发单"""
-        self.reqID += 1
-        self.orderRef += 1
+        with self.orderRefLock:
+            self.reqID += 1
+            self.orderRef += 1
+            order_ref = self.orderRef
+            req_id = self.reqID
 
         req = {
             'InstrumentID': order_req.symbol,
@@ -1445,7 +1399,7 @@ class CtpTdApi(TdApi):
             'OrderPriceType': priceTypeMap.get(order_req.priceType, ''),
             'Direction': directionMap.get(order_req.direction, ''),
             'CombOffsetFlag': offsetMap.get(order_req.offset, ''),
-            'OrderRef': str(self.orderRef),
+            'OrderRef': str(order_ref),
             'InvestorID': self.userID,
             'UserID': self.userID,
             'BrokerID': self.brokerID,
@@ -1471,17 +1425,15 @@ class CtpTdApi(TdApi):
             req['VolumeCondition'] = defineDict['THOST_FTDC_VC_CV']
 
         print "--->>> reqOrderInsert"
-        self.reqOrderInsert(req, self.reqID)
+        self.reqOrderInsert(req, req_id)
 
         # 返回订单号（字符串），便于某些算法进行动态管理
-        vt_order_id = '.'.join([self.gatewayName, str(self.orderRef)])
+        vt_order_id = '.'.join([self.gatewayName, str(order_ref)])
         return vt_order_id
 
     # ----------------------------------------------------------------------
     def cancelOrder(self, cancel_order_req):
         """撤单"""
-        self.reqID += 1
-
         req = {
             'InstrumentID': cancel_order_req.symbol,
             'ExchangeID': cancel_order_req.exchange,
@@ -1493,7 +1445,7 @@ class CtpTdApi(TdApi):
             'InvestorID': self.userID
         }
         print "--->>> reqOrderAction"
-        self.reqOrderAction(req, self.reqID)
+        self.reqOrderAction(req, self.nextReqID())
 
     # ----------------------------------------------------------------------
     def close(self):
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是CTP常量表的延迟加载。
+
+ctpDataType.py由CTP的头文件生成，包含上千条字典赋值语句，每次导入都需要逐条执行。
+这里在第一次访问时才加载常量表，并将ctpDataType.py中的defineDict和typedefDict用marshal
+保存为紧凑的缓存文件（ctpDataType.dat），之后的启动直接读取缓存，不再执行ctpDataType.py。
+ctpDataType.py更新后缓存会自动重新生成；缓存文件无法写入时（如安装目录只读）
+直接使用ctpDataType.py中的字典。
+
+使用方法和原来的字典一样：
+from ctpTable import defineDict
+defineDict['THOST_FTDC_D_Buy']
+"""
+
+import marshal
+import os
+
+CTP_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_FILE = os.path.join(CTP_DIR, 'ctpDataType.py')
+CACHE_FILE = os.path.join(CTP_DIR, 'ctpDataType.dat')
+CACHE_VERSION = 1  # 缓存格式变化时修改
+
+tableCache = {}  # 已加载的常量表，key为表名
+
+
+# ----------------------------------------------------------------------
+def readCache():
+    """读取缓存文件，缓存不存在、过期或者损坏时返回None"""
+    try:
+        if os.path.getmtime(CACHE_FILE) < os.path.getmtime(SOURCE_FILE):
+            return None
+
+        with open(CACHE_FILE, 'rb') as f:
+            version, tables = marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if version != CACHE_VERSION:
+        return None
+    return tables
+
+
+# ----------------------------------------------------------------------
+def writeCache(tables):
+    """写入缓存文件，先写入临时文件再替换，避免其他进程读到不完整的文件"""
+    temp_file = CACHE_FILE + '.tmp'
+    try:
+        with open(temp_file, 'wb') as f:
+            marshal.dump((CACHE_VERSION, tables), f)
+
+        # Windows上rename不能覆盖已存在的文件
+        if os.path.exists(CACHE_FILE):
+            os.remove(CACHE_FILE)
+        os.rename(temp_file, CACHE_FILE)
+    except (IOError, OSError):
+        pass
+
+
+# ----------------------------------------------------------------------
+def loadTables():
+    """加载所有常量表，返回以表名为key的字典"""
+    if not tableCache:
+        tables = readCache()
+
+        if tables is None:
+            import ctpDataType
+            tables = {'defineDict': ctpDataType.defineDict,
+                      'typedefDict': ctpDataType.typedefDict}
+            writeCache(tables)
+
+        tableCache.update(tables)
+
+    return tableCache
+
+
+########################################################################
+class LazyTable(object):
+    """第一次访问时才加载的常量表，用法和字典相同"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, name):
+        """Constructor，name为ctpDataType中字典的名称"""
+        self.name = name
+        self.table = None
+
+    # ----------------------------------------------------------------------
+    def load(self):
+        """加载常量表"""
+        if self.table is None:
+            self.table = loadTables()[self.name]
+        return self.table
+
+    # ----------------------------------------------------------------------
+    def __getitem__(self, key):
+        return (self.table or self.load())[key]
+
+    # ----------------------------------------------------------------------
+    def __contains__(self, key):
+        return key in self.load()
+
+    # ----------------------------------------------------------------------
+    def __iter__(self):
+        return iter(self.load())
+
+    # ----------------------------------------------------------------------
+    def __len__(self):
+        return len(self.load())
+
+    # ----------------------------------------------------------------------
+    def __getattr__(self, name):
+        """get、keys、items等字典的其他方法"""
+        return getattr(self.load(), name)
+
+
+defineDict = LazyTable('defineDict')
+typedefDict = LazyTable('typedefDict')
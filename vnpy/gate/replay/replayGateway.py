@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是历史行情回放接口，将DrEngine记录在数据库（TICK_DB_NAME）中的tick重新推送给MainEngine，
+用于接近实盘的模拟交易以及策略的容量测试。
+
+回放接口基于模拟交易所接口（SimGateway），委托同样在本地按照最新的tick撮合，区别只在于行情来源：
+1. 每个合约的tick在数据库中按照时间排序后分批读取，读取线程在后台预先读取若干个批次，
+   行情线程只有在读取跟不上回放速度时才需要等待数据库
+2. 多个合约的tick按照时间归并后依次推送
+3. 按照tick的时间控制回放速度，可以和实盘相同、加快N倍或者尽可能快
+
+MainEngine.initGateway会自动发现本接口，接口名称为REPLAY。
+配置文件REPLAY_connect.json，在SimGateway的配置（见simGateway）基础上增加以下字段：
+symbols         回放的合约代码列表，为空时回放数据库中的所有合约
+startDate       回放的开始日期（包含），格式为20161018，为空时不限制
+endDate         回放的结束日期（包含），为空时不限制
+speed           回放速度的倍数，1为和实盘相同，0为尽可能快
+maxGap          超过maxGap秒的行情间隔（如午休、收盘）按照maxGap秒回放，0为不压缩
+batchSize       每次从数据库读取的tick数量
+prefetch        每个合约预先读取的批次数量
+loaderCount     读取线程的数量
+dbName          tick数据库的名称
+回放的合约同样以SimGateway的size、priceTick等配置推送合约信息，委托在本接口中撮合。
+"""
+
+import heapq
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from Queue import Queue
+from threading import Thread, Lock
+
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+from vnpy.engine.dr.drBase import TICK_DB_NAME
+from vnpy.gate.sim.simGateway import SimGateway, SimExchange, DEFAULT_SETTING
+from vnpy.utils.vtFunction import loadMongoSetting
+from vnpy.utils.vtGateway import *
+
+# 回放配置，和SimGateway的默认配置合并
+REPLAY_SETTING = {
+    'symbols': [],
+    'startDate': '',
+    'endDate': '',
+    'speed': 1,
+    'maxGap': 60,
+    'batchSize': 5000,
+    'prefetch': 4,
+    'loaderCount': 2,
+    'dbName': TICK_DB_NAME,
+    'pushAll': True
+}
+
+BSON_DATE = 9  # MongoDB中日期的类型编号
+
+
+########################################################################
+class ReplayGateway(SimGateway):
+    """历史行情回放接口"""
+
+    defaultSetting = dict(DEFAULT_SETTING, **REPLAY_SETTING)
+
+    # ----------------------------------------------------------------------
+    def __init__(self, event_engine, gateway_name='REPLAY'):
+        """Constructor"""
+        super(ReplayGateway, self).__init__(event_engine, gateway_name)
+
+        self.dbClient = None  # MongoDB客户端
+
+    # ----------------------------------------------------------------------
+    def createExchange(self, setting):
+        """连接数据库，创建以历史tick为行情来源的模拟交易所"""
+        host, port = loadMongoSetting()
+
+        try:
+            # 和MainEngine一样设置0.5秒的超时，并调用server_info确认连接成功
+            self.dbClient = MongoClient(host, port, serverSelectionTimeoutMS=500)
+            self.dbClient.server_info()
+        except ConnectionFailure:
+            self.writeLog(u'MongoDB连接失败，无法回放行情')
+            return None
+
+        try:
+            return ReplayExchange(self, setting, self.dbClient[setting['dbName']])
+        except ValueError:
+            self.writeLog(u'回放日期格式错误，请检查')
+            return None
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """关闭"""
+        super(ReplayGateway, self).close()
+
+        if self.dbClient:
+            self.dbClient.close()
+            self.dbClient = None
+
+
+########################################################################
+class ReplayExchange(SimExchange):
+    """以数据库中的历史tick为行情来源的模拟交易所"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, gateway, setting, db):
+        """Constructor"""
+        super(ReplayExchange, self).__init__(gateway, setting)
+
+        self.db = db
+        self.dbFilter = self.getFilter()  # 格式错误时抛出ValueError
+
+        # 没有设置合约时回放数据库中的所有合约
+        self.symbolList = setting['symbols'] or sorted(name for name in db.collection_names()
+                                                       if not name.startswith('system.'))
+
+        # 读取线程，从队列中取出需要读取的数据流
+        self.loaderQueue = Queue()
+        self.loaderList = [Thread(target=self.runLoader) for i in range(max(setting['loaderCount'], 1))]
+
+    # ----------------------------------------------------------------------
+    def getFilter(self):
+        """生成按照日期筛选tick的查询条件"""
+        d = {'$type': BSON_DATE}
+
+        if self.setting['startDate']:
+            d['$gte'] = datetime.strptime(self.setting['startDate'], '%Y%m%d')
+        if self.setting['endDate']:
+            d['$lt'] = datetime.strptime(self.setting['endDate'], '%Y%m%d') + timedelta(days=1)
+
+        return {'datetime': d}
+
+    # ----------------------------------------------------------------------
+    def start(self):
+        """启动读取线程后启动行情和撮合线程"""
+        for thread in self.loaderList:
+            thread.start()
+
+        super(ReplayExchange, self).start()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """停止行情和撮合线程后停止读取线程"""
+        super(ReplayExchange, self).stop()
+
+        for thread in self.loaderList:
+            self.loaderQueue.put(None)
+
+        for thread in self.loaderList:
+            if thread.is_alive():
+                thread.join()
+
+    # ----------------------------------------------------------------------
+    def runLoader(self):
+        """读取线程，为请求读取的数据流读取tick"""
+        while True:
+            stream = self.loaderQueue.get()
+            if stream is None:
+                break
+
+            try:
+                stream.load()
+            except PyMongoError as e:
+                stream.finish()
+                self.gateway.writeError(u'读取%s的tick出错：%s' % (stream.symbol, e))
+
+    # ----------------------------------------------------------------------
+    def getTickIterator(self):
+        """返回按照时间归并、控制速度后的tick迭代器"""
+        return self.limitSpeed(self.mergeTicks(), self.setting['speed'], self.setting['maxGap'])
+
+    # ----------------------------------------------------------------------
+    def mergeTicks(self):
+        """按照时间归并所有合约的tick"""
+        batch_size = self.setting['batchSize']
+        prefetch = self.setting['prefetch']
+
+        iterator_list = []
+        for index, symbol in enumerate(self.symbolList):
+            cursor = self.db[symbol].find(self.dbFilter).sort('datetime', ASCENDING).batch_size(batch_size)
+            stream = TickStream(symbol, cursor, batch_size, prefetch, self.loaderQueue)
+            stream.request()
+            iterator_list.append(stream.iterItems(index))
+
+        for dt, index, d in heapq.merge(*iterator_list):
+            tick = VtTickData()
+            tick.fromDict(d)
+            tick.gatewayName = self.gatewayName
+            yield tick
+
+    # ----------------------------------------------------------------------
+    def limitSpeed(self, tick_iterator, speed, max_gap):
+        """按照tick的时间以speed倍的速度返回tick，speed为0时不控制速度"""
+        if not speed:
+            for tick in tick_iterator:
+                yield tick
+            return
+
+        start = None  # 开始回放的本地时间
+        elapsed = 0  # 已经回放的行情时间（秒，压缩间隔后）
+        last_dt = None
+
+        for tick in tick_iterator:
+            if start is None:
+                start = time.time()
+            else:
+                gap = (tick.datetime - last_dt).total_seconds()
+                if max_gap and gap > max_gap:
+                    gap = max_gap
+
+                elapsed += gap
+                self.sleep(start + elapsed / speed - time.time())
+
+            last_dt = tick.datetime
+            yield tick
+
+
+########################################################################
+class TickStream(object):
+    """
+    单个合约的tick数据流
+
+    游标由读取线程分批读取，读好的批次放入batchQueue，空列表表示已经读完。行情线程每取出一个批次
+    就请求补充，读取线程一次补充到prefetch个批次。同一个数据流同时只在一个读取线程中读取，
+    保证批次的顺序，不同合约的数据流可以在多个读取线程中并行读取。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, symbol, cursor, batch_size, prefetch, loader_queue):
+        """Constructor"""
+        self.symbol = symbol
+        self.cursor = cursor
+        self.batchSize = batch_size
+        self.prefetch = max(prefetch, 1)
+        self.loaderQueue = loader_queue
+
+        self.batchQueue = Queue()
+        self.lock = Lock()
+        self.requested = False  # 是否已经在等待读取
+        self.finished = False  # 是否已经读完
+
+    # ----------------------------------------------------------------------
+    def request(self):
+        """请求读取线程补充批次，已经在等待读取时不重复请求"""
+        with self.lock:
+            if self.requested or self.finished:
+                return
+            self.requested = True
+
+        self.loaderQueue.put(self)
+
+    # ----------------------------------------------------------------------
+    def load(self):
+        """读取批次直到缓存了prefetch个批次或者读完（在读取线程中调用）"""
+        while True:
+            while self.batchQueue.qsize() < self.prefetch:
+                batch = list(islice(self.cursor, self.batchSize))
+                if not batch:
+                    self.finish()
+                    return
+                self.batchQueue.put(batch)
+
+            # 在锁中再次检查，行情线程可能在清除标志前取走了批次，此时它的请求被忽略，需要继续读取
+            with self.lock:
+                if self.batchQueue.qsize() >= self.prefetch:
+                    self.requested = False
+                    return
+
+    # ----------------------------------------------------------------------
+    def finish(self):
+        """读完或者读取出错时结束数据流"""
+        with self.lock:
+            self.finished = True
+            self.requested = False
+        self.batchQueue.put([])
+
+    # ----------------------------------------------------------------------
+    def iterItems(self, index):
+        """返回(时间, 序号, tick字典)的迭代器，用于多个合约按照时间归并"""
+        while True:
+            batch = self.batchQueue.get()
+            if not batch:
+                return
+
+            self.request()
+            for d in batch:
+                yield d['datetime'], index, d
@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+
+"""
+本文件中包含的是本地模拟交易所接口，不需要任何外部连接，用于在本机对整个系统进行压力测试。
+
+模拟交易所包括两部分：
+1. 行情线程：按照设定的速度，为大量合约生成随机游走的tick，或者回放事件日志（EventJournal）
+   中记录的tick，每个tick到达后先撮合该合约上挂着的委托，再推送行情
+2. 撮合线程：委托和撤单经过设定的延时后到达交易所，按照最新的tick撮合，
+   支持全部成交、部分成交、随机拒单，以及FAK、FOK和市价委托
+
+MainEngine.initGateway会像ctp一样自动发现本接口，接口名称为SIM。
+配置文件SIM_connect.json（不存在时使用默认配置），字段见DEFAULT_SETTING：
+symbolCount     合约数量，合约代码为symbolPrefix加上4位编号
+tickRate        每秒推送的tick总数，0为尽可能快
+replayFile      事件日志文件，设置后回放其中记录的tick，而不是生成随机行情
+pushAll         为True时推送所有合约的行情，否则只推送订阅的合约
+latency         委托和撤单到达交易所的延时（毫秒），latencyJitter为在此基础上的随机延时
+rejectRatio     随机拒单的比例
+partialRatio    撮合时只成交一部分的比例
+"""
+
+import heapq
+import json
+import random
+import time
+from copy import copy
+from datetime import datetime
+from threading import Thread, Condition, Lock
+
+from vnpy.event.eventJournal import EventReplayer
+from vnpy.utils.vtFunction import findConfPath
+from vnpy.utils.vtGateway import *
+
+# 默认配置
+DEFAULT_SETTING = {
+    'symbolCount': 100,
+    'symbolPrefix': 'SIM',
+    'tickRate': 1000,
+    'replayFile': '',
+    'pushAll': False,
+    'latency': 10,
+    'latencyJitter': 0,
+    'rejectRatio': 0.0,
+    'partialRatio': 0.0,
+    'startPrice': 3000.0,
+    'priceTick': 1.0,
+    'size': 10,
+    'marginRatio': 0.1,
+    'capital': 1000000.0,
+    'seed': None
+}
+
+ACCOUNT_ID = 'SIM'
+MIN_SLEEP = 0.001  # 行情线程控制速度时的最小等待时间（秒）
+MAX_SLEEP = 0.1  # 行情线程每次等待的最长时间（秒），超过时分段等待
+
+# 仍在交易所中等待成交的委托状态
+WORKING_STATUS = (STATUS_NOTTRADED, STATUS_PARTTRADED)
+
+
+########################################################################
+class SimGateway(VtGateway):
+    """本地模拟交易所接口"""
+
+    defaultSetting = DEFAULT_SETTING  # 默认配置，子类可以在此基础上增加字段
+
+    # ----------------------------------------------------------------------
+    def __init__(self, event_engine, gateway_name='SIM'):
+        """Constructor"""
+        super(SimGateway, self).__init__(event_engine, gateway_name)
+
+        self.exchange = None  # 模拟交易所，连接时创建
+        self.connected = False
+
+        self.qryEnabled = False  # 是否要启动循环查询
+
+        self.qryFunctionList = []
+
+        self.qryInterval = 3000  # 查询间隔（毫秒）
+        self.qryTimer = None  # 查询定时任务
+        self.qryNextFunction = 0  # 上次运行的查询函数索引
+
+        # 行情总是在模拟交易所的行情线程中推送，可以使用无锁的环形缓冲区
+        if hasattr(event_engine, 'createRing'):
+            self.tickRing = event_engine.createRing()
+
+    # ----------------------------------------------------------------------
+    def connect(self, setting=None):
+        """连接，setting为配置字典（用于测试脚本），为None时读取配置文件"""
+        if self.connected:
+            return
+
+        d = self.defaultSetting.copy()
+
+        if setting is not None:
+            d.update(setting)
+        else:
+            # 载入json文件，不存在时使用默认配置
+            try:
+                with open(findConfPath(self.gatewayName + '_connect.json')) as f:
+                    d.update(json.load(f))
+            except IOError:
+                pass
+            except ValueError:
+                self.writeLog(u'读取连接配置出错，请检查')
+                return
+        setting = d
+
+        self.exchange = self.createExchange(setting)
+        if not self.exchange:
+            return
+
+        self.exchange.start()
+        self.connected = True
+        self.writeLog(u'模拟交易所已启动，合约数量：%s' % len(self.exchange.symbolList))
+
+        # 初始化并启动查询
+        self.initQuery()
+
+    # ----------------------------------------------------------------------
+    def createExchange(self, setting):
+        """创建模拟交易所，子类可以重载以使用其他行情来源，失败时返回None"""
+        return SimExchange(self, setting)
+
+    # ----------------------------------------------------------------------
+    def subscribe(self, subscribe_req):
+        """订阅行情"""
+        if self.exchange:
+            self.exchange.subscribe(subscribe_req.symbol)
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, subscribe_req):
+        """退订行情"""
+        if self.exchange:
+            self.exchange.unsubscribe(subscribe_req.symbol)
+
+    # ----------------------------------------------------------------------
+    def sendOrder(self, order_req):
+        """发单"""
+        if not self.exchange:
+            self.writeLog(u'模拟交易所未连接，无法发单')
+            return ''
+        return self.exchange.sendOrder(order_req)
+
+    # ----------------------------------------------------------------------
+    def cancelOrder(self, cancel_order_req):
+        """撤单"""
+        if self.exchange:
+            self.exchange.cancelOrder(cancel_order_req)
+
+    # ----------------------------------------------------------------------
+    def qryAccount(self):
+        """查询账户资金"""
+        if self.exchange:
+            self.onAccount(self.exchange.getAccount())
+
+    # ----------------------------------------------------------------------
+    def qryPosition(self):
+        """查询持仓"""
+        if self.exchange:
+            for position in self.exchange.getAllPositions():
+                self.onPosition(position)
+
+    # ----------------------------------------------------------------------
+    def close(self):
+        """关闭"""
+        if self.qryTimer:
+            self.eventEngine.cancelTimer(self.qryTimer)
+            self.qryTimer = None
+
+        if self.exchange:
+            self.exchange.stop()
+            self.exchange = None
+        self.connected = False
+
+    # ----------------------------------------------------------------------
+    def initQuery(self):
+        """初始化连续查询"""
+        if self.qryEnabled:
+            # 需要循环的查询函数列表
+            self.qryFunctionList = [self.qryAccount, self.qryPosition]
+
+            self.startQuery()
+
+    # ----------------------------------------------------------------------
+    def query(self, event):
+        """由事件引擎定时调用的查询函数"""
+        # 执行查询函数
+        function = self.qryFunctionList[self.qryNextFunction]
+        function()
+
+        # 计算下次查询函数的索引，如果超过了列表长度，则重新设为0
+        self.qryNextFunction += 1
+        if self.qryNextFunction == len(self.qryFunctionList):
+            self.qryNextFunction = 0
+
+    # ----------------------------------------------------------------------
+    def startQuery(self):
+        """启动连续查询"""
+        if not self.qryTimer:
+            self.qryTimer = self.eventEngine.addTimer(self.qryInterval, self.query, repeat=True)
+
+    # ----------------------------------------------------------------------
+    def setQryEnabled(self, qry_enabled):
+        """设置是否要启动循环查询"""
+        self.qryEnabled = qry_enabled
+
+    # ----------------------------------------------------------------------
+    def writeLog(self, content):
+        """发出日志"""
+        log = VtLogData()
+        log.gatewayName = self.gatewayName
+        log.logContent = content
+        self.onLog(log)
+
+    # ----------------------------------------------------------------------
+    def writeError(self, content):
+        """发出错误"""
+        err = VtErrorData()
+        err.gatewayName = self.gatewayName
+        err.errorMsg = content
+        self.onError(err)
+
+
+########################################################################
+class SimExchange(object):
+    """
+    模拟交易所，包括行情线程和撮合线程
+
+    委托、持仓、账户等数据只在持有lock时修改，推送给事件引擎的都是复制后的对象，
+    避免事件处理线程读到正在修改的数据。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, gateway, setting):
+        """Constructor"""
+        self.gateway = gateway
+        self.gatewayName = gateway.gatewayName
+        self.setting = setting
+
+        self.random = random.Random(setting['seed'])
+        self.active = False
+
+        # 合约和行情
+        self.symbolList = ['%s%04d' % (setting['symbolPrefix'], i) for i in range(setting['symbolCount'])]
+        self.subscribedSet = set()  # 已订阅的合约
+        self.subscriptionManager = VtSubscriptionManager(self.subscribedSet.update,
+                                                         self.subscribedSet.difference_update)
+        self.subscriptionManager.setOnline(True)
+        self.tickDict = {}  # 每个合约的最新tick
+
+        # 委托和成交
+        self.lock = Lock()
+        self.orderID = 0  # 委托编号
+        self.tradeID = 0  # 成交编号
+        self.orderDict = {}  # vtOrderID:委托
+        self.workingDict = {}  # vtSymbol:挂单中的委托列表
+
+        # 持仓和资金
+        self.posDict = {}  # (vtSymbol, 方向):持仓
+        self.account = VtAccountData()
+        self.account.gatewayName = self.gatewayName
+        self.account.accountID = ACCOUNT_ID
+        self.account.vtAccountID = '.'.join([self.gatewayName, ACCOUNT_ID])
+        self.account.preBalance = setting['capital']
+
+        # 延时任务队列，元素为(执行时间, 序号, 函数, 参数)
+        self.taskList = []
+        self.taskCount = 0
+        self.taskCondition = Condition()
+
+        self.marketThread = Thread(target=self.runMarket)
+        self.taskThread = Thread(target=self.runTask)
+
+    # ----------------------------------------------------------------------
+    def start(self):
+        """推送合约后启动行情和撮合线程"""
+        for symbol in self.symbolList:
+            contract = VtContractData()
+            contract.gatewayName = self.gatewayName
+            contract.symbol = symbol
+            contract.exchange = EXCHANGE_UNKNOWN
+            contract.vtSymbol = symbol
+            contract.name = symbol.decode('utf-8')
+            contract.productClass = PRODUCT_FUTURES
+            contract.size = self.setting['size']
+            contract.priceTick = self.setting['priceTick']
+            self.gateway.onContract(contract)
+
+        self.active = True
+        self.marketThread.start()
+        self.taskThread.start()
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """停止并等待线程退出"""
+        self.active = False
+
+        with self.taskCondition:
+            self.taskCondition.notify()
+
+        for thread in (self.marketThread, self.taskThread):
+            if thread.is_alive():
+                thread.join()
+
+    # ----------------------------------------------------------------------
+    def subscribe(self, symbol):
+        """订阅行情"""
+        self.subscriptionManager.subscribe(symbol)
+        self.subscriptionManager.flush()
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, symbol):
+        """退订行情，没有模块订阅时不再推送"""
+        self.subscriptionManager.unsubscribe(symbol)
+        self.subscriptionManager.flush()
+
+    # ----------------------------------------------------------------------
+    def schedule(self, func, *args):
+        """经过设定的延时后在撮合线程中调用func"""
+        delay = self.setting['latency']
+        if self.setting['latencyJitter']:
+            delay += self.random.random() * self.setting['latencyJitter']
+
+        with self.taskCondition:
+            self.taskCount += 1
+            heapq.heappush(self.taskList, (time.time() + delay / 1000.0, self.taskCount, func, args))
+            self.taskCondition.notify()
+
+    # ----------------------------------------------------------------------
+    def runTask(self):
+        """撮合线程，按照时间顺序执行到期的任务"""
+        while self.active:
+            with self.taskCondition:
+                if not self.taskList:
+                    self.taskCondition.wait()
+                    continue
+
+                delay = self.taskList[0][0] - time.time()
+                if delay > 0:
+                    self.taskCondition.wait(delay)
+                    continue
+
+                due, count, func, args = heapq.heappop(self.taskList)
+
+            func(*args)
+
+    # ----------------------------------------------------------------------
+    def runMarket(self):
+        """行情线程，推送行情来源中的tick"""
+        push_all = self.setting['pushAll']
+        count = 0
+
+        for tick in self.getTickIterator():
+            if not self.active:
+                break
+
+            self.onMarketTick(tick)
+            if push_all or tick.symbol in self.subscribedSet:
+                self.gateway.onTick(tick)
+            count += 1
+
+        if self.active:
+            self.gateway.writeLog(u'行情回放结束，共%s个tick' % count)
+
+    # ----------------------------------------------------------------------
+    def getTickIterator(self):
+        """返回行情来源的tick迭代器（包括速度控制），子类可以重载以使用其他行情来源"""
+        if self.setting['replayFile']:
+            tick_iterator = self.replayTicks()
+        else:
+            tick_iterator = self.generateTicks()
+
+        return self.limitRate(tick_iterator, self.setting['tickRate'])
+
+    # ----------------------------------------------------------------------
+    def limitRate(self, tick_iterator, rate):
+        """按照每秒rate个的速度返回tick，rate为0时不控制速度"""
+        if not rate:
+            for tick in tick_iterator:
+                yield tick
+            return
+
+        start = time.time()
+        count = 0
+
+        for tick in tick_iterator:
+            yield tick
+
+            count += 1
+            self.sleep(start + count / float(rate) - time.time())
+
+    # ----------------------------------------------------------------------
+    def sleep(self, delay):
+        """在行情线程中等待delay秒，分段等待以便停止时尽快退出"""
+        while delay > MIN_SLEEP and self.active:
+            time.sleep(min(delay, MAX_SLEEP))
+            delay -= MAX_SLEEP
+
+    # ----------------------------------------------------------------------
+    def generateTicks(self):
+        """生成随机游走的tick"""
+        price_tick = self.setting['priceTick']
+        start_price = self.setting['startPrice']
+        rand = self.random.random
+
+        price_dict = {symbol: start_price for symbol in self.symbolList}
+        volume_dict = {symbol: 0 for symbol in self.symbolList}
+
+        while True:
+            for symbol in self.symbolList:
+                now = datetime.now()
+                r = rand()
+                price = price_dict[symbol]
+                if r < 0.3:
+                    price -= price_tick
+                elif r > 0.7:
+                    price += price_tick
+                price_dict[symbol] = price
+                volume_dict[symbol] += int(r * 10) + 1
+
+                tick = VtTickData()
+                tick.gatewayName = self.gatewayName
+                tick.symbol = symbol
+                tick.exchange = EXCHANGE_UNKNOWN
+                tick.vtSymbol = symbol
+                tick.lastPrice = price
+                tick.volume = volume_dict[symbol]
+                tick.openInterest = 100000
+                tick.date = '%04d%02d%02d' % (now.year, now.month, now.day)
+                tick.time = '%02d:%02d:%02d.%d' % (now.hour, now.minute, now.second, now.microsecond // 100000)
+                tick.datetime = now
+                tick.openPrice = start_price
+                tick.upperLimit = start_price * 1.1
+                tick.lowerLimit = start_price * 0.9
+                tick.bidPrice1 = price - price_tick
+                tick.askPrice1 = price + price_tick
+                tick.bidVolume1 = int(r * 100) + 1
+                tick.askVolume1 = int((1 - r) * 100) + 1
+                yield tick
+
+    # ----------------------------------------------------------------------
+    def replayTicks(self):
+        """回放事件日志中记录的tick"""
+        replayer = EventReplayer(self.setting['replayFile'], None)
+        for timestamp, event in replayer.readEvents():
+            if getTypePrefix(event.type_) == EVENT_TICK:
+                tick = event.dict_['data']
+                tick.gatewayName = self.gatewayName
+                yield tick
+
+    # ----------------------------------------------------------------------
+    def onMarketTick(self, tick):
+        """收到新的tick后撮合该合约上挂着的委托"""
+        with self.lock:
+            self.tickDict[tick.vtSymbol] = tick
+
+            order_list = self.workingDict.get(tick.vtSymbol)
+            if order_list:
+                for order in order_list[:]:
+                    self.matchOrder(order, tick)
+
+    # ----------------------------------------------------------------------
+    def sendOrder(self, order_req):
+        """发单，立即返回vtOrderID，委托经过延时后到达交易所"""
+        order = VtOrderData()
+        order.gatewayName = self.gatewayName
+        order.symbol = order_req.symbol
+        order.exchange = order_req.exchange
+        order.vtSymbol = order_req.symbol
+        order.direction = order_req.direction
+        order.offset = order_req.offset
+        order.price = order_req.price
+        order.totalVolume = order_req.volume
+        order.status = STATUS_UNKNOWN  # 尚未到达交易所
+
+        with self.lock:
+            self.orderID += 1
+            order.orderID = str(self.orderID)
+            order.vtOrderID = '.'.join([self.gatewayName, order.orderID])
+            self.orderDict[order.vtOrderID] = order
+
+        self.schedule(self.insertOrder, order, order_req.priceType)
+        return order.vtOrderID
+
+    # ----------------------------------------------------------------------
+    def cancelOrder(self, cancel_order_req):
+        """撤单，经过延时后到达交易所"""
+        vt_order_id = '.'.join([self.gatewayName, cancel_order_req.orderID])
+        self.schedule(self.removeOrder, vt_order_id)
+
+    # ----------------------------------------------------------------------
+    def insertOrder(self, order, price_type):
+        """委托到达交易所"""
+        with self.lock:
+            order.orderTime = datetime.now().strftime('%H:%M:%S')
+
+            # 撤单先于委托到达
+            if order.status == STATUS_CANCELLED:
+                return
+
+            tick = self.tickDict.get(order.vtSymbol)
+            error = self.checkOrder(order, price_type, tick)
+            if error:
+                order.status = STATUS_CANCELLED
+                order.cancelTime = order.orderTime
+                self.pushOrder(order)
+                self.gateway.writeError(u'委托%s被拒绝：%s' % (order.vtOrderID, error))
+                return
+
+            # 平仓委托冻结持仓
+            if order.offset != OFFSET_OPEN:
+                self.getPosition(order.vtSymbol, self.getPosDirection(order)).frozen += order.totalVolume
+
+            order.status = STATUS_NOTTRADED
+            self.pushOrder(order)
+            self.workingDict.setdefault(order.vtSymbol, []).append(order)
+
+            if tick:
+                # FOK委托不能全部成交时直接撤销
+                if price_type == PRICETYPE_FOK and self.getMatchVolume(order, tick) < order.totalVolume:
+                    self.cancelWorkingOrder(order)
+                    return
+
+                self.matchOrder(order, tick, allow_partial=price_type != PRICETYPE_FOK)
+
+            # 市价、FAK委托未成交的部分立即撤销
+            if price_type in (PRICETYPE_MARKETPRICE, PRICETYPE_FAK) and order.status in WORKING_STATUS:
+                self.cancelWorkingOrder(order)
+
+    # ----------------------------------------------------------------------
+    def checkOrder(self, order, price_type, tick):
+        """检查委托，返回拒单原因，通过时返回空字符串"""
+        if order.totalVolume <= 0:
+            return u'委托数量必须大于0'
+
+        if not tick and price_type == PRICETYPE_MARKETPRICE:
+            return u'没有行情，无法使用市价委托'
+
+        if order.offset != OFFSET_OPEN:
+            position = self.getPosition(order.vtSymbol, self.getPosDirection(order))
+            if position.position - position.frozen < order.totalVolume:
+                return u'可平仓位不足'
+
+        if self.setting['rejectRatio'] and self.random.random() < self.setting['rejectRatio']:
+            return u'模拟拒单'
+
+        return ''
+
+    # ----------------------------------------------------------------------
+    def removeOrder(self, vt_order_id):
+        """撤单到达交易所"""
+        with self.lock:
+            order = self.orderDict.get(vt_order_id)
+
+            if not order:
+                self.gateway.writeError(u'撤单失败，委托%s不存在' % vt_order_id)
+            elif order.status in WORKING_STATUS:
+                self.cancelWorkingOrder(order)
+            elif order.status == STATUS_UNKNOWN:
+                # 撤单先于委托到达（设置了随机延时），委托到达后不再处理
+                order.status = STATUS_CANCELLED
+                order.cancelTime = datetime.now().strftime('%H:%M:%S')
+                self.pushOrder(order)
+
+    # ----------------------------------------------------------------------
+    def cancelWorkingOrder(self, order):
+        """撤销挂单中的委托（持有lock时调用）"""
+        order.status = STATUS_CANCELLED
+        order.cancelTime = datetime.now().strftime('%H:%M:%S')
+
+        self.workingDict[order.vtSymbol].remove(order)
+
+        # 解冻未成交部分的持仓
+        if order.offset != OFFSET_OPEN:
+            position = self.getPosition(order.vtSymbol, self.getPosDirection(order))
+            position.frozen -= order.totalVolume - order.tradedVolume
+
+        self.pushOrder(order)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def getMatchVolume(order, tick):
+        """按照tick的一档行情计算委托可以成交的数量"""
+        if order.direction == DIRECTION_LONG:
+            if tick.askPrice1 and (order.price >= tick.askPrice1 or not order.price):
+                return tick.askVolume1
+        else:
+            if tick.bidPrice1 and order.price <= tick.bidPrice1:
+                return tick.bidVolume1
+        return 0
+
+    # ----------------------------------------------------------------------
+    def matchOrder(self, order, tick, allow_partial=True):
+        """用tick撮合委托（持有lock时调用）"""
+        match_volume = self.getMatchVolume(order, tick)
+        if not match_volume:
+            return
+
+        volume = min(order.totalVolume - order.tradedVolume, match_volume)
+
+        # 随机只成交一部分
+        if allow_partial and volume > 1 and self.setting['partialRatio'] and \
+                self.random.random() < self.setting['partialRatio']:
+            volume = self.random.randint(1, volume - 1)
+
+        if order.direction == DIRECTION_LONG:
+            price = tick.askPrice1
+        else:
+            price = tick.bidPrice1
+
+        order.tradedVolume += volume
+        if order.tradedVolume == order.totalVolume:
+            order.status = STATUS_ALLTRADED
+            self.workingDict[order.vtSymbol].remove(order)
+        else:
+            order.status = STATUS_PARTTRADED
+
+        self.tradeID += 1
+        trade = VtTradeData()
+        trade.gatewayName = self.gatewayName
+        trade.symbol = order.symbol
+        trade.exchange = order.exchange
+        trade.vtSymbol = order.vtSymbol
+        trade.tradeID = str(self.tradeID)
+        trade.vtTradeID = '.'.join([self.gatewayName, trade.tradeID])
+        trade.orderID = order.orderID
+        trade.vtOrderID = order.vtOrderID
+        trade.direction = order.direction
+        trade.offset = order.offset
+        trade.price = price
+        trade.volume = volume
+        trade.tradeTime = datetime.now().strftime('%H:%M:%S')
+
+        self.updatePosition(trade)
+
+        # 和CTP一样先推送委托再推送成交
+        self.pushOrder(order)
+        self.gateway.onTrade(trade)
+
+    # ----------------------------------------------------------------------
+    def pushOrder(self, order):
+        """推送委托的副本"""
+        self.gateway.onOrder(copy(order))
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def getPosDirection(order):
+        """获取委托或者成交对应的持仓方向，开仓为同向，平仓为反向"""
+        if order.offset == OFFSET_OPEN:
+            return order.direction
+        if order.direction == DIRECTION_LONG:
+            return DIRECTION_SHORT
+        return DIRECTION_LONG
+
+    # ----------------------------------------------------------------------
+    def getPosition(self, vt_symbol, direction):
+        """获取持仓，不存在时创建"""
+        key = (vt_symbol, direction)
+        position = self.posDict.get(key)
+
+        if not position:
+            position = VtPositionData()
+            position.gatewayName = self.gatewayName
+            position.symbol = vt_symbol
+            position.exchange = EXCHANGE_UNKNOWN
+            position.vtSymbol = vt_symbol
+            position.direction = direction
+            position.vtPositionName = '.'.join([vt_symbol, direction])
+            self.posDict[key] = position
+
+        return position
+
+    # ----------------------------------------------------------------------
+    def updatePosition(self, trade):
+        """根据成交更新持仓和平仓盈亏（持有lock时调用）"""
+        position = self.getPosition(trade.vtSymbol, self.getPosDirection(trade))
+
+        if trade.offset == OFFSET_OPEN:
+            cost = position.price * position.position + trade.price * trade.volume
+            position.position += trade.volume
+            position.price = cost / position.position
+        else:
+            position.position -= trade.volume
+            position.frozen -= trade.volume
+
+            profit = (trade.price - position.price) * trade.volume * self.setting['size']
+            if position.direction == DIRECTION_SHORT:
+                profit = -profit
+            self.account.closeProfit += profit
+
+            if not position.position:
+                position.price = 0
+
+    # ----------------------------------------------------------------------
+    def getAccount(self):
+        """计算并返回账户资金的副本"""
+        size = self.setting['size']
+
+        with self.lock:
+            account = self.account
+            account.positionProfit = 0
+            account.margin = 0
+
+            for (vt_symbol, direction), position in self.posDict.items():
+                if not position.position:
+                    continue
+
+                tick = self.tickDict.get(vt_symbol)
+                last_price = tick.lastPrice if tick else position.price
+
+                profit = (last_price - position.price) * position.position * size
+                if direction == DIRECTION_SHORT:
+                    profit = -profit
+                account.positionProfit += profit
+                account.margin += last_price * position.position * size * self.setting['marginRatio']
+
+            account.balance = account.preBalance + account.closeProfit + account.positionProfit
+            account.available = account.balance - account.margin
+
+            return copy(account)
+
+    # ----------------------------------------------------------------------
+    def getAllPositions(self):
+        """返回所有持仓的副本"""
+        with self.lock:
+            return [copy(position) for position in self.posDict.values()]
@@ -51,6 +51,139 @@ def todayDate():
     return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
 
+########################################################################
+class TickTimeParser(object):
+    """
+    tick时间解析，结果和datetime.strptime(date + ' ' + time, '%Y%m%d %H:%M:%S.%f')相同
+
+    同一天的tick日期相同，同一秒内多个合约的tick时间也只有毫秒部分不同，
+    因此缓存上一次解析的日期以及精确到秒的时间，只解析变化的部分，避免每个tick调用strptime。
+    缓存以元组整体替换，可以在多个接口的回调线程中同时调用。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.dateCache = (None, None)  # (日期字符串, 当天0点的datetime)
+        self.secondCache = (None, None, None)  # (日期字符串, 精确到秒的时间字符串, 对应的datetime)
+        self.microsecondDict = {'': 0}  # 秒以下部分的字符串和微秒数的映射
+
+    # ----------------------------------------------------------------------
+    def parse(self, date, time):
+        """解析日期（20151009）和时间（11:20:56.5）字符串，返回datetime，格式错误时抛出ValueError"""
+        second_date, second_time, second_dt = self.secondCache
+        second = time[:8]
+
+        if second_time != second or second_date != date:
+            # 非标准格式（如小时只有一位）交给strptime处理
+            if len(second) != 8 or second[2] != ':' or second[5] != ':':
+                return datetime.strptime(' '.join([date, time]), '%Y%m%d %H:%M:%S.%f')
+
+            cache_date, cache_dt = self.dateCache
+            if cache_date != date:
+                cache_dt = datetime.strptime(date, '%Y%m%d')
+                self.dateCache = (date, cache_dt)
+
+            second_dt = cache_dt.replace(hour=int(second[:2]), minute=int(second[3:5]), second=int(second[6:8]))
+            self.secondCache = (date, second, second_dt)
+
+        fraction = time[9:]
+        try:
+            microsecond = self.microsecondDict[fraction]
+        except KeyError:
+            # 和strptime的%f一样，小数部分最多6位，不足6位的在右边补0
+            if len(fraction) > 6 or not fraction.isdigit():
+                raise ValueError(u'时间格式错误：%s' % time)
+            microsecond = int(fraction.ljust(6, '0'))
+
+            # 只缓存毫秒及以下精度，避免字典无限增长
+            if len(fraction) <= 3:
+                self.microsecondDict[fraction] = microsecond
+
+        if microsecond:
+            return second_dt.replace(microsecond=microsecond)
+        return second_dt
+
+
+tickTimeParser = TickTimeParser()
+
+
+# ----------------------------------------------------------------------
+def parseTickDatetime(date, time):
+    """解析tick的日期和时间字符串，返回datetime"""
+    return tickTimeParser.parse(date, time)
+
+
+########################################################################
+class VtSlotObject(object):
+    """
+    使用__slots__保存属性的数据对象基类
+
+    没有实例字典，创建更快、占用内存更少，适用于tick、委托、成交等大量创建的数据对象。
+    由于没有__dict__，需要字典形式数据的场合（如写入和读取数据库）使用toDict和fromDict，
+    pickle和copy通过__getstate__和__setstate__支持。
+    子类如果不定义__slots__，则依然拥有实例字典，可以动态添加属性。
+    """
+    __slots__ = ()
+
+    # ----------------------------------------------------------------------
+    def toDict(self):
+        """将数据对象转化为字典"""
+        d = {}
+        for key in getSlotNames(self.__class__):
+            try:
+                d[key] = getattr(self, key)
+            except AttributeError:
+                pass
+
+        # 子类没有定义__slots__时，还需要包含实例字典中的属性
+        try:
+            d.update(self.__dict__)
+        except AttributeError:
+            pass
+
+        return d
+
+    # ----------------------------------------------------------------------
+    def fromDict(self, d):
+        """从字典中读取数据，对于没有实例字典的对象，会忽略不在__slots__中的键（如数据库的_id）"""
+        if hasattr(self, '__dict__'):
+            for key, value in d.items():
+                setattr(self, key, value)
+        else:
+            names = getSlotNames(self.__class__)
+            for key, value in d.items():
+                if key in names:
+                    setattr(self, key, value)
+
+    __getstate__ = toDict
+    __setstate__ = fromDict
+
+
+# 保存类和其所有__slots__属性名的映射
+slotNamesDict = {}
+
+
+# ----------------------------------------------------------------------
+def getSlotNames(cls):
+    """获取类及其所有父类中定义的__slots__属性名（集合）"""
+    try:
+        return slotNamesDict[cls]
+    except KeyError:
+        names = set()
+        for c in cls.__mro__:
+            slots = c.__dict__.get('__slots__', ())
+            if isinstance(slots, basestring):
+                slots = (slots,)
+            names.update(slots)
+        names.discard('__dict__')
+        names.discard('__weakref__')
+
+        names = frozenset(names)
+        slotNamesDict[cls] = names
+        return names
+
+
 def findTempPath(filename):
     return _find_spec_path(filename, "temp") + '\\'
 
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import heapq
 import time
+from threading import Lock
 
 from vnpy.event.eventEngine import *
 from vnpy.utils.vtConstant import *
+from vnpy.utils.vtFunction import VtSlotObject
+
+# 查询的优先级，数值小的先执行
+QUERY_PRIORITY_HIGH = 0  # 按需查询，如成交后刷新持仓
+QUERY_PRIORITY_LOW = 1  # 例行轮询
 
 
 ########################################################################
@@ -16,70 +23,53 @@ class VtGateway(object):
         self.eventEngine = event_engine
         self.gatewayName = gateway_name
 
+        # 行情推送使用的事件环形缓冲区（见EventEngine2.createRing），为None时直接存入事件引擎
+        # 只有行情固定在同一个线程中推送的接口才能使用
+        self.tickRing = None
+
     # ----------------------------------------------------------------------
     def onTick(self, tick):
         """市场行情推送"""
-        # 通用事件
-        event1 = Event(type_=EVENT_TICK)
-        event1.dict_['data'] = tick
-        self.eventEngine.put(event1)
+        # 通用事件，以vtSymbol为路由键，引擎会同时推送给特定合约代码的监听函数
+        event = Event(type_=EVENT_TICK, key_=tick.vtSymbol)
+        event.dict_['data'] = tick
 
-        # 特定合约代码的事件
-        event2 = Event(type_=EVENT_TICK + tick.vtSymbol)
-        event2.dict_['data'] = tick
-        self.eventEngine.put(event2)
+        if self.tickRing is not None:
+            self.tickRing.put(event)
+        else:
+            self.eventEngine.put(event)
 
     # ----------------------------------------------------------------------
     def onTrade(self, trade):
         """成交信息推送"""
-        # 通用事件
-        event1 = Event(type_=EVENT_TRADE)
-        event1.dict_['data'] = trade
-        self.eventEngine.put(event1)
-
-        # 特定合约的成交事件
-        event2 = Event(type_=EVENT_TRADE + trade.vtSymbol)
-        event2.dict_['data'] = trade
-        self.eventEngine.put(event2)
+        # 通用事件，以vtSymbol为路由键，引擎会同时推送给特定合约的成交监听函数
+        event = Event(type_=EVENT_TRADE, key_=trade.vtSymbol)
+        event.dict_['data'] = trade
+        self.eventEngine.put(event)
 
     # ----------------------------------------------------------------------
     def onOrder(self, order):
         """订单变化推送"""
-        # 通用事件
-        event1 = Event(type_=EVENT_ORDER)
-        event1.dict_['data'] = order
-        self.eventEngine.put(event1)
-
-        # 特定订单编号的事件
-        event2 = Event(type_=EVENT_ORDER + order.vtOrderID)
-        event2.dict_['data'] = order
-        self.eventEngine.put(event2)
+        # 通用事件，以vtOrderID为路由键，引擎会同时推送给特定订单编号的监听函数
+        event = Event(type_=EVENT_ORDER, key_=order.vtOrderID)
+        event.dict_['data'] = order
+        self.eventEngine.put(event)
 
     # ----------------------------------------------------------------------
     def onPosition(self, position):
         """持仓信息推送"""
-        # 通用事件
-        event1 = Event(type_=EVENT_POSITION)
-        event1.dict_['data'] = position
-        self.eventEngine.put(event1)
-
-        # 特定合约代码的事件
-        event2 = Event(type_=EVENT_POSITION + position.vtSymbol)
-        event2.dict_['data'] = position
-        self.eventEngine.put(event2)
+        # 通用事件，以vtSymbol为路由键，引擎会同时推送给特定合约代码的监听函数
+        event = Event(type_=EVENT_POSITION, key_=position.vtSymbol)
+        event.dict_['data'] = position
+        self.eventEngine.put(event)
 
     # ----------------------------------------------------------------------
     def onAccount(self, account):
         """账户信息推送"""
-        # 通用事件
-        event1 = Event(type_=EVENT_ACCOUNT)
-        event1.dict_['data'] = account
-        self.eventEngine.put(event1)
-
-        # 特定合约代码的事件
-        event2 = Event(type_=EVENT_ACCOUNT + account.vtAccountID)
-        event2.dict_['data'] = account
-        self.eventEngine.put(event2)
+        # 通用事件，以vtAccountID为路由键，引擎会同时推送给特定账户的监听函数
+        event = Event(type_=EVENT_ACCOUNT, key_=account.vtAccountID)
+        event.dict_['data'] = account
+        self.eventEngine.put(event)
 
     # ----------------------------------------------------------------------
     def onError(self, error):
@@ -118,6 +108,11 @@ class VtGateway(object):
         """订阅行情"""
         pass
 
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, subscribe_req):
+        """退订行情，subscribe_req和订阅时相同"""
+        pass
+
     # ----------------------------------------------------------------------
     def sendOrder(self, order_req):
         """发单"""
@@ -145,8 +140,258 @@ class VtGateway(object):
 
 
 ########################################################################
-class VtBaseData(object):
+class VtSubscriptionManager(object):
+    """
+    行情订阅管理，供接口内部使用
+
+    每个合约记录订阅的引用计数，同一个合约被多个模块订阅时只向服务器发送一次订阅，
+    最后一个模块退订时才发送退订。订阅和退订请求先放入等待集合，在线（登录完成）时
+    由flush一次性发送；断线后所有仍被引用的合约重新进入等待集合，重新登录后一次性恢复。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, subscribe_func, unsubscribe_func):
+        """
+        Constructor
+        subscribe_func和unsubscribe_func接收合约代码列表，向服务器发送订阅和退订请求
+        """
+        self.subscribeFunc = subscribe_func
+        self.unsubscribeFunc = unsubscribe_func
+
+        self.lock = Lock()
+        self.online = False  # 是否可以向服务器发送请求
+
+        self.countDict = {}  # 合约代码:引用计数
+        self.subscribedSet = set()  # 已向服务器发送订阅的合约
+        self.pendingSubscribeSet = set()  # 等待发送订阅的合约
+        self.pendingUnsubscribeSet = set()  # 等待发送退订的合约
+
+    # ----------------------------------------------------------------------
+    def subscribe(self, symbol):
+        """增加合约的引用计数，第一次引用时加入等待订阅的集合"""
+        with self.lock:
+            count = self.countDict.get(symbol, 0) + 1
+            self.countDict[symbol] = count
+
+            if count == 1:
+                if symbol in self.pendingUnsubscribeSet:
+                    # 退订尚未发送，服务器上仍是订阅状态
+                    self.pendingUnsubscribeSet.discard(symbol)
+                elif symbol not in self.subscribedSet:
+                    self.pendingSubscribeSet.add(symbol)
+
+    # ----------------------------------------------------------------------
+    def unsubscribe(self, symbol):
+        """减少合约的引用计数，没有引用时加入等待退订的集合"""
+        with self.lock:
+            count = self.countDict.get(symbol, 0)
+            if not count:
+                return
+
+            if count > 1:
+                self.countDict[symbol] = count - 1
+                return
+
+            del self.countDict[symbol]
+            if symbol in self.pendingSubscribeSet:
+                # 订阅尚未发送，直接取消
+                self.pendingSubscribeSet.discard(symbol)
+            elif symbol in self.subscribedSet:
+                self.pendingUnsubscribeSet.add(symbol)
+
+    # ----------------------------------------------------------------------
+    def flush(self):
+        """在线时一次性发送所有等待中的订阅和退订请求"""
+        with self.lock:
+            if not self.online:
+                return
+
+            if self.pendingSubscribeSet:
+                symbol_list = sorted(self.pendingSubscribeSet)
+                self.pendingSubscribeSet.clear()
+                self.subscribedSet.update(symbol_list)
+                self.subscribeFunc(symbol_list)
+
+            if self.pendingUnsubscribeSet:
+                symbol_list = sorted(self.pendingUnsubscribeSet)
+                self.pendingUnsubscribeSet.clear()
+                self.subscribedSet.difference_update(symbol_list)
+                self.unsubscribeFunc(symbol_list)
+
+    # ----------------------------------------------------------------------
+    def setOnline(self, online):
+        """
+        设置在线状态，上线时发送所有等待中的请求，
+        下线时服务器上的订阅失效，仍被引用的合约全部重新进入等待订阅的集合
+        """
+        with self.lock:
+            self.online = online
+
+            if not online:
+                self.subscribedSet.clear()
+                self.pendingUnsubscribeSet.clear()
+                self.pendingSubscribeSet = set(self.countDict)
+
+        if online:
+            self.flush()
+
+
+########################################################################
+class VtQueryScheduler(object):
+    """
+    查询调度，供接口内部使用
+
+    查询请求按照优先级排队，由令牌桶控制发送速度以符合柜台的流控限制（如CTP每秒1次查询），
+    同时只有一个查询在等待回报。例行查询按照各自的间隔自动排队，回报没有变化时间隔加倍
+    （最长为max_interval），有变化时恢复；按需查询以高优先级排队，排在例行查询之前。
+    同一个查询在队列中只保留一个，查询函数返回非0值（如CTP的-2、-3流控错误）时重新排队。
+    run由接口的定时任务调用。
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, rate=1.0, capacity=1, timeout=5.0):
+        """
+        Constructor
+        rate为每秒允许的查询次数，capacity为令牌桶容量（允许连续发送的查询次数），
+        timeout为等待回报的超时时间（秒），超时后不再等待
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.timeout = timeout
+
+        self.lock = Lock()
+
+        self.tokens = capacity  # 当前的令牌数量
+        self.refillTime = time.time()  # 上次补充令牌的时间
+
+        self.queryDict = {}  # 查询名称:查询任务
+        self.queue = []  # 等待执行的查询，元素为(优先级, 序号, 查询名称)
+        self.queuedDict = {}  # 查询名称:在队列中的(优先级, 序号)，用于去重和忽略被提前的旧元素
+        self.count = 0  # 排队序号
+
+        self.waitingName = None  # 等待回报的查询
+        self.waitingTime = 0  # 发出该查询的时间
+
+    # ----------------------------------------------------------------------
+    def addQuery(self, name, func, interval, max_interval):
+        """添加查询，interval为例行查询的间隔（秒），为0时只按需查询"""
+        with self.lock:
+            self.queryDict[name] = QueryTask(func, interval, max_interval)
+
+    # ----------------------------------------------------------------------
+    def request(self, name, priority=QUERY_PRIORITY_HIGH):
+        """请求执行查询，已经在队列中时只会提高优先级"""
+        with self.lock:
+            self.enqueue(name, priority)
+
+    # ----------------------------------------------------------------------
+    def enqueue(self, name, priority):
+        """将查询放入队列（持有lock时调用）"""
+        if name not in self.queryDict:
+            return
+
+        queued = self.queuedDict.get(name)
+        if queued and queued[0] <= priority:
+            return
+
+        self.count += 1
+        self.queuedDict[name] = (priority, self.count)
+        heapq.heappush(self.queue, (priority, self.count, name))
+
+    # ----------------------------------------------------------------------
+    def onResult(self, name, changed):
+        """查询回报全部收到后调用，changed为结果是否有变化，据此调整例行查询的间隔"""
+        with self.lock:
+            if self.waitingName == name:
+                self.waitingName = None
+
+            task = self.queryDict.get(name)
+            if not task or not task.interval:
+                return
+
+            if changed:
+                task.currentInterval = task.interval
+            else:
+                task.currentInterval = min(task.currentInterval * 2, task.maxInterval)
+            task.nextTime = time.time() + task.currentInterval
+
+    # ----------------------------------------------------------------------
+    def run(self):
+        """补充令牌，将到期的例行查询排队，令牌足够且没有等待回报的查询时执行队首的查询"""
+        with self.lock:
+            now = time.time()
+
+            self.tokens = min(self.tokens + (now - self.refillTime) * self.rate, self.capacity)
+            self.refillTime = now
+
+            for name, task in self.queryDict.items():
+                if task.interval and task.nextTime <= now:
+                    self.enqueue(name, QUERY_PRIORITY_LOW)
+
+            if self.waitingName:
+                if now - self.waitingTime < self.timeout:
+                    return
+                self.waitingName = None
+
+            if self.tokens < 1 or not self.queue:
+                return
+
+            # 跳过已经以更高优先级重新排队的旧元素
+            while self.queue:
+                priority, count, name = heapq.heappop(self.queue)
+                if self.queuedDict.get(name) == (priority, count):
+                    break
+            else:
+                return
+
+            del self.queuedDict[name]
+            self.tokens -= 1
+            self.waitingName = name
+            self.waitingTime = now
+
+            task = self.queryDict[name]
+            if task.interval:
+                # 例行查询在收到回报前不再排队，回报超时后按照当前间隔重新排队
+                task.nextTime = now + max(task.currentInterval, self.timeout)
+
+        result = task.func()
+
+        # 查询被拒绝（如超过流控限制）时清空令牌，稍后重新执行
+        if result:
+            with self.lock:
+                self.tokens = 0
+                if self.waitingName == name:
+                    self.waitingName = None
+                self.enqueue(name, priority)
+
+    # ----------------------------------------------------------------------
+    def reset(self):
+        """断线时调用，不再等待回报，例行查询的间隔恢复初始值"""
+        with self.lock:
+            self.waitingName = None
+            for task in self.queryDict.values():
+                task.currentInterval = task.interval
+                task.nextTime = 0
+
+
+########################################################################
+class QueryTask(object):
+    """查询调度中的查询任务"""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, func, interval, max_interval):
+        """Constructor"""
+        self.func = func  # 查询函数，返回非0值表示查询被拒绝
+        self.interval = interval  # 例行查询的初始间隔（秒）
+        self.maxInterval = max(max_interval, interval)  # 例行查询的最长间隔（秒）
+        self.currentInterval = interval  # 当前间隔，回报没有变化时加倍
+        self.nextTime = 0  # 下次例行查询的时间
+
+
+########################################################################
+class VtBaseData(VtSlotObject):
     """回调函数推送数据的基础类，其他数据类继承于此"""
+    __slots__ = ('gatewayName', 'rawData')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -158,6 +403,12 @@ class VtBaseData(object):
 ########################################################################
 class VtTickData(VtBaseData):
     """Tick行情数据类"""
+    __slots__ = ('symbol', 'exchange', 'vtSymbol', 'lastPrice', 'lastVolume', 'volume',
+                 'openInterest', 'time', 'date', 'openPrice', 'highPrice', 'lowPrice',
+                 'preClosePrice', 'upperLimit', 'lowerLimit', 'bidPrice1', 'bidPrice2', 'bidPrice3',
+                 'bidPrice4', 'bidPrice5', 'askPrice1', 'askPrice2', 'askPrice3', 'askPrice4',
+                 'askPrice5', 'bidVolume1', 'bidVolume2', 'bidVolume3', 'bidVolume4', 'bidVolume5',
+                 'askVolume1', 'askVolume2', 'askVolume3', 'askVolume4', 'askVolume5', 'datetime')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -176,6 +427,7 @@ class VtTickData(VtBaseData):
         self.openInterest = EMPTY_INT  # 持仓量
         self.time = EMPTY_STRING  # 时间 11:20:56.5
         self.date = EMPTY_STRING  # 日期 20151009
+        self.datetime = None  # python的datetime时间对象，由接口在收到行情时解析，下游直接使用
 
         # 常规行情
         self.openPrice = EMPTY_FLOAT  # 今日开盘价
@@ -217,6 +469,8 @@ class VtTickData(VtBaseData):
 
 class VtTradeData(VtBaseData):
     """成交数据类"""
+    __slots__ = ('symbol', 'exchange', 'vtSymbol', 'tradeID', 'vtTradeID', 'orderID', 'vtOrderID',
+                 'direction', 'offset', 'price', 'volume', 'tradeTime')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -245,6 +499,9 @@ class VtTradeData(VtBaseData):
 ########################################################################
 class VtOrderData(VtBaseData):
     """订单数据类"""
+    __slots__ = ('symbol', 'exchange', 'vtSymbol', 'orderID', 'vtOrderID', 'direction', 'offset',
+                 'price', 'totalVolume', 'tradedVolume', 'status', 'orderTime', 'cancelTime',
+                 'frontID', 'sessionID')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -278,6 +535,8 @@ class VtOrderData(VtBaseData):
 ########################################################################
 class VtPositionData(VtBaseData):
     """持仓数据类"""
+    __slots__ = ('symbol', 'exchange', 'vtSymbol', 'direction', 'position', 'frozen', 'price',
+                 'vtPositionName', 'ydPosition')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -303,6 +562,8 @@ class VtPositionData(VtBaseData):
 ########################################################################
 class VtAccountData(VtBaseData):
     """账户数据类"""
+    __slots__ = ('accountID', 'vtAccountID', 'preBalance', 'balance', 'available', 'commission',
+                 'margin', 'closeProfit', 'positionProfit')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -326,6 +587,7 @@ class VtAccountData(VtBaseData):
 ########################################################################
 class VtErrorData(VtBaseData):
     """错误数据类"""
+    __slots__ = ('errorID', 'errorMsg', 'additionalInfo', 'errorTime')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -342,6 +604,7 @@ class VtErrorData(VtBaseData):
 ########################################################################
 class VtLogData(VtBaseData):
     """日志数据类"""
+    __slots__ = ('logTime', 'logContent')
 
     # ----------------------------------------------------------------------
     def __init__(self):
@@ -355,6 +618,8 @@ class VtLogData(VtBaseData):
 ########################################################################
 class VtContractData(VtBaseData):
     """合约详细信息类"""
+    __slots__ = ('symbol', 'exchange', 'vtSymbol', 'name', 'productClass', 'size', 'priceTick',
+                 'strikePrice', 'underlyingSymbol', 'optionType')
 
     # ----------------------------------------------------------------------
     def __init__(self):